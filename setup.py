@@ -27,7 +27,8 @@ REQUIRED = [
     "lz4",
     "pyee",
     "pycryptodome",
-    "pymem",
+    "psutil; platform_system == 'Windows'",
+    "pymem; platform_system == 'Windows'",
     "sqlcipher3-wheels",
     "xmltodict",
     "zstandard",
@@ -36,6 +37,7 @@ REQUIRED = [
 # What packages are optional?
 EXTRAS = {
     # 'fancy feature': ['django'],
+    "silk": ["pilk"],
 }
 
 # The rest you shouldn't have to touch too much :)
@@ -0,0 +1,1199 @@
+"""
+Description: 基准测试。使用 tests.synthetic 生成的合成数据库，无需微信客户端即可运行：
+
+   python -m tests.benchmark                # 全部
+   python -m tests.benchmark decrypt query  # 指定项目
+"""
+
+import argparse
+import os
+import queue
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List
+
+# 监听器会逐条 DEBUG 输出事件，基准测试默认只输出结果
+os.environ.setdefault("WXUTIL_LOG_LEVEL", "INFO")
+
+from wxutil.logger import logger  # noqa: E402
+
+IMPORT_MODULES = ("wxutil.utils", "wxutil.process", "wxutil.db_v3", "wxutil.db_v4")
+
+
+def measure(func: Callable[[], Any], repeat: int = 5) -> Dict[str, float]:
+    """重复执行 func，返回耗时（秒）的最小值与中位数"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings), "median": statistics.median(timings)}
+
+
+def bench_import(
+    modules: Iterable[str] = IMPORT_MODULES, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """在全新的解释器中测量模块冷启动导入耗时（秒）"""
+    code = (
+        "import time\n"
+        "t = time.perf_counter()\n"
+        "import {}\n"
+        "print(time.perf_counter() - t)\n"
+    )
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    results = {}
+    for module in modules:
+        timings = []
+        for _ in range(repeat):
+            proc = subprocess.run(
+                [sys.executable, "-c", code.format(module)],
+                capture_output=True,
+                env=env,
+            )
+            if proc.returncode != 0:
+                timings = None
+                logger.warning(f"import {module} failed: {proc.stderr.decode()}")
+                break
+            timings.append(float(proc.stdout.decode().strip().splitlines()[-1]))
+        if timings:
+            results[module] = {
+                "min": min(timings),
+                "median": statistics.median(timings),
+            }
+    return results
+
+
+class Fixture:
+    """按需生成并缓存 3.x/4.x 合成数据目录"""
+
+    def __init__(self, root: str, messages: int = 20000, key: str = None) -> None:
+        from tests.synthetic import random_key
+
+        self.root = root
+        self.messages = messages
+        self.key = key or random_key()
+        self.infos = {}
+
+    def info(self, version: str) -> Dict[str, Any]:
+        if version not in self.infos:
+            from tests import synthetic
+
+            generate = (
+                synthetic.generate_v3 if version == "v3" else synthetic.generate_v4
+            )
+            self.infos[version] = generate(
+                os.path.join(self.root, version), self.key, messages=self.messages
+            )
+        return self.infos[version]
+
+    def store(self, version: str) -> Any:
+        if version == "v3":
+            from wxutil.db_v3 import WeChatDB
+        else:
+            from wxutil.db_v4 import WeChatDB
+        return WeChatDB.from_dir(**self.info(version))
+
+    def msg_db_path(self, version: str) -> str:
+        from tests import synthetic
+
+        return synthetic.msg_db_path(self.info(version), version)
+
+
+def bench_decrypt(fixture: Fixture, repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    from wxutil.utils import decrypt_db_file_v3, decrypt_db_file_v4
+
+    results = {}
+    for version, decrypt in (("v3", decrypt_db_file_v3), ("v4", decrypt_db_file_v4)):
+        path = fixture.msg_db_path(version)
+        result = measure(lambda: decrypt(path, fixture.key), repeat)
+        result["mb_per_second"] = os.path.getsize(path) / 2**20 / result["median"]
+        results[f"decrypt_db_file_{version}"] = result
+    return results
+
+
+def bench_query(
+    fixture: Fixture, count: int = 1000, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    results = {}
+    store = fixture.store("v3")
+    results["v3.get_recently_messages"] = measure(
+        lambda: store.get_recently_messages(count), repeat
+    )
+    results["v3.get_contacts"] = measure(store.get_contacts, repeat)
+    results["v3.get_rooms"] = measure(store.get_rooms, repeat)
+
+    store = fixture.store("v4")
+    table = max(
+        store.get_msg_tables(),
+        key=lambda t: store.conn.execute(f"SELECT COUNT(*) FROM {t};").fetchone()[0],
+    )
+    results["v4.get_recently_messages"] = measure(
+        lambda: store.get_recently_messages(table, count), repeat
+    )
+    results["v4.get_contacts"] = measure(store.get_contacts, repeat)
+    results["v4.get_rooms"] = measure(store.get_rooms, repeat)
+    return results
+
+
+def bench_decode(
+    fixture: Fixture, count: int = 5000, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    from wxutil.utils import (
+        decompress,
+        decompress_compress_content,
+        deserialize_bytes_extra,
+    )
+
+    results = {}
+    store = fixture.store("v3")
+    rows = store.conn.execute("SELECT * FROM MSG LIMIT ?;", (count,)).fetchall()
+    results["v3.get_event"] = measure(lambda: store.get_events(rows), repeat)
+    bytes_extras = [row[24] for row in rows if row[24]]
+    results["deserialize_bytes_extra"] = measure(
+        lambda: [deserialize_bytes_extra(data) for data in bytes_extras], repeat
+    )
+    compress_contents = [row[23] for row in rows if row[23]]
+    results["decompress_compress_content"] = measure(
+        lambda: [decompress_compress_content(data) for data in compress_contents],
+        repeat,
+    )
+
+    store = fixture.store("v4")
+    for table in store.get_msg_tables():
+        rows = store.conn.execute("""
+            SELECT
+                m.*,
+                n.user_name AS sender
+            FROM {} AS m
+            LEFT JOIN Name2Id AS n ON m.real_sender_id = n.rowid;
+            """.format(table)).fetchall()
+        if len(rows) >= 100:
+            break
+
+    def decode_v4() -> None:
+        store.cache.clear()
+        store.get_events(rows, table)
+
+    results["v4.get_event"] = measure(decode_v4, repeat)
+    message_contents = [row[12] for row in rows if isinstance(row[12], bytes)]
+    results["decompress"] = measure(
+        lambda: [decompress(data) for data in message_contents], repeat
+    )
+    for result, size in (
+        (results["v3.get_event"], count),
+        (results["v4.get_event"], len(rows)),
+    ):
+        result["rows_per_second"] = size / result["median"]
+    return results
+
+
+def bench_listener(
+    fixture: Fixture, samples: int = 10, period: float = 0.1
+) -> Dict[str, Dict[str, float]]:
+    """测量从新消息写入数据库到处理函数被调用的延迟"""
+    from tests import synthetic
+
+    results = {}
+    for version in ("v3", "v4"):
+        store = fixture.store(version)
+        info = fixture.info(version)
+        received = queue.Queue()
+
+        @store.handle()
+        def on_message(store, event):
+            received.put(time.perf_counter())
+
+        threading.Thread(target=store.run, args=(period,), daemon=True).start()
+        time.sleep(period * 5)
+        writer = synthetic.connect(
+            fixture.msg_db_path(version), fixture.key, version[1]
+        )
+        latencies = []
+        for i in range(samples):
+            content = f"listener latency {i}"
+            start = time.perf_counter()
+            if version == "v3":
+                synthetic.append_message_v3(writer, "wxid_friend000000", content)
+            else:
+                synthetic.append_message_v4(
+                    writer,
+                    info["wxid"],
+                    "wxid_friend000000",
+                    "wxid_friend000000",
+                    content,
+                )
+            try:
+                latencies.append(received.get(timeout=period * 50) - start)
+            except queue.Empty:
+                logger.warning(f"{version} listener missed message {i}")
+            time.sleep(period * 1.5)
+        writer.close()
+        if latencies:
+            results[f"{version}.listener_latency"] = {
+                "min": min(latencies),
+                "median": statistics.median(latencies),
+                "max": max(latencies),
+            }
+    return results
+
+
+def bench_metrics(
+    fixture: Fixture, count: int = 5000, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """对比开启与关闭统计时的解码耗时"""
+    from wxutil.metrics import metrics
+
+    store = fixture.store("v3")
+    rows = store.conn.execute("SELECT * FROM MSG LIMIT ?;", (count,)).fetchall()
+    results = {}
+    enabled = metrics.enabled
+    try:
+        for state in (False, True):
+            metrics.enabled = state
+            results[f"v3.get_event.metrics_{'on' if state else 'off'}"] = measure(
+                lambda: store.get_events(rows), repeat
+            )
+    finally:
+        metrics.enabled = enabled
+    return results
+
+
+def bench_members(
+    fixture: Fixture, rooms: int = 1000, room_size: int = 300, population: int = 20000
+) -> Dict[str, Dict[str, float]]:
+    """群成员列表的内存占用：list[str] 与 MemberList（wxid 驻留）对比"""
+    import random
+    import tracemalloc
+
+    from wxutil.wxids import MemberList, WxidTable
+
+    rng = random.Random(0)
+    wxids = [f"wxid_member{i:08d}" for i in range(population)]
+    # 模拟从数据库读出的 ChatRoom.UserNameList，每次查询都得到新字符串
+    user_name_lists = [
+        "^G".join(rng.sample(wxids, room_size)).encode() for _ in range(rooms)
+    ]
+
+    results = {}
+    for name, build in (
+        ("list", lambda value: value.split("^G")),
+        ("member_list", lambda value: MemberList.from_string(value, "^G", table)),
+    ):
+        table = WxidTable()
+        tracemalloc.start()
+        start = time.perf_counter()
+        kept = [build(value.decode()) for value in user_name_lists]
+        elapsed = time.perf_counter() - start
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f"rooms.{name}"] = {"median": elapsed, "mb": size / 2**20}
+        del kept
+    return results
+
+
+def bench_catchup(fixture: Fixture) -> Dict[str, Dict[str, float]]:
+    """长时间离线后一次性追赶全部消息的耗时与峰值内存（tracemalloc）。
+    两种模式都从头执行 poll()，只有每次 fetchmany 的行数不同：fetchall 一次读取整个结果集，
+    stream 每次读取 batch_size 行。1M 行：--messages 1000000"""
+    import tracemalloc
+
+    results = {}
+    for version in ("v3", "v4"):
+        for mode in ("fetchall", "stream"):
+            store = fixture.store(version)
+            store.start()
+            if mode == "fetchall":
+                store.batch_size = 2**31 - 1
+            handled = []
+
+            @store.handle()
+            def on_message(store, event):
+                handled.append(1)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            if version == "v3":
+                store.current_local_id = 0
+            else:
+                store.msg_table_max_local_id = dict.fromkeys(store.msg_tables, 0)
+                store.last_mtime = None
+            count = store.poll()
+            while len(handled) < count:
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            store.close()
+            results[f"{version}.catchup_{mode}"] = {
+                "median": elapsed,
+                "rows": count,
+                "peak_mb": peak / 2**20,
+            }
+    return results
+
+
+def bench_profile(
+    fixture: Fixture, lookups: int = 5000, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """默认连接参数与 DEFAULT_CONNECTION_PROFILE 的对比：全表扫描与按主键随机查询，
+    分别在加密库与已解密副本上测量"""
+    import random
+
+    from wxutil.store import DEFAULT_CONNECTION_PROFILE
+    from wxutil.utils import decrypt_db_file_v3, decrypt_db_file_v4
+
+    profiles = {
+        "default": dict.fromkeys(DEFAULT_CONNECTION_PROFILE),
+        "tuned": DEFAULT_CONNECTION_PROFILE,
+    }
+    results = {}
+    for version in ("v3", "v4"):
+        info = fixture.info(version)
+        encrypted_path = fixture.msg_db_path(version)
+        db_name = os.path.relpath(encrypted_path, info["data_dir"])
+        # 复制一份数据目录并把消息库替换为解密后的副本
+        plain_dir = os.path.join(fixture.root, f"{version}-plain", "data")
+        shutil.copytree(info["data_dir"], plain_dir, dirs_exist_ok=True)
+        decrypt = decrypt_db_file_v3 if version == "v3" else decrypt_db_file_v4
+        with open(os.path.join(plain_dir, db_name), "wb") as f:
+            f.write(decrypt(encrypted_path, fixture.key))
+
+        store = fixture.store(version)
+        tables = ["MSG"] if version == "v3" else store.get_msg_tables()
+        rng = random.Random(0)
+        targets = [
+            (table, rng.randint(1, 1 + fixture.messages // len(tables)))
+            for table in rng.choices(tables, k=lookups)
+        ]
+        stores = {
+            "encrypted": store,
+            "plain": type(store).from_dir(plain_dir, fixture.key, info["wxid"]),
+        }
+        for copy, store in stores.items():
+            for name, profile in profiles.items():
+                store.connection_profile = profile
+                conn = store.create_connection(db_name)
+
+                def scan() -> None:
+                    for table in tables:
+                        for _ in conn.execute(f"SELECT * FROM {table};"):
+                            pass
+
+                def lookup() -> None:
+                    for table, rowid in targets:
+                        conn.execute(
+                            f"SELECT * FROM {table} WHERE rowid = ?;", (rowid,)
+                        ).fetchone()
+
+                scan()
+                results[f"{version}.{copy}.scan.{name}"] = measure(scan, repeat)
+                results[f"{version}.{copy}.lookup.{name}"] = measure(lookup, repeat)
+                conn.close()
+            store.close()
+    return results
+
+
+def bench_supervisor(
+    fixture: Fixture, accounts: int = 8, burst: int = 5000, period: float = 0.05
+) -> Dict[str, Dict[str, float]]:
+    """多账号共用调度：一个账号瞬间写入 burst 条消息时，其余账号单条消息的处理延迟"""
+    from tests import synthetic
+    from wxutil.supervisor import Supervisor
+
+    supervisor = Supervisor(period=period)
+    writers, received = [], {}
+    for i in range(accounts):
+        info = synthetic.generate_v3(
+            os.path.join(fixture.root, "accounts", str(i)),
+            fixture.key,
+            messages=100,
+            seed=i,
+        )
+        store = supervisor.add_dir("v3", **info)
+        received[i] = queue.Queue()
+
+        @store.handle()
+        def on_message(store, event, i=i):
+            received[i].put(time.perf_counter())
+
+        path = os.path.join(info["data_dir"], "Msg", "Multi", "MSG0.db")
+        writers.append(synthetic.connect(path, fixture.key, "3"))
+
+    thread = threading.Thread(target=supervisor.run, daemon=True)
+    thread.start()
+    time.sleep(period * 10)
+
+    for i in range(burst):
+        synthetic.append_message_v3(writers[0], "wxid_friend000000", f"burst {i}")
+    start = time.perf_counter()
+    for writer in writers[1:]:
+        synthetic.append_message_v3(writer, "wxid_friend000000", "quiet")
+    latencies = [received[i].get(timeout=30) - start for i in range(1, accounts)]
+    for _ in range(burst):
+        received[0].get(timeout=60)
+    burst_elapsed = time.perf_counter() - start
+
+    supervisor.stop()
+    thread.join()
+    for writer in writers:
+        writer.close()
+    return {
+        "supervisor.quiet_latency": {
+            "min": min(latencies),
+            "median": statistics.median(latencies),
+            "max": max(latencies),
+        },
+        "supervisor.burst": {
+            "median": burst_elapsed,
+            "events_per_second": burst / burst_elapsed,
+        },
+    }
+
+
+def bench_polling(
+    fixture: Fixture, idle: float = 3.0, messages: int = 5, gap: float = 0.5
+) -> Dict[str, Dict[str, float]]:
+    """固定间隔与自适应间隔对比：空闲 idle 秒后每隔 gap 秒写入一条消息，再空闲 idle 秒，
+    统计每秒唤醒次数与检测延迟"""
+    from tests import synthetic
+
+    modes = {
+        "fixed": {"period": 0.1},
+        "adaptive": {"floor": 0.05, "ceiling": 1.0},
+    }
+    results = {}
+    for version in ("v3", "v4"):
+        info = fixture.info(version)
+        for mode, kwargs in modes.items():
+            store = fixture.store(version)
+            threading.Thread(target=store.run, kwargs=kwargs, daemon=True).start()
+            time.sleep(idle)
+            writer = synthetic.connect(
+                fixture.msg_db_path(version), fixture.key, version[1]
+            )
+            for i in range(messages):
+                if version == "v3":
+                    synthetic.append_message_v3(writer, "wxid_friend000000", f"{i}")
+                else:
+                    synthetic.append_message_v4(
+                        writer,
+                        info["wxid"],
+                        "wxid_friend000000",
+                        "wxid_friend000000",
+                        f"{i}",
+                    )
+                time.sleep(gap)
+            writer.close()
+            time.sleep(idle)
+            stats = store.get_poll_stats()
+            results[f"{version}.polling_{mode}"] = {
+                "wakeups_per_second": stats["wakeups_per_second"],
+                "median": stats["latency_median"] or 0.0,
+                "max": stats["latency_max"] or 0.0,
+            }
+    return results
+
+
+def bench_sessions(
+    fixture: Fixture, sessions: int = 3000, active: int = 5, rounds: int = 20
+) -> Dict[str, Dict[str, float]]:
+    """会话很多但只有少数活跃时，检查所有 Msg_* 表与对比 SessionTable 快照的单次 poll 耗时，
+    以及 start 载入撤回窗口的耗时"""
+    from tests import synthetic
+    from wxutil.db_v4 import WeChatDB
+    from wxutil.utils import get_db_key
+
+    info = synthetic.generate_v4(
+        os.path.join(fixture.root, "sessions"),
+        fixture.key,
+        contacts=sessions,
+        rooms=0,
+        messages=sessions * 2,
+    )
+    data_dir = os.path.join(info["data_dir"], "db_storage")
+    msg_writer = synthetic.connect(
+        os.path.join(data_dir, "message", "message_0.db"), fixture.key, "4"
+    )
+    session_writer = synthetic.connect(
+        os.path.join(data_dir, "session", "session.db"), fixture.key, "4"
+    )
+    talkers = [f"wxid_friend{i:06d}" for i in range(active)]
+    # session.db 的密钥按 salt 缓存，预先派生，start 的耗时不计入一次性的 PBKDF2
+    get_db_key(fixture.key, os.path.join(data_dir, "session", "session.db"), "4")
+
+    results = {}
+    for mode in ("tables", "session"):
+        store = WeChatDB.from_dir(**info, listen_mode=mode)
+        start = time.perf_counter()
+        store.start()
+        results[f"v4.sessions_{mode}_start"] = {
+            "median": time.perf_counter() - start,
+            "recent": len(store.recent_messages),
+        }
+        store.poll()
+        timings, events = [], 0
+        for i in range(rounds):
+            for talker in talkers:
+                local_id = synthetic.append_message_v4(
+                    msg_writer, info["wxid"], talker, talker, f"{mode} {i}"
+                )
+                synthetic.update_session_v4(
+                    session_writer, talker, local_id, f"{mode} {i}", sender=talker
+                )
+            start = time.perf_counter()
+            events += store.poll()
+            timings.append(time.perf_counter() - start)
+        store.close()
+        results[f"v4.sessions_{mode}"] = {
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "events": events,
+        }
+    msg_writer.close()
+    session_writer.close()
+    return results
+
+
+def bench_search(
+    fixture: Fixture, keyword: str = "message 123", repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """关键词搜索：逐条解码全部消息再过滤，与查询微信自带的全文索引
+    （分词器可用时 MATCH，不可用时读取 _content 影子表）对比"""
+    from tests import synthetic
+    from wxutil import db_v3, db_v4
+
+    results = {}
+    for version in ("v3", "v4"):
+        if version == "v3":
+            generate, build_fts = synthetic.generate_v3, synthetic.build_fts_v3
+            WeChatDB = db_v3.WeChatDB
+        else:
+            generate, build_fts = synthetic.generate_v4, synthetic.build_fts_v4
+            WeChatDB = db_v4.WeChatDB
+        for mode in ("match", "content"):
+            info = generate(
+                os.path.join(fixture.root, "search", version, mode),
+                fixture.key,
+                messages=fixture.messages,
+            )
+            build_fts(info, mm_tokenizer=mode == "content")
+            store = WeChatDB.from_dir(**info)
+            if mode == "match":
+                results[f"{version}.search_scan"] = measure(
+                    lambda: [
+                        event
+                        for event in store.iter_messages()
+                        if isinstance(event["msg"], str) and keyword in event["msg"]
+                    ],
+                    repeat,
+                )
+            results[f"{version}.search_fts_{mode}"] = measure(
+                lambda: store.search_messages(keyword), repeat
+            )
+            store.close()
+    return results
+
+
+def bench_voices(fixture: Fixture) -> Dict[str, Dict[str, float]]:
+    """导出语音最多的会话：只导出 silk（分块读取 BLOB）与转码为 wav 的吞吐量"""
+    from collections import Counter
+
+    from tests import synthetic
+
+    results = {}
+    for version in ("v3", "v4"):
+        info = fixture.info(version)
+        media_db = (
+            os.path.join(info["data_dir"], "Msg", "Multi", "MediaMSG0.db")
+            if version == "v3"
+            else os.path.join(info["data_dir"], "db_storage", "message", "media_0.db")
+        )
+        if not os.path.exists(media_db):
+            build_media = (
+                synthetic.build_media_v3
+                if version == "v3"
+                else synthetic.build_media_v4
+            )
+            build_media(info)
+        store = fixture.store(version)
+        talkers = Counter(
+            store.normalize_event(event)["talker"]
+            for event in store.iter_messages(types=[34])
+        )
+        talker = talkers.most_common(1)[0][0]
+        for format in ("silk", "wav"):
+            dst = os.path.join(fixture.root, "voices", version, format)
+            shutil.rmtree(dst, ignore_errors=True)
+            stats = store.export_voices(talker, dst, format)
+            results[f"{version}.voices_{format}"] = {
+                "median": stats["seconds"],
+                "voices": stats["voices"],
+                "voices_per_second": stats["voices_per_second"],
+                "bytes_per_second": stats["bytes_per_second"],
+            }
+        store.close()
+    return results
+
+
+def bench_media(
+    fixture: Fixture, sample: int = 50, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """按 md5 查找 sample 张图片的附件路径：遍历附件目录（glob）与 hardlink 索引对比，
+    另外记录索引的首次加载时间"""
+    import glob
+
+    from tests import synthetic
+    from wxutil.hardlink import HardlinkIndex
+
+    results = {}
+    for version in ("v3", "v4"):
+        info = fixture.info(version)
+        if version == "v3":
+            hardlink_db = os.path.join(info["data_dir"], "Msg", "HardLinkImage.db")
+            attach_dir = os.path.join(info["data_dir"], "FileStorage", "MsgAttach")
+            build_hardlink, image_type = synthetic.build_hardlink_v3, (3, 0)
+        else:
+            hardlink_db = os.path.join(
+                info["data_dir"], "db_storage", "hardlink", "hardlink.db"
+            )
+            attach_dir = os.path.join(info["data_dir"], "msg", "attach")
+            build_hardlink, image_type = synthetic.build_hardlink_v4, 3
+        if not os.path.exists(hardlink_db):
+            build_hardlink(info)
+        store = fixture.store(version)
+        md5s = [
+            store.get_media_md5(event)[1]
+            for event in store.iter_messages(types=[image_type])
+        ][:sample]
+
+        results[f"{version}.media_glob"] = measure(
+            lambda: [
+                glob.glob(os.path.join(attach_dir, "**", f"{md5}*"), recursive=True)
+                for md5 in md5s
+            ],
+            repeat,
+        )
+        results[f"{version}.media_index_load"] = measure(
+            lambda: HardlinkIndex(
+                store.data_dir, store.get_hardlink_sources(), store.get_connection
+            ).refresh(),
+            repeat,
+        )
+        store.hardlink_index.refresh()
+        results[f"{version}.media_index"] = measure(
+            lambda: [store.hardlink_index.get(md5, "image") for md5 in md5s], repeat
+        )
+        store.close()
+    return results
+
+
+def bench_avatars(fixture: Fixture, repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """读取全部联系人头像：首次读取（查询数据库）与命中 LRU 缓存，以及导出到内容寻址目录"""
+    from tests import synthetic
+
+    results = {}
+    for version in ("v3", "v4"):
+        info = fixture.info(version)
+        if version == "v3":
+            avatar_db = os.path.join(info["data_dir"], "Msg", "Misc.db")
+            build_avatars = synthetic.build_avatars_v3
+        else:
+            avatar_db = os.path.join(
+                info["data_dir"], "db_storage", "head_image", "head_image.db"
+            )
+            build_avatars = synthetic.build_avatars_v4
+        if not os.path.exists(avatar_db):
+            build_avatars(info)
+        store = fixture.store(version)
+        store.avatar_cache.refresh()
+        wxids = list(store.avatar_cache.meta)
+
+        def cold() -> None:
+            store.avatar_cache.images.clear()
+            store.avatar_cache.size = 0
+            for wxid in wxids:
+                store.get_avatar(wxid)
+
+        results[f"{version}.avatars_cold"] = measure(cold, repeat)
+        results[f"{version}.avatars_cached"] = measure(
+            lambda: [store.get_avatar(wxid) for wxid in wxids], repeat
+        )
+        dst = os.path.join(fixture.root, "avatars", version)
+        shutil.rmtree(dst, ignore_errors=True)
+        results[f"{version}.avatars_export"] = measure(
+            lambda: store.export_avatars(dst), 1
+        )
+        store.close()
+    return results
+
+
+def bench_sns(
+    fixture: Fixture, posts: int = 5000, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """朋友圈：读取全部并解析每条 XML、只读取不解析（按需解析），
+    以及检查点之后只有少量新动态时的增量同步"""
+    from itertools import islice
+
+    from tests import synthetic
+
+    info = fixture.info("v4")
+    if not os.path.exists(
+        os.path.join(info["data_dir"], "db_storage", "sns", "sns.db")
+    ):
+        synthetic.append_sns_v4(info, posts=posts, messages=posts // 2)
+    store = fixture.store("v4")
+    results = {
+        "v4.sns_parse_all": measure(
+            lambda: [post.xml for post in store.iter_sns_posts()], repeat
+        ),
+        "v4.sns_lazy": measure(lambda: list(store.iter_sns_posts()), repeat),
+        "v4.sns_first_page": measure(
+            lambda: [
+                post.text for post in islice(store.iter_sns_posts(page_size=20), 20)
+            ],
+            repeat,
+        ),
+    }
+    store.sync_sns()
+    # 每轮先追加 5 条动态与 5 条通知（不计时），再计时增量同步
+    timings = []
+    for i in range(repeat):
+        synthetic.append_sns_v4(info, posts=5, messages=5, seed=i + 1)
+        started = time.perf_counter()
+        new_posts, _ = store.sync_sns()
+        [post.xml for post in new_posts]
+        timings.append(time.perf_counter() - started)
+    results["v4.sns_sync"] = {
+        "min": min(timings),
+        "median": statistics.median(timings),
+    }
+    store.close()
+    return results
+
+
+def bench_favorites(
+    fixture: Fixture, items: int = 5000, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """收藏：打开加密数据库时派生密钥与命中密钥缓存的耗时，列出、搜索与分批导出"""
+    from tests import synthetic
+    from wxutil.favorite import FAVORITE_DB
+    from wxutil.utils import derive_db_key
+
+    info = fixture.info("v4")
+    if not os.path.exists(
+        os.path.join(info["data_dir"], "db_storage", "hardlink", "hardlink.db")
+    ):
+        synthetic.build_hardlink_v4(info)
+    if not os.path.exists(
+        os.path.join(info["data_dir"], "db_storage", "favorite", "favorite.db")
+    ):
+        synthetic.build_favorites_v4(info, items=items, mm_tokenizer=True)
+    store = fixture.store("v4")
+
+    def connect(cached: bool) -> None:
+        if not cached:
+            derive_db_key.cache_clear()
+        store.create_connection(FAVORITE_DB).close()
+
+    results = {
+        "v4.favorites_connect_kdf": measure(lambda: connect(False), repeat),
+        "v4.favorites_connect_cached": measure(lambda: connect(True), repeat),
+        "v4.favorites_list": measure(lambda: list(store.iter_favorites()), repeat),
+        "v4.favorites_search": measure(
+            lambda: store.search_favorites("favorite 123"), repeat
+        ),
+    }
+    # 附件为三种格式轮流的加密 .dat；错误的 AES 密钥只让 V2 格式的附件失败
+    for name, aes_key in (("export", synthetic.DAT_AES_KEY), ("wrong_key", b"0" * 16)):
+        dst = os.path.join(fixture.root, "favorites")
+        shutil.rmtree(dst, ignore_errors=True)
+        stats = store.export_favorites(
+            dst, xor_key=synthetic.DAT_XOR_KEY, aes_key=aes_key
+        )
+        results[f"v4.favorites_{name}"] = {
+            "median": stats["seconds"],
+            "favorites": stats["favorites"],
+            "media": stats["media"],
+            "failed": stats["failed"],
+            "bytes": stats["bytes"],
+        }
+    store.close()
+    return results
+
+
+def bench_biz(
+    fixture: Fixture, articles: int = 2000, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """公众号消息：普通消息从写入到处理函数被调用的延迟（空闲与 articles 条公众号推送积压时），
+    以及公众号消息在独立队列中的处理速度；每条消息的处理函数耗时 1ms"""
+    import threading
+
+    from tests import synthetic
+
+    info = fixture.info("v4")
+    synthetic.append_biz_v4(info, 1)
+    store = fixture.store("v4")
+    store.biz_interval = 0.05
+    received = threading.Event()
+    biz_count = [0]
+
+    @store.handle()
+    def on_message(store: Any, event: Dict) -> None:
+        time.sleep(0.001)
+        if event["biz"]:
+            biz_count[0] += 1
+        else:
+            received.set()
+
+    store.start()
+    conn = synthetic.connect(fixture.msg_db_path("v4"), info["key"], "4")
+
+    def latency(flood: int) -> float:
+        if flood:
+            synthetic.append_biz_v4(info, flood)
+        received.clear()
+        started = time.perf_counter()
+        synthetic.append_message_v4(
+            conn, info["wxid"], "wxid_bench_biz", "wxid_bench_biz", "ping"
+        )
+        while not received.is_set():
+            store.poll()
+            received.wait(0.005)
+        return time.perf_counter() - started
+
+    results = {}
+    for name, flood in (("idle", 0), ("flood", articles)):
+        timings = [latency(flood) for _ in range(repeat)]
+        results[f"v4.biz_main_latency_{name}"] = {
+            "min": min(timings),
+            "median": statistics.median(timings),
+        }
+    started = time.perf_counter()
+    total = articles * repeat
+    while biz_count[0] < total:
+        store.poll()
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    results["v4.biz_drain"] = {"seconds": elapsed, "articles": biz_count[0]}
+    conn.close()
+    store.close()
+    return results
+
+
+def bench_revoke(
+    fixture: Fixture, revokes: int = 200, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """撤回关联：从环形缓冲中取原消息与按 server_id 查询历史（每条撤回一次查询）"""
+    store = fixture.store("v4")
+    store.revoke_window = 10**10
+    store.start()
+    events = list(store.recent_messages.data.values())[-revokes:]
+
+    def query() -> None:
+        for event in events:
+            with store.conn:
+                row = store.conn.execute(
+                    """
+                    SELECT
+                        m.*,
+                        n.user_name AS sender
+                    FROM {} AS m
+                    LEFT JOIN Name2Id AS n ON m.real_sender_id = n.rowid
+                    WHERE m.server_id = ?;
+                    """.format(event["table"]),
+                    (event["msg_id"],),
+                ).fetchone()
+            store.get_event(event["table"], row)
+
+    results = {
+        "v4.revoke_buffer": measure(
+            lambda: [store.recent_messages.get(event["msg_id"]) for event in events],
+            repeat,
+        ),
+        "v4.revoke_query": measure(query, repeat),
+    }
+    store.close()
+
+    # 3.x：撤回时限内的全部消息都在窗口中，每次 poll 只在 SQLite 中筛出被改写的行
+    from tests import synthetic
+
+    store = fixture.store("v3")
+    store.revoke_window = 10**10
+    store.start()
+    received = queue.Queue()
+    store.on_revoke(lambda store, revoke: received.put(revoke))
+    writer = synthetic.connect(fixture.msg_db_path("v3"), fixture.key, "3")
+    timings, matched = [], 0
+    for i in range(repeat):
+        msg_svr_id = 2 * 10**13 + i
+        synthetic.append_message_v3(
+            writer, "wxid_friend000000", f"revoke {i}", msg_svr_id=msg_svr_id
+        )
+        time.sleep(0.01)
+        store.poll()
+        synthetic.append_revoke_message_v3(writer, "wxid_friend000000", msg_svr_id)
+        time.sleep(0.01)
+        start = time.perf_counter()
+        store.poll()
+        timings.append(time.perf_counter() - start)
+        revoke = received.get(timeout=5)
+        matched += bool(revoke["revoked_message"]) and revoke["msg_id"] == msg_svr_id
+    if matched != repeat:
+        logger.warning(f"v3 matched {matched} of {repeat} revokes")
+    results["v3.revoke_poll"] = {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "window": len(store.recent_messages),
+    }
+    writer.close()
+    store.close()
+    return results
+
+
+def bench_inbox(
+    fixture: Fixture, sessions: int = 3000, active: int = 5, rounds: int = 10
+) -> Dict[str, Dict[str, float]]:
+    """会话列表：每轮 active 个会话收到新消息后，取完整列表与按 version 只取变化部分的耗时"""
+    from tests import synthetic
+    from wxutil.db_v4 import WeChatDB
+
+    info = synthetic.generate_v4(
+        os.path.join(fixture.root, "inbox"),
+        fixture.key,
+        contacts=sessions,
+        rooms=0,
+        messages=sessions,
+    )
+    session_writer = synthetic.connect(
+        os.path.join(info["data_dir"], "db_storage", "session", "session.db"),
+        fixture.key,
+        "4",
+    )
+    talkers = [f"wxid_friend{i:06d}" for i in range(active)]
+    store = WeChatDB.from_dir(**info)
+    version = store.get_sessions()["version"]
+
+    results = {}
+    for name in ("full", "delta"):
+        timings, rows = [], 0
+        for i in range(rounds):
+            for talker in talkers:
+                synthetic.update_session_v4(
+                    session_writer, talker, 10**6 + i, f"{name} {i}", sender=talker
+                )
+            start = time.perf_counter()
+            result = store.get_sessions(None if name == "full" else version)
+            timings.append(time.perf_counter() - start)
+            version = result["version"]
+            rows += len(result["sessions"])
+        results[f"v4.inbox_{name}"] = {
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "rows": rows / rounds,
+        }
+    results["v4.inbox_unchanged"] = measure(lambda: store.get_sessions(version), 20)
+    session_writer.close()
+    store.close()
+    return results
+
+
+def bench_keyscan(
+    fixture: Fixture,
+    size: int = 4 * 1024 * 1024,
+    chunk_size: int = 256 * 1024,
+    repeat: int = 5,
+) -> Dict[str, Dict[str, float]]:
+    """在合成的进程内存中搜索图片 AES 密钥：经 read 钩子分块读取，密钥横跨块边界，
+    对比每块复制为 bytes 与复用缓冲区的 memoryview；default 不传 read，
+    走 search_memory_chunk 默认的线程缓冲区路径，只把 ReadProcessMemory 换成复制合成内存"""
+    import ctypes
+
+    import yara
+
+    from tests import synthetic
+    from wxutil import process
+    from wxutil.process import AES_KEY_RULE, search_memory_chunk, verify
+
+    memory, encrypted, key = synthetic.make_process_memory(
+        size=size, chunk_size=chunk_size
+    )
+    rules = yara.compile(source=AES_KEY_RULE)
+    buffer = ctypes.create_string_buffer(chunk_size)
+    view = memoryview(buffer).cast("B")
+
+    def read_bytes(address: int, size: int) -> bytes:
+        buffer[:size] = memory[address : address + size]
+        return ctypes.string_at(buffer, size)
+
+    def read_view(address: int, size: int) -> memoryview:
+        buffer[:size] = memory[address : address + size]
+        return view[:size]
+
+    def read_into(process_handle: Any, address: int, buffer: Any, size: int) -> int:
+        size = max(0, min(size, len(memory) - address))
+        ctypes.memmove(buffer, memory[address : address + size], size)
+        return size
+
+    results = {}
+    read_process_memory_into = process.read_process_memory_into
+    process.read_process_memory_into = read_into
+    try:
+        for name, read in (
+            ("bytes", read_bytes),
+            ("memoryview", read_view),
+            ("default", None),
+        ):
+
+            def search() -> None:
+                verify.cache_clear()
+                found = search_memory_chunk(
+                    None,
+                    0,
+                    len(memory),
+                    encrypted,
+                    rules,
+                    chunk_size=chunk_size,
+                    read=read,
+                )
+                if found != key[:16]:
+                    logger.warning(
+                        f"keyscan.{name} found {found!r}, expected {key[:16]!r}"
+                    )
+
+            results[f"keyscan.{name}"] = measure(search, repeat)
+    finally:
+        process.read_process_memory_into = read_process_memory_into
+    # 没有重叠时，横跨块边界的密钥无法匹配
+    memory, encrypted, key = synthetic.make_process_memory(
+        size=chunk_size * 4, chunk_size=chunk_size, overlap=0
+    )
+    missed = search_memory_chunk(
+        None,
+        0,
+        len(memory),
+        encrypted,
+        rules,
+        chunk_size=chunk_size,
+        overlap=0,
+        read=read_view,
+    )
+    if missed is not None:
+        logger.warning("keyscan matched a key across a chunk boundary without overlap")
+    return results
+
+
+def bench_keys(fixture: Fixture, candidates: int = 64) -> Dict[str, Dict[str, float]]:
+    """校验数据库密钥：正确的密钥通过、错误的密钥不通过；KeyVerifier 在 candidates 个候选中
+    找到正确的密钥后不再读取剩余候选"""
+    import random
+
+    from tests import synthetic
+    from wxutil.utils import KeyVerifier
+
+    rng = random.Random(0)
+    key = bytes.fromhex(fixture.key)
+    wrong_keys = [synthetic.random_bytes(rng, 32) for _ in range(candidates)]
+    results = {}
+    for version in ("v3", "v4"):
+        verifier = KeyVerifier(fixture.msg_db_path(version), version=version[1:])
+        if not verifier.verify(key) or verifier.verify(wrong_keys[0]):
+            logger.warning(
+                f"{version} verify_db_key accepted a wrong key or rejected the right one"
+            )
+
+        verifier = KeyVerifier(fixture.msg_db_path(version), version=version[1:])
+        read = []
+
+        def iter_candidates() -> Iterable[bytes]:
+            half = candidates // 2
+            for candidate in wrong_keys[:half] + [key] + wrong_keys[half:]:
+                read.append(candidate)
+                yield candidate
+
+        start = time.perf_counter()
+        found = verifier.find(iter_candidates())
+        elapsed = time.perf_counter() - start
+        if found != key:
+            logger.warning(f"{version} KeyVerifier did not find the key")
+        results[f"{version}.find_key"] = {"median": elapsed, "read": len(read)}
+    return results
+
+
+BENCHMARKS = {
+    "decrypt": bench_decrypt,
+    "query": bench_query,
+    "decode": bench_decode,
+    "listener": bench_listener,
+    "metrics": bench_metrics,
+    "members": bench_members,
+    "catchup": bench_catchup,
+    "profile": bench_profile,
+    "supervisor": bench_supervisor,
+    "polling": bench_polling,
+    "sessions": bench_sessions,
+    "search": bench_search,
+    "voices": bench_voices,
+    "media": bench_media,
+    "avatars": bench_avatars,
+    "sns": bench_sns,
+    "favorites": bench_favorites,
+    "biz": bench_biz,
+    "revoke": bench_revoke,
+    "inbox": bench_inbox,
+    "keyscan": bench_keyscan,
+    "keys": bench_keys,
+}
+
+
+def run(names: List[str], messages: int = 20000, root: str = None) -> Dict[str, Any]:
+    results = {}
+    if "import" in names:
+        results.update(bench_import())
+    names = [name for name in names if name in BENCHMARKS]
+    if not names:
+        return results
+
+    tmp_dir = root or tempfile.mkdtemp(prefix="wxutil-bench-")
+    try:
+        fixture = Fixture(tmp_dir, messages)
+        for name in names:
+            results.update(BENCHMARKS[name](fixture))
+    finally:
+        if root is None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="wxutil benchmarks")
+    parser.add_argument(
+        "names",
+        nargs="*",
+        default=["import", *BENCHMARKS],
+        help=f"benchmarks to run: import, {', '.join(BENCHMARKS)}",
+    )
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--root", help="keep the synthetic databases in this directory")
+    args = parser.parse_args()
+
+    for name, result in run(args.names, args.messages, args.root).items():
+        logger.info(
+            f"{name}: "
+            + " ".join(
+                (
+                    f"{k}={v * 1000:.2f}ms"
+                    if k in ("min", "median", "max")
+                    else f"{k}={v:.1f}"
+                )
+                for k, v in result.items()
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from tests import synthetic
+
+
+@pytest.fixture(scope="session")
+def key() -> str:
+    return synthetic.random_key()
+
+
+@pytest.fixture
+def v3_info(tmp_path, key):
+    return synthetic.generate_v3(
+        os.path.join(tmp_path, "v3"), key, contacts=5, rooms=1, messages=50
+    )
+
+
+@pytest.fixture
+def v4_info(tmp_path, key):
+    return synthetic.generate_v4(
+        os.path.join(tmp_path, "v4"), key, contacts=5, rooms=1, messages=50
+    )
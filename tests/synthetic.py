@@ -0,0 +1,1331 @@
+"""
+Description: 生成与微信 3.x/4.x 结构一致的合成数据库（可选 SQLCipher 加密），
+用于在没有微信客户端的环境（如 Linux）中测试与基准测试。不随 wxutil 发布。
+"""
+
+import hashlib
+import os
+import random
+import re
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from sqlcipher3 import dbapi2 as sqlite
+
+# 合成 .dat 附件使用的密钥
+DAT_XOR_KEY = 0x5A
+DAT_AES_KEY = b"synthetic0aeskey"
+
+V3_MESSAGE_MIX = {
+    (1, 0): 70,
+    (3, 0): 10,
+    (34, 0): 4,
+    (47, 0): 5,
+    (49, 5): 4,
+    (49, 57): 5,
+    (10000, 0): 2,
+}
+
+V4_MESSAGE_MIX = {
+    1: 70,
+    3: 10,
+    34: 4,
+    47: 5,
+    21474836529: 4,
+    244813135921: 5,
+    10000: 2,
+}
+
+V3_SCHEMA = {
+    "MSG": [
+        "CREATE TABLE MSG(localId INTEGER PRIMARY KEY AUTOINCREMENT, TalkerId INT DEFAULT 0, MsgSvrID INT, Type INT, SubType INT, IsSender INT, CreateTime INT, Sequence INT DEFAULT 0, StatusEx INT DEFAULT 0, FlagEx INT, Status INT, MsgServerSeq INT, MsgSequence INT, StrTalker TEXT, StrContent TEXT DEFAULT '', DisplayContent TEXT, Reserved0 INT DEFAULT 0, Reserved1 INT DEFAULT 0, Reserved2 INT DEFAULT 0, Reserved3 INT DEFAULT 0, Reserved4 TEXT, Reserved5 TEXT, Reserved6 TEXT, CompressContent BLOB, BytesExtra BLOB, BytesTrans BLOB)",
+        "CREATE TABLE Name2ID(UsrName TEXT PRIMARY KEY)",
+        "CREATE INDEX MSG_CREATETIME ON MSG(CreateTime)",
+        "CREATE INDEX MSG_TALKER_CREATETIME ON MSG(StrTalker, CreateTime)",
+        "CREATE INDEX MSG_MSGSVRID ON MSG(MsgSvrID)",
+    ],
+    "MicroMsg": [
+        "CREATE TABLE Contact(UserName TEXT PRIMARY KEY, Alias TEXT, EncryptUserName TEXT, DelFlag INTEGER DEFAULT 0, Type INTEGER DEFAULT 0, VerifyFlag INTEGER DEFAULT 0, Reserved1 INTEGER DEFAULT 0, Reserved2 INTEGER DEFAULT 0, Reserved3 TEXT, Reserved4 TEXT, Remark TEXT, NickName TEXT, LabelIDList TEXT, DomainList TEXT, ChatRoomType int, PYInitial TEXT, QuanPin TEXT, RemarkPYInitial TEXT, RemarkQuanPin TEXT, BigHeadImgUrl TEXT, SmallHeadImgUrl TEXT, HeadImgMd5 TEXT, ChatRoomNotify INTEGER DEFAULT 0, Reserved5 INTEGER DEFAULT 0, Reserved6 TEXT, Reserved7 TEXT, ExtraBuf BLOB, Reserved8 INTEGER DEFAULT 0, Reserved9 INTEGER DEFAULT 0, Reserved10 TEXT, Reserved11 TEXT)",
+        "CREATE TABLE ContactHeadImgUrl(usrName TEXT PRIMARY KEY, smallHeadImgUrl TEXT, bigHeadImgUrl TEXT, headImgMd5 TEXT, reverse0 INT, reverse1 TEXT)",
+        "CREATE TABLE ContactLabel(LabelId INTEGER PRIMARY KEY, LabelName TEXT, CreateTime INTEGER)",
+        "CREATE TABLE ChatRoom(ChatRoomName TEXT PRIMARY KEY, UserNameList TEXT, DisplayNameList TEXT, ChatRoomFlag int Default 0, Owner INTEGER DEFAULT 0, IsShowName INTEGER DEFAULT 0, SelfDisplayName TEXT, Reserved1 INTEGER DEFAULT 0, Reserved2 TEXT, Reserved3 INTEGER DEFAULT 0, Reserved4 TEXT, Reserved5 INTEGER DEFAULT 0, Reserved6 TEXT, RoomData BLOB, Reserved7 INTEGER DEFAULT 0, Reserved8 TEXT)",
+        "CREATE TABLE ChatRoomInfo(ChatRoomName TEXT PRIMARY KEY, Announcement TEXT, InfoVersion INTEGER DEFAULT 0, AnnouncementEditor TEXT, AnnouncementPublishTime INTEGER DEFAULT 0, ChatRoomStatus INTEGER DEFAULT 0, Reserved1 INTEGER DEFAULT 0, Reserved2 TEXT, Reserved3 INTEGER DEFAULT 0, Reserved4 TEXT, Reserved5 INTEGER DEFAULT 0, Reserved6 TEXT, Reserved7 INTEGER DEFAULT 0, Reserved8 TEXT)",
+        "CREATE TABLE Session(strUsrName TEXT PRIMARY KEY, nOrder INT DEFAULT 0, nUnReadCount INTEGER DEFAULT 0, parentRef TEXT, Reserved0 INTEGER DEFAULT 0, Reserved1 TEXT, strNickName TEXT, nStatus INTEGER, nIsSend INTEGER, strContent TEXT, nMsgType INTEGER, nMsgLocalID INTEGER, nMsgStatus INTEGER, nTime INTEGER, editContent TEXT, othersAtMe INT, Reserved2 INTEGER DEFAULT 0, Reserved3 TEXT, Reserved4 INTEGER DEFAULT 0, Reserved5 TEXT, bytesXml BLOB)",
+    ],
+    "OpenIMContact": [
+        "CREATE TABLE OpenIMContact(UserName TEXT PRIMARY KEY, NickName TEXT, Type INTEGER DEFAULT 0, Remark TEXT, BigHeadImgUrl TEXT, SmallHeadImgUrl TEXT, Source INTEGER DEFAULT 0, NickNamePYInit TEXT, NickNameQuanPin TEXT, CustomInfoDetail TEXT, CustomInfoDetailVisible INTEGER DEFAULT 0, AntiSpamTicket TEXT, AppId TEXT, Sex INTEGER DEFAULT 0, DescWordingId TEXT, ExtraBuf BLOB)",
+    ],
+}
+
+V4_MSG_TABLE = "CREATE TABLE {}(local_id INTEGER PRIMARY KEY AUTOINCREMENT, server_id INTEGER, local_type INTEGER, sort_seq INTEGER, real_sender_id INTEGER, create_time INTEGER, status INTEGER, upload_status INTEGER, download_status INTEGER, server_seq INTEGER, origin_source INTEGER, source TEXT, message_content TEXT, compress_content TEXT, packed_info_data BLOB, WCDB_CT_message_content INTEGER DEFAULT NULL, WCDB_CT_source INTEGER DEFAULT NULL)"
+
+V4_MSG_TABLE_INDEXES = [
+    "CREATE INDEX {0}_SENDERID ON {0}(real_sender_id)",
+    "CREATE INDEX {0}_SERVERID ON {0}(server_id)",
+    "CREATE INDEX {0}_SORTSEQ ON {0}(sort_seq)",
+    "CREATE INDEX {0}_TYPE_SEQ ON {0}(local_type, sort_seq)",
+]
+
+V4_SCHEMA = {
+    "message": [
+        "CREATE TABLE Name2Id(user_name TEXT PRIMARY KEY)",
+        "CREATE TABLE TimeStamp(timestamp INTEGER)",
+    ],
+    "contact": [
+        "CREATE TABLE chat_room(id INTEGER PRIMARY KEY, username TEXT, owner TEXT, ext_buffer BLOB)",
+        "CREATE TABLE chat_room_info_detail(room_id_ INTEGER PRIMARY KEY, username_ TEXT, announcement_ TEXT, announcement_editor_ TEXT, announcement_publish_time_ INTEGER, chat_room_status_ INTEGER, room_top_msg_closed_id_list_text_ TEXT, xml_announcement_ TEXT, ext_buffer_ BLOB)",
+        "CREATE TABLE chatroom_member(room_id INTEGER, member_id INTEGER, CONSTRAINT room_member UNIQUE(room_id, member_id))",
+        "CREATE TABLE contact(id INTEGER PRIMARY KEY, username TEXT, local_type INTEGER, alias TEXT, encrypt_username TEXT, flag INTEGER, delete_flag INTEGER, verify_flag INTEGER, remark TEXT, remark_quan_pin TEXT, remark_pin_yin_initial TEXT, nick_name TEXT, pin_yin_initial TEXT, quan_pin TEXT, big_head_url TEXT, small_head_url TEXT, head_img_md5 TEXT, chat_room_notify INTEGER, is_in_chat_room INTEGER, description TEXT, extra_buffer BLOB, chat_room_type INTEGER)",
+        "CREATE TABLE contact_label(label_id_ INTEGER PRIMARY KEY, label_name_ TEXT, sort_order_ INTEGER)",
+        "CREATE INDEX chatroom_member_member_id ON chatroom_member(member_id)",
+        "CREATE INDEX chatroom_member_room_id ON chatroom_member(room_id)",
+        "CREATE INDEX contact_localType ON contact(local_type)",
+    ],
+    "session": [
+        "CREATE TABLE SessionTable(username TEXT PRIMARY KEY, type INTEGER, unread_count INTEGER, unread_first_msg_srv_id INTEGER, is_hidden INTEGER, summary TEXT, draft TEXT, status INTEGER, last_timestamp INTEGER, sort_timestamp INTEGER, last_clear_unread_timestamp INTEGER, last_msg_locald_id INTEGER, last_msg_type INTEGER, last_msg_sub_type INTEGER, last_msg_sender TEXT, last_sender_display_name TEXT)",
+        "CREATE INDEX SessionTable_TYPE ON SessionTable(type)",
+    ],
+}
+
+
+def connect(
+    path: str, key: Optional[str] = None, version: str = "3"
+) -> sqlite.Connection:
+    """打开（或新建）一个合成数据库，传入 key 时按微信的参数进行 SQLCipher 加密"""
+    conn = sqlite.connect(path, check_same_thread=False)
+    if key is None:
+        return conn
+
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            salt = f.read(16)
+    else:
+        salt = os.urandom(16)
+    pass_bytes = bytes.fromhex(key)
+    if version.startswith("3"):
+        db_key = hashlib.pbkdf2_hmac("sha1", pass_bytes, salt, 64000, 32)
+        hmac_algorithm, kdf_algorithm, kdf_iter = "SHA1", "SHA1", 64000
+    else:
+        db_key = hashlib.pbkdf2_hmac("sha512", pass_bytes, salt, 256000, 32)
+        hmac_algorithm, kdf_algorithm, kdf_iter = "SHA512", "SHA512", 256000
+    conn.execute(f"PRAGMA key = \"x'{(db_key + salt).hex()}'\";")
+    conn.execute("PRAGMA cipher_page_size = 4096;")
+    conn.execute(f"PRAGMA kdf_iter = {kdf_iter};")
+    conn.execute(f"PRAGMA cipher_hmac_algorithm = HMAC_{hmac_algorithm};")
+    conn.execute(f"PRAGMA cipher_kdf_algorithm = PBKDF2_HMAC_{kdf_algorithm};")
+    return conn
+
+
+def encode_varint(value: int) -> bytes:
+    data = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return bytes(data)
+
+
+def encode_field(number: int, value: Any) -> bytes:
+    if isinstance(value, int):
+        return encode_varint(number << 3) + encode_varint(value)
+    if isinstance(value, str):
+        value = value.encode()
+    return encode_varint(number << 3 | 2) + encode_varint(len(value)) + value
+
+
+def make_bytes_extra(sender: Optional[str], msgsource: str) -> bytes:
+    """按 3.x BytesExtra 的 protobuf 结构编码：3[0] 为发送者，3[1] 为 msgsource"""
+    data = encode_field(1, encode_field(1, 1) + encode_field(2, 0))
+    if sender:
+        data += encode_field(3, encode_field(1, 1) + encode_field(2, sender))
+    data += encode_field(3, encode_field(1, 7) + encode_field(2, msgsource))
+    return data
+
+
+def make_msgsource(at_user_list: Tuple[str, ...] = ()) -> str:
+    atuserlist = (
+        f"<atuserlist>{','.join(at_user_list)}</atuserlist>" if at_user_list else ""
+    )
+    return f"<msgsource>{atuserlist}<silence>0</silence><membercount>0</membercount></msgsource>"
+
+
+def make_content(type: int, sub_type: int, index: int, talker: str) -> str:
+    if type == 1:
+        return f"synthetic message {index} " + "hello " * (index % 7 + 1)
+    if type == 3:
+        md5 = hashlib.md5(f"image{index}".encode()).hexdigest()
+        return f'<?xml version="1.0"?><msg><img md5="{md5}" length="{1000 + index}" /></msg>'
+    if type == 10000:
+        return f'<sysmsg type="revokemsg"><revokemsg><session>{talker}</session><newmsgid>{index}</newmsgid><replacemsg>"someone" recalled a message</replacemsg></revokemsg></sysmsg>'
+    if type == 49:
+        return f"<msg><appmsg><title>synthetic appmsg {index}</title><type>{sub_type}</type><md5>{hashlib.md5(str(index).encode()).hexdigest()}</md5></appmsg></msg>"
+    return f'<msg><synthetic type="{type}" index="{index}" /></msg>'
+
+
+def pick_type(rng: random.Random, mix: Dict[Any, int]) -> Any:
+    return rng.choices(list(mix), weights=list(mix.values()))[0]
+
+
+def make_accounts(
+    rng: random.Random, contacts: int, rooms: int
+) -> Tuple[str, list, list]:
+    wxid = f"wxid_synthetic{rng.randrange(10**6):06d}"
+    friends = [f"wxid_friend{i:06d}" for i in range(contacts)]
+    chatrooms = [f"{10**10 + i}@chatroom" for i in range(rooms)]
+    return wxid, friends, chatrooms
+
+
+def generate_v3(
+    root: str,
+    key: Optional[str] = None,
+    contacts: int = 50,
+    rooms: int = 10,
+    messages: int = 10000,
+    mix: Optional[Dict[Tuple[int, int], int]] = None,
+    room_size: int = 20,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """生成 3.x 数据目录（Msg/MicroMsg.db、Msg/Multi/MSG0.db），返回 from_dir 所需参数"""
+    import lz4.block
+
+    rng = random.Random(seed)
+    mix = mix or V3_MESSAGE_MIX
+    wxid, friends, chatrooms = make_accounts(rng, contacts, rooms)
+    data_dir = os.path.join(root, wxid)
+    os.makedirs(os.path.join(data_dir, "Msg", "Multi"), exist_ok=True)
+
+    conn = connect(os.path.join(data_dir, "Msg", "MicroMsg.db"), key, "3")
+    with conn:
+        for sql in V3_SCHEMA["MicroMsg"]:
+            conn.execute(sql)
+        conn.executemany(
+            "INSERT INTO ContactLabel(LabelId, LabelName) VALUES (?, ?);",
+            [(i, f"label{i}") for i in range(1, 6)],
+        )
+        conn.executemany(
+            "INSERT INTO Contact(UserName, Alias, NickName, Remark, LabelIDList, Type, VerifyFlag, ExtraBuf) VALUES (?, ?, ?, ?, ?, 3, 0, ?);",
+            [
+                (friend, f"alias{i}", f"friend {i}", "", f"{i % 5 + 1},", b"")
+                for i, friend in enumerate(friends)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO ContactHeadImgUrl(usrName, smallHeadImgUrl) VALUES (?, ?);",
+            [(friend, f"https://example.com/{friend}.jpg") for friend in friends],
+        )
+        for room in chatrooms:
+            members = rng.sample(friends, min(room_size, len(friends))) + [wxid]
+            conn.execute(
+                "INSERT INTO Contact(UserName, NickName, Type, LabelIDList) VALUES (?, ?, 2, '');",
+                (room, f"room {room}"),
+            )
+            conn.execute(
+                "INSERT INTO ChatRoom(ChatRoomName, UserNameList, Reserved2) VALUES (?, ?, ?);",
+                (room, "^G".join(members), members[0]),
+            )
+            conn.execute(
+                "INSERT INTO ChatRoomInfo(ChatRoomName, Announcement) VALUES (?, '');",
+                (room,),
+            )
+    conn.close()
+
+    conn = connect(os.path.join(data_dir, "Msg", "OpenIMContact.db"), key, "3")
+    with conn:
+        for sql in V3_SCHEMA["OpenIMContact"]:
+            conn.execute(sql)
+    conn.close()
+
+    conn = connect(os.path.join(data_dir, "Msg", "Multi", "MSG0.db"), key, "3")
+    talkers = friends + chatrooms
+    now = int(time.time()) - messages
+    sessions = {}
+    with conn:
+        for sql in V3_SCHEMA["MSG"]:
+            conn.execute(sql)
+        conn.executemany(
+            "INSERT INTO Name2ID(UsrName) VALUES (?);", [(t,) for t in talkers]
+        )
+        rows = []
+        for i in range(1, messages + 1):
+            type, sub_type = pick_type(rng, mix)
+            talker = rng.choice(talkers)
+            is_sender = 1 if rng.random() < 0.3 else 0
+            is_room = talker.endswith("@chatroom")
+            sender = None if is_sender or not is_room else rng.choice(friends)
+            at_user_list = (wxid,) if is_room and rng.random() < 0.05 else ()
+            content = make_content(type, sub_type, i, talker)
+            compress_content = None
+            if type == 49:
+                compress_content = lz4.block.compress(
+                    content.encode(), store_size=False
+                )
+                content = ""
+            create_time = now + i
+            rows.append(
+                (
+                    i,
+                    talkers.index(talker) + 1,
+                    10**12 + i,
+                    type,
+                    sub_type,
+                    is_sender,
+                    create_time,
+                    create_time * 1000,
+                    talker,
+                    content,
+                    compress_content,
+                    make_bytes_extra(sender, make_msgsource(at_user_list)),
+                )
+            )
+            sessions[talker] = (i, type, create_time, content)
+        conn.executemany(
+            "INSERT INTO MSG(localId, TalkerId, MsgSvrID, Type, SubType, IsSender, CreateTime, Sequence, StrTalker, StrContent, CompressContent, BytesExtra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+            rows,
+        )
+    conn.close()
+
+    conn = connect(os.path.join(data_dir, "Msg", "MicroMsg.db"), key, "3")
+    with conn:
+        conn.executemany(
+            "INSERT INTO Session(strUsrName, nOrder, nUnReadCount, strContent, nMsgType, nMsgLocalID, nTime) VALUES (?, ?, ?, ?, ?, ?, ?);",
+            [
+                (
+                    talker,
+                    create_time,
+                    rng.randrange(5),
+                    content[:64],
+                    type,
+                    i,
+                    create_time,
+                )
+                for talker, (i, type, create_time, content) in sessions.items()
+            ],
+        )
+    conn.close()
+
+    return {"data_dir": data_dir, "key": key, "wxid": wxid}
+
+
+def generate_v4(
+    root: str,
+    key: Optional[str] = None,
+    contacts: int = 50,
+    rooms: int = 10,
+    messages: int = 10000,
+    mix: Optional[Dict[int, int]] = None,
+    room_size: int = 20,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """生成 4.x 数据目录（message_0.db、contact.db、session.db），返回 from_dir 所需参数"""
+    import zstandard
+
+    rng = random.Random(seed)
+    mix = mix or V4_MESSAGE_MIX
+    wxid, friends, chatrooms = make_accounts(rng, contacts, rooms)
+    data_dir = os.path.join(root, f"{wxid}_{rng.randrange(16**4):04x}")
+    for name in ("message", "contact", "session"):
+        os.makedirs(os.path.join(data_dir, "db_storage", name), exist_ok=True)
+    compressor = zstandard.ZstdCompressor()
+
+    conn = connect(
+        os.path.join(data_dir, "db_storage", "contact", "contact.db"), key, "4"
+    )
+    with conn:
+        for sql in V4_SCHEMA["contact"]:
+            conn.execute(sql)
+        conn.executemany(
+            "INSERT INTO contact_label(label_id_, label_name_, sort_order_) VALUES (?, ?, ?);",
+            [(i, f"label{i}", i) for i in range(1, 6)],
+        )
+        usernames = [wxid] + friends + chatrooms
+        conn.executemany(
+            "INSERT INTO contact(id, username, local_type, alias, flag, verify_flag, remark, nick_name, small_head_url, is_in_chat_room, extra_buffer) VALUES (?, ?, ?, ?, 3, 0, '', ?, ?, 1, ?);",
+            [
+                (
+                    i,
+                    username,
+                    2 if username.endswith("@chatroom") else 1,
+                    f"alias{i}",
+                    f"nick {username}",
+                    f"https://example.com/{username}.jpg",
+                    b"",
+                )
+                for i, username in enumerate(usernames, 1)
+            ],
+        )
+        for i, room in enumerate(chatrooms, 1):
+            conn.execute(
+                "INSERT INTO chat_room(id, username, owner) VALUES (?, ?, ?);",
+                (i, room, wxid),
+            )
+            conn.execute(
+                "INSERT INTO chat_room_info_detail(room_id_, username_, announcement_) VALUES (?, ?, '');",
+                (i, room),
+            )
+            members = rng.sample(
+                range(2, len(friends) + 2), min(room_size, len(friends))
+            )
+            conn.executemany(
+                "INSERT INTO chatroom_member(room_id, member_id) VALUES (?, ?);",
+                [(i, member) for member in members + [1]],
+            )
+    conn.close()
+
+    talkers = friends + chatrooms
+    names = [wxid] + talkers
+    name_ids = {name: i for i, name in enumerate(names, 1)}
+    now = int(time.time()) - messages
+    sessions = {}
+    conn = connect(
+        os.path.join(data_dir, "db_storage", "message", "message_0.db"), key, "4"
+    )
+    with conn:
+        for sql in V4_SCHEMA["message"]:
+            conn.execute(sql)
+        conn.executemany(
+            "INSERT INTO Name2Id(user_name) VALUES (?);", [(name,) for name in names]
+        )
+        tables = {}
+        rows = {}
+        for i in range(1, messages + 1):
+            local_type = pick_type(rng, mix)
+            talker = rng.choice(talkers)
+            table = tables.get(talker)
+            if table is None:
+                table = f"Msg_{hashlib.md5(talker.encode()).hexdigest()}"
+                conn.execute(V4_MSG_TABLE.format(table))
+                for sql in V4_MSG_TABLE_INDEXES:
+                    conn.execute(sql.format(table))
+                tables[talker] = table
+                rows[table] = []
+            is_sender = rng.random() < 0.3
+            is_room = talker.endswith("@chatroom")
+            sender = wxid if is_sender else (rng.choice(friends) if is_room else talker)
+            if is_sender:
+                packed_info_data = bytes(
+                    [0, name_ids[wxid] & 0xFF, 0, name_ids[talker] & 0xFF]
+                )
+            else:
+                packed_info_data = bytes(
+                    [0, name_ids[talker] & 0xFF, 0, name_ids[wxid] & 0xFF]
+                )
+            at_user_list = (wxid,) if is_room and rng.random() < 0.05 else ()
+            content = make_content(local_type & 0xFFFFFFFF, local_type >> 32, i, talker)
+            create_time = now + i
+            if local_type == 1:
+                message_content, ct = content, 0
+            else:
+                message_content, ct = compressor.compress(content.encode()), 4
+            source = compressor.compress(make_msgsource(at_user_list).encode())
+            local_id = len(rows[table]) + 1
+            rows[table].append(
+                (
+                    local_id,
+                    10**12 + i,
+                    local_type,
+                    create_time * 1000,
+                    name_ids[sender],
+                    create_time,
+                    2,
+                    source,
+                    message_content,
+                    packed_info_data,
+                    ct,
+                )
+            )
+            sessions[talker] = (local_id, local_type, create_time, content, sender)
+        for table, table_rows in rows.items():
+            conn.executemany(
+                "INSERT INTO {}(local_id, server_id, local_type, sort_seq, real_sender_id, create_time, status, source, message_content, packed_info_data, WCDB_CT_message_content, WCDB_CT_source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 4);".format(
+                    table
+                ),
+                table_rows,
+            )
+    conn.close()
+
+    conn = connect(
+        os.path.join(data_dir, "db_storage", "session", "session.db"), key, "4"
+    )
+    with conn:
+        for sql in V4_SCHEMA["session"]:
+            conn.execute(sql)
+        conn.executemany(
+            "INSERT INTO SessionTable(username, type, unread_count, summary, last_timestamp, sort_timestamp, last_msg_locald_id, last_msg_type, last_msg_sender) VALUES (?, 0, ?, ?, ?, ?, ?, ?, ?);",
+            [
+                (
+                    talker,
+                    rng.randrange(5),
+                    content[:64],
+                    create_time,
+                    create_time,
+                    local_id,
+                    local_type,
+                    sender,
+                )
+                for talker, (
+                    local_id,
+                    local_type,
+                    create_time,
+                    content,
+                    sender,
+                ) in sessions.items()
+            ],
+        )
+    conn.close()
+
+    return {"data_dir": data_dir, "key": key, "wxid": wxid}
+
+
+def update_session_v4(
+    conn: sqlite.Connection,
+    talker: str,
+    local_id: int,
+    summary: str = "",
+    local_type: int = 1,
+    sender: Optional[str] = None,
+) -> None:
+    """更新 SessionTable 中会话的最后一条消息，与微信收到消息后的行为一致"""
+    create_time = int(time.time())
+    with conn:
+        cursor = conn.execute(
+            "UPDATE SessionTable SET summary = ?, last_timestamp = ?, sort_timestamp = ?, last_msg_locald_id = ?, last_msg_type = ?, last_msg_sender = ?, unread_count = unread_count + 1 WHERE username = ?;",
+            (summary, create_time, create_time, local_id, local_type, sender, talker),
+        )
+        if cursor.rowcount == 0:
+            conn.execute(
+                "INSERT INTO SessionTable(username, type, unread_count, summary, last_timestamp, sort_timestamp, last_msg_locald_id, last_msg_type, last_msg_sender) VALUES (?, 0, 1, ?, ?, ?, ?, ?, ?);",
+                (
+                    talker,
+                    summary,
+                    create_time,
+                    create_time,
+                    local_id,
+                    local_type,
+                    sender,
+                ),
+            )
+
+
+def use_mm_tokenizer(conn: sqlite.Connection, table: str, tokenizer: str) -> None:
+    """把全文索引的分词器改写为微信的 MMFtsTokenizer：数据不变，但未注册该分词器时无法 MATCH"""
+    with conn:
+        conn.execute("PRAGMA writable_schema = ON;")
+        conn.execute(
+            "UPDATE sqlite_master SET sql = replace(sql, ?, 'MMFtsTokenizer') WHERE name = ?;",
+            (tokenizer, table),
+        )
+        conn.execute("PRAGMA writable_schema = OFF;")
+
+
+def build_fts_v3(
+    info: Dict[str, Any], tokenizer: str = "simple", mm_tokenizer: bool = False
+) -> None:
+    """由 MSG0.db 的文本消息生成 Msg/FTSMSG.db（FTSChatMsg2 + FTSChatMsg2_MetaData）"""
+    data_dir, key = info["data_dir"], info["key"]
+    conn = connect(os.path.join(data_dir, "Msg", "Multi", "MSG0.db"), key, "3")
+    with conn:
+        rows = conn.execute(
+            "SELECT MsgSvrID, TalkerId, Type, SubType, CreateTime, StrContent FROM MSG WHERE Type = 1 ORDER BY localId;"
+        ).fetchall()
+    conn.close()
+
+    conn = connect(os.path.join(data_dir, "Msg", "FTSMSG.db"), key, "3")
+    with conn:
+        conn.execute(
+            f"CREATE VIRTUAL TABLE FTSChatMsg2 USING fts4(content, entityId, tokenize={tokenizer});"
+        )
+        conn.execute(
+            "CREATE TABLE FTSChatMsg2_MetaData(docid INTEGER PRIMARY KEY, msgId INTEGER, entityId INTEGER, type INTEGER, subType INTEGER, CreateTime INTEGER);"
+        )
+        for docid, (
+            msg_svr_id,
+            talker_id,
+            type,
+            sub_type,
+            create_time,
+            content,
+        ) in enumerate(rows, 1):
+            conn.execute(
+                "INSERT INTO FTSChatMsg2(docid, content, entityId) VALUES (?, ?, ?);",
+                (docid, content, talker_id),
+            )
+            conn.execute(
+                "INSERT INTO FTSChatMsg2_MetaData VALUES (?, ?, ?, ?, ?, ?);",
+                (docid, msg_svr_id, talker_id, type, sub_type, create_time),
+            )
+    if mm_tokenizer:
+        use_mm_tokenizer(conn, "FTSChatMsg2", tokenizer)
+    conn.close()
+
+
+def build_fts_v4(
+    info: Dict[str, Any], tokenizer: str = "trigram", mm_tokenizer: bool = False
+) -> None:
+    """由 message_0.db 的文本消息生成 message_fts.db（message_fts_v3_0），
+    session_id 为会话在 Name2Id 中的 rowid"""
+    message_dir = os.path.join(info["data_dir"], "db_storage", "message")
+    key = info["key"]
+    conn = connect(os.path.join(message_dir, "message_0.db"), key, "4")
+    rows = []
+    with conn:
+        sessions = {
+            f"Msg_{hashlib.md5(name.encode()).hexdigest()}": rowid
+            for rowid, name in conn.execute("SELECT rowid, user_name FROM Name2Id;")
+        }
+        for (table,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'Msg_%';"
+        ).fetchall():
+            rows.extend(
+                (content, sessions[table], local_id, sort_seq)
+                for local_id, sort_seq, content in conn.execute(
+                    f"SELECT local_id, sort_seq, message_content FROM {table} WHERE local_type = 1;"
+                )
+            )
+    conn.close()
+    rows.sort(key=lambda row: row[3])
+
+    conn = connect(os.path.join(message_dir, "message_fts.db"), key, "4")
+    with conn:
+        conn.execute(
+            f"CREATE VIRTUAL TABLE message_fts_v3_0 USING fts5(acontent, session_id UNINDEXED, message_local_id UNINDEXED, sort_seq UNINDEXED, tokenize='{tokenizer}');"
+        )
+        conn.executemany(
+            "INSERT INTO message_fts_v3_0(acontent, session_id, message_local_id, sort_seq) VALUES (?, ?, ?, ?);",
+            rows,
+        )
+    if mm_tokenizer:
+        use_mm_tokenizer(conn, "message_fts_v3_0", tokenizer)
+    conn.close()
+
+
+def make_silk(seconds: float = 2.0, rate: int = 24000) -> bytes:
+    """生成一段微信格式（\\x02#!SILK_V3 开头）的 silk 语音；没有安装 pilk 时返回只有文件头的占位数据"""
+    try:
+        import pilk
+    except ImportError:
+        return b"\x02#!SILK_V3" + os.urandom(int(seconds * 1500))
+
+    import math
+    import struct
+    import tempfile
+
+    samples = int(seconds * rate)
+    pcm = b"".join(
+        struct.pack("<h", int(8000 * math.sin(i * 2 * math.pi * 440 / rate)))
+        for i in range(samples)
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pcm_path = os.path.join(tmp_dir, "voice.pcm")
+        silk_path = os.path.join(tmp_dir, "voice.silk")
+        with open(pcm_path, "wb") as f:
+            f.write(pcm)
+        pilk.encode(pcm_path, silk_path, pcm_rate=rate, tencent=True)
+        with open(silk_path, "rb") as f:
+            return f.read()
+
+
+def build_media_v3(info: Dict[str, Any], silk: Optional[bytes] = None) -> int:
+    """为 MSG0.db 中的语音消息生成 Msg/Multi/MediaMSG0.db（Media.Reserved0 = MsgSvrID），返回语音数"""
+    data_dir, key = info["data_dir"], info["key"]
+    silk = silk or make_silk()
+    conn = connect(os.path.join(data_dir, "Msg", "Multi", "MSG0.db"), key, "3")
+    with conn:
+        msg_svr_ids = [
+            row[0] for row in conn.execute("SELECT MsgSvrID FROM MSG WHERE Type = 34;")
+        ]
+    conn.close()
+
+    conn = connect(os.path.join(data_dir, "Msg", "Multi", "MediaMSG0.db"), key, "3")
+    with conn:
+        conn.execute(
+            "CREATE TABLE Media(Key TEXT, Reserved0 INT, Buf BLOB, Reserved1 INT, Reserved2 TEXT);"
+        )
+        conn.execute("CREATE INDEX Media_MSGSVRID ON Media(Reserved0);")
+        conn.executemany(
+            "INSERT INTO Media(Key, Reserved0, Buf) VALUES (?, ?, ?);",
+            [(str(msg_svr_id), msg_svr_id, silk) for msg_svr_id in msg_svr_ids],
+        )
+    conn.close()
+    return len(msg_svr_ids)
+
+
+def build_media_v4(info: Dict[str, Any], silk: Optional[bytes] = None) -> int:
+    """为 message_0.db 中的语音消息生成 media_0.db（VoiceInfo + Name2Id），返回语音数"""
+    message_dir = os.path.join(info["data_dir"], "db_storage", "message")
+    key = info["key"]
+    silk = silk or make_silk()
+    conn = connect(os.path.join(message_dir, "message_0.db"), key, "4")
+    voices = []
+    with conn:
+        talkers = {
+            f"Msg_{hashlib.md5(name.encode()).hexdigest()}": name
+            for (name,) in conn.execute("SELECT user_name FROM Name2Id;")
+        }
+        for (table,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'Msg_%';"
+        ).fetchall():
+            voices.extend(
+                (talkers[table], *row)
+                for row in conn.execute(
+                    f"SELECT create_time, local_id, server_id FROM {table} WHERE local_type = 34;"
+                )
+            )
+    conn.close()
+
+    conn = connect(os.path.join(message_dir, "media_0.db"), key, "4")
+    with conn:
+        conn.execute("CREATE TABLE Name2Id(user_name TEXT PRIMARY KEY);")
+        conn.execute(
+            "CREATE TABLE VoiceInfo(chat_name_id INTEGER, create_time INTEGER, local_id INTEGER, svr_id INTEGER, voice_data BLOB, data_index TEXT DEFAULT '0');"
+        )
+        conn.execute(
+            "CREATE UNIQUE INDEX VoiceInfo_UNIQUE_INDEX ON VoiceInfo(chat_name_id, svr_id);"
+        )
+        name_ids = {}
+        for talker in sorted({voice[0] for voice in voices}):
+            name_ids[talker] = conn.execute(
+                "INSERT INTO Name2Id(user_name) VALUES (?);", (talker,)
+            ).lastrowid
+        conn.executemany(
+            "INSERT INTO VoiceInfo(chat_name_id, create_time, local_id, svr_id, voice_data) VALUES (?, ?, ?, ?, ?);",
+            [
+                (name_ids[talker], create_time, local_id, server_id, silk)
+                for talker, create_time, local_id, server_id in voices
+            ],
+        )
+    conn.close()
+    return len(voices)
+
+
+def build_hardlink_v3(info: Dict[str, Any]) -> int:
+    """为 MSG0.db 中的图片消息生成 Msg/HardLinkImage.db 与空的 .dat 占位文件，返回图片数"""
+    data_dir, key = info["data_dir"], info["key"]
+    conn = connect(os.path.join(data_dir, "Msg", "Multi", "MSG0.db"), key, "3")
+    with conn:
+        images = [
+            (talker, re.search(r'md5="(\w+)"', content).group(1), create_time)
+            for talker, content, create_time in conn.execute(
+                "SELECT StrTalker, StrContent, CreateTime FROM MSG WHERE Type = 3;"
+            )
+        ]
+    conn.close()
+
+    dirs, rows = {}, []
+    for talker, md5, create_time in images:
+        dir1 = hashlib.md5(talker.encode()).hexdigest()
+        dir2 = time.strftime("%Y-%m", time.localtime(create_time))
+        ids = [dirs.setdefault(name, len(dirs) + 1) for name in (dir1, dir2)]
+        rows.append((bytes.fromhex(md5), f"{md5}.dat", create_time, *ids))
+        path = os.path.join(data_dir, "FileStorage", "MsgAttach", dir1, "Image", dir2)
+        os.makedirs(path, exist_ok=True)
+        open(os.path.join(path, f"{md5}.dat"), "wb").close()
+
+    conn = connect(os.path.join(data_dir, "Msg", "HardLinkImage.db"), key, "3")
+    with conn:
+        conn.execute(
+            "CREATE TABLE HardLinkImageID(DirId INTEGER PRIMARY KEY, Dir TEXT);"
+        )
+        conn.execute(
+            "CREATE TABLE HardLinkImageAttribute(MD5 BLOB PRIMARY KEY, FileName TEXT, FileSize INTEGER DEFAULT 0, ModifyTime INTEGER, DirID1 INTEGER, DirID2 INTEGER);"
+        )
+        conn.executemany(
+            "INSERT INTO HardLinkImageID(DirId, Dir) VALUES (?, ?);",
+            [(id, name) for name, id in dirs.items()],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO HardLinkImageAttribute(MD5, FileName, ModifyTime, DirID1, DirID2) VALUES (?, ?, ?, ?, ?);",
+            rows,
+        )
+    conn.close()
+    return len(rows)
+
+
+def make_dat(
+    data: bytes,
+    version: int,
+    xor_key: int = DAT_XOR_KEY,
+    aes_key: bytes = DAT_AES_KEY,
+    aes_size: int = 1024,
+    xor_size: int = 256,
+) -> bytes:
+    """按 decrypt_file 的格式加密图片：version 0 为整体异或；1、2 为 AES 加密的头部、
+    原样保存的中间部分与异或的尾部，1 使用固定的 AES 密钥"""
+    if version == 0:
+        return bytes(b ^ xor_key for b in data)
+    import struct
+
+    from Crypto.Cipher import AES
+    from Crypto.Util import Padding
+
+    aes_size = min(aes_size, len(data))
+    xor_size = min(xor_size, len(data) - aes_size)
+    if version == 1:
+        signature, aes_key = b"\x07\x08V1\x08\x07", b"cfcd208495d565ef"
+    else:
+        signature = b"\x07\x08V2\x08\x07"
+    cipher = AES.new(aes_key, AES.MODE_ECB)
+    aes_data = cipher.encrypt(Padding.pad(data[:aes_size], AES.block_size))
+    raw_data = data[aes_size : len(data) - xor_size]
+    xor_data = bytes(b ^ xor_key for b in data[len(data) - xor_size :])
+    header = struct.pack("<6sLLx", signature, aes_size, xor_size)
+    return header + aes_data + raw_data + xor_data
+
+
+def make_process_memory(
+    aes_key: bytes = DAT_AES_KEY,
+    size: int = 1024 * 1024,
+    chunk_size: int = 256 * 1024,
+    overlap: int = 64,
+    seed: int = 0,
+) -> Tuple[bytes, bytes, bytes]:
+    """模拟微信进程的一段内存，返回 (内存, 加密的 JPEG 头, 32 位密钥字符串)。
+    每个块边界处放一个错误的候选密钥，真正的密钥放在最后一个块边界上，
+    横跨前一块的末尾，只有保留了重叠的下一块能完整匹配"""
+    from Crypto.Cipher import AES
+
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789"
+    # 随机字节中几乎不会出现连续 32 个 [a-z0-9]
+    memory = bytearray(random_bytes(rng, size))
+    key = aes_key + bytes(rng.choices(alphabet.encode(), k=16))
+    ends = range(chunk_size, size, chunk_size - overlap)
+    for i, end in enumerate(ends):
+        candidate = (
+            key if i == len(ends) - 1 else "".join(rng.choices(alphabet, k=32)).encode()
+        )
+        start = end - 17
+        memory[start : start + 34] = b"\x00" + candidate + b"\x00"
+    encrypted = AES.new(key[:16], AES.MODE_ECB).encrypt(b"\xff\xd8\xff\xe0" + bytes(12))
+    return bytes(memory), encrypted, key
+
+
+def build_hardlink_v4(info: Dict[str, Any]) -> int:
+    """为 message_0.db 中的图片消息生成 db_storage/hardlink/hardlink.db 与 .dat 文件
+    （按 DAT_XOR_KEY、DAT_AES_KEY 加密，轮流使用三种格式），返回图片数"""
+    from wxutil.utils import decompress
+
+    data_dir, key = info["data_dir"], info["key"]
+    conn = connect(
+        os.path.join(data_dir, "db_storage", "message", "message_0.db"), key, "4"
+    )
+    images = []
+    with conn:
+        for (name,) in conn.execute("SELECT user_name FROM Name2Id;").fetchall():
+            table = f"Msg_{hashlib.md5(name.encode()).hexdigest()}"
+            try:
+                rows = conn.execute(
+                    f"SELECT message_content, create_time FROM {table} WHERE local_type = 3;"
+                ).fetchall()
+            except sqlite.OperationalError:
+                continue
+            images.extend(
+                (
+                    name,
+                    re.search(r'md5="(\w+)"', decompress(content)).group(1),
+                    create_time,
+                )
+                for content, create_time in rows
+            )
+    conn.close()
+
+    dirs, rows = {}, []
+    for talker, md5, create_time in images:
+        dir1 = hashlib.md5(talker.encode()).hexdigest()
+        dir2 = time.strftime("%Y-%m", time.localtime(create_time))
+        ids = [dirs.setdefault(name, len(dirs) + 1) for name in (dir1, dir2)]
+        path = os.path.join(data_dir, "msg", "attach", dir1, dir2, "Img")
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, f"{md5}.dat"), "wb") as f:
+            f.write(make_dat(make_avatar(md5, 2048), len(rows) % 3))
+        rows.append((md5, f"{md5}.dat", create_time, *ids))
+
+    os.makedirs(os.path.join(data_dir, "db_storage", "hardlink"), exist_ok=True)
+    conn = connect(
+        os.path.join(data_dir, "db_storage", "hardlink", "hardlink.db"), key, "4"
+    )
+    with conn:
+        conn.execute("CREATE TABLE dir2id(username TEXT);")
+        conn.execute(
+            "CREATE TABLE image_hardlink_info_v3(md5_hash INTEGER, md5 TEXT, type INTEGER DEFAULT 3, file_name TEXT, file_size INTEGER DEFAULT 0, modify_time INTEGER, dir1 INTEGER, dir2 INTEGER, extra_buffer BLOB);"
+        )
+        conn.execute(
+            "CREATE UNIQUE INDEX image_hardlink_info_v3_md5 ON image_hardlink_info_v3(md5, type);"
+        )
+        conn.executemany(
+            "INSERT INTO dir2id(rowid, username) VALUES (?, ?);",
+            [(id, name) for name, id in dirs.items()],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO image_hardlink_info_v3(md5, file_name, modify_time, dir1, dir2) VALUES (?, ?, ?, ?, ?);",
+            rows,
+        )
+    conn.close()
+    return len(rows)
+
+
+def make_avatar(wxid: str, size: int = 4096) -> bytes:
+    """按 wxid 生成固定内容的 JPEG 形式占位数据"""
+    rng = random.Random(wxid)
+    return b"\xff\xd8\xff\xe0" + random_bytes(rng, size) + b"\xff\xd9"
+
+
+def build_avatars_v3(info: Dict[str, Any], size: int = 4096) -> int:
+    """为 MicroMsg.db 中的联系人生成 Msg/Misc.db（ContactHeadImg1），返回头像数"""
+    data_dir, key = info["data_dir"], info["key"]
+    conn = connect(os.path.join(data_dir, "Msg", "MicroMsg.db"), key, "3")
+    with conn:
+        wxids = [row[0] for row in conn.execute("SELECT UserName FROM Contact;")]
+    conn.close()
+
+    now = int(time.time())
+    conn = connect(os.path.join(data_dir, "Msg", "Misc.db"), key, "3")
+    with conn:
+        conn.execute(
+            "CREATE TABLE ContactHeadImg1(usrName TEXT PRIMARY KEY, createTime INT, smallHeadBuf BLOB, m_headImgMD5 TEXT);"
+        )
+        conn.executemany(
+            "INSERT INTO ContactHeadImg1(usrName, createTime, smallHeadBuf, m_headImgMD5) VALUES (?, ?, ?, ?);",
+            [
+                (wxid, now, avatar, hashlib.md5(avatar).hexdigest())
+                for wxid, avatar in ((wxid, make_avatar(wxid, size)) for wxid in wxids)
+            ],
+        )
+    conn.close()
+    return len(wxids)
+
+
+def build_avatars_v4(info: Dict[str, Any], size: int = 4096) -> int:
+    """为 contact.db 中的联系人生成 db_storage/head_image/head_image.db，返回头像数"""
+    data_dir, key = info["data_dir"], info["key"]
+    conn = connect(
+        os.path.join(data_dir, "db_storage", "contact", "contact.db"), key, "4"
+    )
+    with conn:
+        wxids = [row[0] for row in conn.execute("SELECT username FROM contact;")]
+    conn.close()
+
+    now = int(time.time())
+    os.makedirs(os.path.join(data_dir, "db_storage", "head_image"), exist_ok=True)
+    conn = connect(
+        os.path.join(data_dir, "db_storage", "head_image", "head_image.db"), key, "4"
+    )
+    with conn:
+        conn.execute(
+            "CREATE TABLE head_image(username TEXT PRIMARY KEY, md5 TEXT, image_buffer BLOB, update_time INTEGER);"
+        )
+        conn.executemany(
+            "INSERT INTO head_image(username, md5, image_buffer, update_time) VALUES (?, ?, ?, ?);",
+            [
+                (wxid, hashlib.md5(avatar).hexdigest(), avatar, now)
+                for wxid, avatar in ((wxid, make_avatar(wxid, size)) for wxid in wxids)
+            ],
+        )
+    conn.close()
+    return len(wxids)
+
+
+def update_avatar_v4(info: Dict[str, Any], wxid: str, avatar: bytes) -> None:
+    """更换 wxid 的头像，update_time 前进"""
+    conn = connect(
+        os.path.join(info["data_dir"], "db_storage", "head_image", "head_image.db"),
+        info["key"],
+        "4",
+    )
+    with conn:
+        update_time = conn.execute(
+            "SELECT MAX(update_time) FROM head_image;"
+        ).fetchone()[0]
+        conn.execute(
+            "INSERT OR REPLACE INTO head_image(username, md5, image_buffer, update_time) VALUES (?, ?, ?, ?);",
+            (wxid, hashlib.md5(avatar).hexdigest(), avatar, (update_time or 0) + 1),
+        )
+    conn.close()
+
+
+def make_sns_content(tid: int, wxid: str, create_time: int) -> str:
+    return (
+        f"<TimelineObject><id>{tid}</id><username>{wxid}</username><createTime>{create_time}</createTime>"
+        f"<contentDesc>synthetic moment {tid % 100000}</contentDesc>"
+        f"<ContentObject><contentStyle>1</contentStyle><mediaList><media><id>{tid}</id><type>2</type>"
+        f"<url>http://example.invalid/{tid}.jpg</url></media></mediaList></ContentObject></TimelineObject>"
+    )
+
+
+def append_sns_v4(
+    info: Dict[str, Any], posts: int = 1, messages: int = 0, seed: int = 0
+) -> Tuple[int, int]:
+    """在 sns.db 中追加 posts 条朋友圈（tid 递增，会跨过 2^63）与 messages 条通知，
+    没有 sns.db 时先创建；返回 (最大 tid, 最大 local_id)"""
+    rng = random.Random(seed)
+    path = os.path.join(info["data_dir"], "db_storage", "sns")
+    os.makedirs(path, exist_ok=True)
+    conn = connect(os.path.join(path, "sns.db"), info["key"], "4")
+    with conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS SnsTimeLine(tid INTEGER PRIMARY KEY DESC, user_name TEXT, content TEXT);"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS SnsMessage_tmp3(local_id INTEGER PRIMARY KEY AUTOINCREMENT, create_time INTEGER, type INTEGER, feed_id INTEGER, is_unread INTEGER, from_username TEXT, from_nickname TEXT, to_username TEXT, to_nickname TEXT, content TEXT, serialized_comment TEXT, serialized_ref TEXT, comment_id INTEGER, client_id TEXT, comment64_id INTEGER, comment_flag INTEGER);"
+        )
+        last = (
+            conn.execute("SELECT MAX(tid) FROM SnsTimeLine WHERE tid < 0;").fetchone()[
+                0
+            ]
+            or conn.execute("SELECT MAX(tid) FROM SnsTimeLine;").fetchone()[0]
+        )
+        # 从 2^63 之前开始，使生成的 tid 同时包含保存为正数与负数的值
+        if last is None:
+            tid = (1 << 63) - posts // 2 * 500
+        else:
+            tid = last + (1 << 64) if last < 0 else last
+        now = int(time.time())
+        wxids = [f"wxid_sns{i:03d}" for i in range(20)]
+        tids = []
+        for _ in range(posts):
+            tid += rng.randint(1, 1000)
+            wxid = rng.choice(wxids)
+            signed = tid - (1 << 64) if tid >= 1 << 63 else tid
+            conn.execute(
+                "INSERT INTO SnsTimeLine(tid, user_name, content) VALUES (?, ?, ?);",
+                (signed, wxid, make_sns_content(tid, wxid, now)),
+            )
+            tids.append(signed)
+        feeds = tids or [
+            row[0] for row in conn.execute("SELECT tid FROM SnsTimeLine LIMIT 100;")
+        ]
+        local_id = None
+        for i in range(messages):
+            local_id = conn.execute(
+                "INSERT INTO SnsMessage_tmp3(create_time, type, feed_id, is_unread, from_username, from_nickname, to_username, to_nickname, content, comment_id) VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?);",
+                (
+                    now,
+                    rng.choice((1, 2)),
+                    rng.choice(feeds),
+                    wxids[i % len(wxids)],
+                    f"nick{i % len(wxids)}",
+                    info["wxid"],
+                    "me",
+                    f"synthetic comment {i}",
+                    i,
+                ),
+            ).lastrowid
+        local_id = conn.execute(
+            "SELECT MAX(local_id) FROM SnsMessage_tmp3;"
+        ).fetchone()[0]
+    conn.close()
+    return tid, local_id or 0
+
+
+def make_favorite_content(index: int, md5: Optional[str]) -> Tuple[int, str]:
+    """文本收藏或（有 md5 时）图片收藏的 XML，返回 (type, content)"""
+    if md5:
+        return 2, (
+            f'<favitem type="2"><title>synthetic favorite {index}</title><datalist count="1">'
+            f'<dataitem datatype="2" dataid="{index}"><datafmt>jpg</datafmt><fullmd5>{md5}</fullmd5>'
+            f"<datatitle>image {index}</datatitle></dataitem></datalist></favitem>"
+        )
+    return 1, (
+        f'<favitem type="1"><desc>synthetic favorite {index} note</desc><datalist count="1">'
+        f'<dataitem datatype="1" dataid="{index}"><datadesc>synthetic favorite {index} note</datadesc>'
+        f"</dataitem></datalist></favitem>"
+    )
+
+
+def build_favorites_v4(
+    info: Dict[str, Any],
+    items: int = 1000,
+    tokenizer: str = "trigram",
+    mm_tokenizer: bool = False,
+) -> int:
+    """生成 db_storage/favorite 下的 favorite.db 与 favorite_fts.db（fav_fts_v1）；
+    已有 hardlink.db 时，每 4 条中的 1 条为引用其中图片的图片收藏。返回收藏数"""
+    data_dir, key = info["data_dir"], info["key"]
+    md5s = []
+    hardlink_db = os.path.join(data_dir, "db_storage", "hardlink", "hardlink.db")
+    if os.path.exists(hardlink_db):
+        conn = connect(hardlink_db, key, "4")
+        with conn:
+            md5s = [
+                row[0]
+                for row in conn.execute("SELECT md5 FROM image_hardlink_info_v3;")
+            ]
+        conn.close()
+
+    now = int(time.time())
+    rows = []
+    for i in range(items):
+        md5 = md5s[i // 4 % len(md5s)] if md5s and i % 4 == 0 else None
+        type, content = make_favorite_content(i, md5)
+        rows.append((i + 1, type, now - items + i, content, f"wxid_fav{i % 10}"))
+
+    favorite_dir = os.path.join(data_dir, "db_storage", "favorite")
+    os.makedirs(favorite_dir, exist_ok=True)
+    conn = connect(os.path.join(favorite_dir, "favorite.db"), key, "4")
+    with conn:
+        conn.execute(
+            "CREATE TABLE fav_db_item(local_id INTEGER PRIMARY KEY AUTOINCREMENT, server_id INTEGER, type INTEGER, update_seq INTEGER, flag INTEGER, update_time INTEGER, version INTEGER, content TEXT, source_id TEXT, sync_status INTEGER, upload_status INTEGER, fromusr TEXT, fromusr_id INTEGER, realchatname TEXT, realchatname_id INTEGER, ext_buf TEXT);"
+        )
+        conn.execute(
+            "CREATE INDEX fav_db_item_UPDATE_TIME ON fav_db_item(update_time);"
+        )
+        conn.executemany(
+            "INSERT INTO fav_db_item(server_id, type, update_time, content, fromusr) VALUES (?, ?, ?, ?, ?);",
+            rows,
+        )
+    conn.close()
+
+    conn = connect(os.path.join(favorite_dir, "favorite_fts.db"), key, "4")
+    with conn:
+        conn.execute(
+            f"CREATE VIRTUAL TABLE fav_fts_v1 USING fts5(tokenize = '{tokenizer}', content, local_id UNINDEXED, update_time UNINDEXED, type UNINDEXED);"
+        )
+        conn.executemany(
+            "INSERT INTO fav_fts_v1(content, local_id, update_time, type) VALUES (?, ?, ?, ?);",
+            [
+                (re.sub(r"<[^>]+>", " ", content), local_id, update_time, type)
+                for local_id, (_, type, update_time, content, _) in enumerate(rows, 1)
+            ],
+        )
+    if mm_tokenizer:
+        use_mm_tokenizer(conn, "fav_fts_v1", tokenizer)
+    conn.close()
+    return len(rows)
+
+
+def append_biz_v4(
+    info: Dict[str, Any],
+    count: int,
+    accounts: int = 5,
+    seed: int = 0,
+    shard: int = 0,
+) -> int:
+    """向 biz_message_{shard}.db 追加 count 条公众号文章消息（轮流来自 accounts 个公众号），
+    没有该库时先创建；返回追加的条数，用于模拟公众号推送"""
+    import zstandard
+
+    rng = random.Random(seed)
+    path = os.path.join(
+        info["data_dir"], "db_storage", "message", f"biz_message_{shard}.db"
+    )
+    created = not os.path.exists(path)
+    conn = connect(path, info["key"], "4")
+    compressor = zstandard.ZstdCompressor()
+    biz_wxids = [f"gh_synthetic{i:03d}" for i in range(accounts)]
+    now = int(time.time())
+    with conn:
+        if created:
+            for sql in V4_SCHEMA["message"]:
+                conn.execute(sql)
+        for name in (info["wxid"], *biz_wxids):
+            conn.execute(
+                "INSERT OR IGNORE INTO Name2Id(user_name) VALUES (?);", (name,)
+            )
+        name_ids = dict(conn.execute("SELECT user_name, rowid FROM Name2Id;"))
+        local_ids = {}
+        for biz_wxid in biz_wxids:
+            table = f"Msg_{hashlib.md5(biz_wxid.encode()).hexdigest()}"
+            conn.execute(
+                V4_MSG_TABLE.replace(
+                    "CREATE TABLE", "CREATE TABLE IF NOT EXISTS"
+                ).format(table)
+            )
+            local_ids[biz_wxid] = conn.execute(
+                f"SELECT IFNULL(MAX(local_id), 0) FROM {table};"
+            ).fetchone()[0]
+        for i in range(count):
+            biz_wxid = biz_wxids[i % accounts]
+            table = f"Msg_{hashlib.md5(biz_wxid.encode()).hexdigest()}"
+            local_ids[biz_wxid] += 1
+            local_id = local_ids[biz_wxid]
+            content = (
+                f"<msg><appmsg><title>synthetic article {local_id}</title><type>5</type>"
+                f"<url>http://example.invalid/{biz_wxid}/{local_id}</url></appmsg></msg>"
+            )
+            conn.execute(
+                f"INSERT INTO {table}(local_id, server_id, local_type, sort_seq, real_sender_id, create_time, status, message_content, packed_info_data) VALUES (?, ?, ?, ?, ?, ?, 2, ?, ?);",
+                (
+                    local_id,
+                    rng.getrandbits(62),
+                    (5 << 32) | 49,
+                    (now * 1000 + i),
+                    name_ids[biz_wxid],
+                    now,
+                    compressor.compress(content.encode()),
+                    bytes(
+                        [0, name_ids[biz_wxid] & 0xFF, 0, name_ids[info["wxid"]] & 0xFF]
+                    ),
+                ),
+            )
+    conn.close()
+    return count
+
+
+def msg_db_path(info: Dict[str, Any], version: str) -> str:
+    """generate_v3 / generate_v4 生成的第一个消息库"""
+    if version == "v3":
+        return os.path.join(info["data_dir"], "Msg", "Multi", "MSG0.db")
+    return os.path.join(info["data_dir"], "db_storage", "message", "message_0.db")
+
+
+def random_key() -> str:
+    return os.urandom(32).hex()
+
+
+def random_bytes(rng: random.Random, n: int) -> bytes:
+    """rng 生成的 n 个随机字节（Random.randbytes 需要 Python 3.9）"""
+    return rng.getrandbits(n * 8).to_bytes(n, "little") if n else b""
+
+
+def append_message_v3(
+    conn: sqlite.Connection,
+    talker: str,
+    content: str,
+    type: int = 1,
+    sub_type: int = 0,
+    is_sender: int = 0,
+    msg_svr_id: Optional[int] = None,
+) -> int:
+    """向 MSG 表追加一条消息，返回 localId，用于模拟新消息到达"""
+    create_time = int(time.time())
+    with conn:
+        local_id = conn.execute(
+            "SELECT IFNULL(MAX(localId), 0) + 1 FROM MSG;"
+        ).fetchone()[0]
+        conn.execute(
+            "INSERT INTO MSG(localId, MsgSvrID, Type, SubType, IsSender, CreateTime, Sequence, StrTalker, StrContent, BytesExtra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+            (
+                local_id,
+                msg_svr_id or 10**13 + local_id,
+                type,
+                sub_type,
+                is_sender,
+                create_time,
+                create_time * 1000,
+                talker,
+                content,
+                make_bytes_extra(None, make_msgsource()),
+            ),
+        )
+    return local_id
+
+
+def revoke_message_v3(conn: sqlite.Connection, local_id: int) -> None:
+    """把一条消息改写为撤回提示，与微信撤回时原地更新消息行的行为一致"""
+    with conn:
+        conn.execute(
+            "UPDATE MSG SET Type = 10000, SubType = 0, StrContent = ? WHERE localId = ?;",
+            ('<revokemsg>"test" 撤回了一条消息</revokemsg>', local_id),
+        )
+
+
+def append_revoke_message_v3(
+    conn: sqlite.Connection, talker: str, msg_svr_id: int, is_sender: int = 1
+) -> int:
+    """追加一条撤回提示（<sysmsg type="revokemsg">，newmsgid 为原消息的 MsgSvrID），
+    与微信插入新行而不是改写原消息时的行为一致，返回 localId"""
+    return append_message_v3(
+        conn,
+        talker,
+        make_content(10000, 0, msg_svr_id, talker),
+        10000,
+        0,
+        is_sender,
+    )
+
+
+def append_message_v4(
+    conn: sqlite.Connection,
+    wxid: str,
+    talker: str,
+    sender: str,
+    content: str,
+    local_type: int = 1,
+    server_id: Optional[int] = None,
+) -> int:
+    """向 Msg_<md5(talker)> 表追加一条消息，返回 local_id，用于模拟新消息到达"""
+    import zstandard
+
+    table = f"Msg_{hashlib.md5(talker.encode()).hexdigest()}"
+    create_time = int(time.time())
+    with conn:
+        conn.execute(
+            V4_MSG_TABLE.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS").format(
+                table
+            )
+        )
+        name_ids = {}
+        for name in (wxid, talker, sender):
+            conn.execute(
+                "INSERT OR IGNORE INTO Name2Id(user_name) VALUES (?);", (name,)
+            )
+            name_ids[name] = conn.execute(
+                "SELECT rowid FROM Name2Id WHERE user_name = ?;", (name,)
+            ).fetchone()[0]
+        if sender == wxid:
+            packed_info_data = bytes(
+                [0, name_ids[wxid] & 0xFF, 0, name_ids[talker] & 0xFF]
+            )
+        else:
+            packed_info_data = bytes(
+                [0, name_ids[talker] & 0xFF, 0, name_ids[wxid] & 0xFF]
+            )
+        local_id = conn.execute(
+            f"SELECT IFNULL(MAX(local_id), 0) + 1 FROM {table};"
+        ).fetchone()[0]
+        if local_type != 1:
+            content = zstandard.ZstdCompressor().compress(content.encode())
+        conn.execute(
+            "INSERT INTO {}(local_id, server_id, local_type, sort_seq, real_sender_id, create_time, status, source, message_content, packed_info_data) VALUES (?, ?, ?, ?, ?, ?, 2, NULL, ?, ?);".format(
+                table
+            ),
+            (
+                local_id,
+                server_id or 10**13 + local_id,
+                local_type,
+                create_time * 1000,
+                name_ids[sender],
+                create_time,
+                content,
+                packed_info_data,
+            ),
+        )
+    return local_id
+
+
+def revoke_message_v4(
+    conn: sqlite.Connection, wxid: str, talker: str, sender: str, server_id: int
+) -> int:
+    """追加一条撤回提示（SYSTEM_MESSAGE），与对方撤回消息时微信插入的系统消息一致"""
+    return append_message_v4(
+        conn, wxid, talker, sender, make_content(10000, 0, server_id, talker), 10000
+    )
+
+
+def append_revoke_v4(
+    info: Dict[str, Any],
+    talker: str,
+    server_id: int,
+    content: str,
+    revoke_time: Optional[int] = None,
+) -> None:
+    """向 message_revoke.db 的 revokemessage 追加一条自己撤回的记录，没有该库时先创建"""
+    path = os.path.join(info["data_dir"], "db_storage", "message", "message_revoke.db")
+    conn = connect(path, info["key"], "4")
+    with conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS revokemessage(svr_id INTEGER, to_user_name TEXT, message_type INTEGER, content TEXT, revoke_time INTEGER, at_user_list TEXT);"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS revokemessage_REVOKE_TIME ON revokemessage(revoke_time);"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS revokemessage_SVRID_TO ON revokemessage(svr_id, to_user_name);"
+        )
+        conn.execute(
+            "INSERT INTO revokemessage(svr_id, to_user_name, message_type, content, revoke_time) VALUES (?, ?, 1, ?, ?);",
+            (server_id, talker, content, revoke_time or int(time.time())),
+        )
+    conn.close()
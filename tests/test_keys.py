@@ -0,0 +1,116 @@
+import random
+
+import pytest
+
+from tests import synthetic
+from wxutil.utils import KeyVerifier
+
+
+@pytest.fixture(params=["v3", "v4"])
+def verifier_args(request):
+    info = request.getfixturevalue(f"{request.param}_info")
+    return (
+        bytes.fromhex(info["key"]),
+        synthetic.msg_db_path(info, request.param),
+        request.param[1:],
+    )
+
+
+def wrong_keys(n):
+    rng = random.Random(0)
+    return [synthetic.random_bytes(rng, 32) for _ in range(n)]
+
+
+def test_verify_db_key(verifier_args):
+    key, path, version = verifier_args
+    verifier = KeyVerifier(path, version=version)
+    assert verifier.verify(key)
+    assert not verifier.verify(wrong_keys(1)[0])
+
+
+def test_find_stops_after_key(verifier_args):
+    key, path, version = verifier_args
+    verifier = KeyVerifier(path, max_workers=2, version=version)
+    read = []
+
+    def candidates():
+        for candidate in wrong_keys(3) + [key] + wrong_keys(8)[3:]:
+            read.append(candidate)
+            yield candidate
+
+    assert verifier.find(candidates()) == key
+    # 按每批 max_workers 个读取，找到密钥所在的批后不再读取
+    assert len(read) == 4
+
+
+def test_find_skips_duplicates_and_returns_none(verifier_args):
+    _, path, version = verifier_args
+    verifier = KeyVerifier(path, max_workers=2, version=version)
+    keys = wrong_keys(2)
+    assert verifier.find(keys + keys + [b""]) is None
+    assert verifier.checked == set(keys)
+
+
+class TestSearchMemoryChunk:
+    chunk_size = 64 * 1024
+
+    @pytest.fixture(autouse=True)
+    def rules(self):
+        yara = pytest.importorskip("yara")
+        from wxutil.process import AES_KEY_RULE, verify
+
+        verify.cache_clear()
+        self.rules = yara.compile(source=AES_KEY_RULE)
+
+    def search(self, memory, encrypted, **kwargs):
+        from wxutil.process import search_memory_chunk
+
+        return search_memory_chunk(
+            None,
+            0,
+            len(memory),
+            encrypted,
+            self.rules,
+            chunk_size=self.chunk_size,
+            **kwargs,
+        )
+
+    def test_key_across_chunk_boundary(self):
+        memory, encrypted, key = synthetic.make_process_memory(
+            size=self.chunk_size * 4, chunk_size=self.chunk_size
+        )
+        found = self.search(
+            memory,
+            encrypted,
+            read=lambda address, size: memory[address : address + size],
+        )
+        assert found == key[:16]
+
+    def test_no_overlap_misses_boundary_key(self):
+        memory, encrypted, _ = synthetic.make_process_memory(
+            size=self.chunk_size * 4, chunk_size=self.chunk_size, overlap=0
+        )
+        found = self.search(
+            memory,
+            encrypted,
+            overlap=0,
+            read=lambda address, size: memory[address : address + size],
+        )
+        assert found is None
+
+    def test_default_read_path(self, monkeypatch):
+        import ctypes
+
+        from wxutil import process
+
+        memory, encrypted, key = synthetic.make_process_memory(
+            size=self.chunk_size * 4, chunk_size=self.chunk_size
+        )
+
+        def read_into(process_handle, address, buffer, size):
+            size = max(0, min(size, len(memory) - address))
+            ctypes.memmove(buffer, bytes(memory[address : address + size]), size)
+            return size
+
+        monkeypatch.setattr(process, "read_process_memory_into", read_into)
+        assert self.search(memory, encrypted) == key[:16]
@@ -0,0 +1,89 @@
+import queue
+import time
+
+import pytest
+
+from tests import synthetic
+from wxutil.db_v3 import WeChatDB as WeChatDBv3
+from wxutil.db_v4 import WeChatDB as WeChatDBv4
+
+
+def wait_revoke(store):
+    received = queue.Queue()
+    store.on_revoke(lambda store, revoke: received.put(revoke))
+    return received
+
+
+@pytest.mark.parametrize("version", ["v3", "v4"])
+def test_revoke_window(request, version):
+    info = request.getfixturevalue(f"{version}_info")
+    WeChatDB = WeChatDBv3 if version == "v3" else WeChatDBv4
+
+    store = WeChatDB.from_dir(**info)
+    store.revoke_window = 10**10
+    store.start()
+    assert len(store.recent_messages) == 50
+    store.close()
+
+    # 合成消息的时间都早于当前时间，窗口为 0 时不载入任何消息
+    time.sleep(1)
+    store = WeChatDB.from_dir(**info)
+    store.revoke_window = 0
+    store.start()
+    assert len(store.recent_messages) == 0
+    store.close()
+
+
+def test_v3_revoke_matches_original(v3_info):
+    store = WeChatDBv3.from_dir(**v3_info)
+    store.start()
+    received = wait_revoke(store)
+    writer = synthetic.connect(
+        synthetic.msg_db_path(v3_info, "v3"), v3_info["key"], "3"
+    )
+    msg_svr_id = 2 * 10**13
+    try:
+        synthetic.append_message_v3(
+            writer, "wxid_friend000000", "to be revoked", msg_svr_id=msg_svr_id
+        )
+        assert store.poll() == 1
+        synthetic.append_revoke_message_v3(writer, "wxid_friend000000", msg_svr_id)
+        assert store.poll() == 1
+        revoke = received.get(timeout=5)
+        assert revoke["msg_id"] == msg_svr_id
+        assert revoke["revoked_message"]["msg"] == "to be revoked"
+        assert store.get_latest_revoke_message() is not None
+    finally:
+        writer.close()
+        store.close()
+
+
+def test_v4_revoke_matches_original(v4_info):
+    store = WeChatDBv4.from_dir(**v4_info)
+    store.start()
+    received = wait_revoke(store)
+    writer = synthetic.connect(
+        synthetic.msg_db_path(v4_info, "v4"), v4_info["key"], "4"
+    )
+    talker, server_id = "wxid_friend000000", 3 * 10**13
+    try:
+        synthetic.append_message_v4(
+            writer,
+            v4_info["wxid"],
+            talker,
+            talker,
+            "to be revoked",
+            server_id=server_id,
+        )
+        assert store.poll() == 1
+        synthetic.revoke_message_v4(writer, v4_info["wxid"], talker, talker, server_id)
+        assert store.poll() == 1
+        revoke = received.get(timeout=5)
+        assert revoke["msg_id"] == server_id
+        assert revoke["revoked_message"]["msg"] == "to be revoked"
+        # 同一条撤回只分发一次
+        assert store.poll() == 0
+        assert received.empty()
+    finally:
+        writer.close()
+        store.close()
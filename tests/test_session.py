@@ -0,0 +1,88 @@
+import hashlib
+import os
+
+import pytest
+
+from tests import synthetic
+from wxutil.db_v4 import WeChatDB
+
+
+def msg_table(talker):
+    return f"Msg_{hashlib.md5(talker.encode()).hexdigest()}"
+
+
+@pytest.fixture
+def writers(v4_info):
+    data_dir = os.path.join(v4_info["data_dir"], "db_storage")
+    msg_writer = synthetic.connect(
+        os.path.join(data_dir, "message", "message_0.db"), v4_info["key"], "4"
+    )
+    session_writer = synthetic.connect(
+        os.path.join(data_dir, "session", "session.db"), v4_info["key"], "4"
+    )
+    yield msg_writer, session_writer
+    msg_writer.close()
+    session_writer.close()
+
+
+@pytest.fixture
+def store(v4_info):
+    store = WeChatDB.from_dir(**v4_info, listen_mode="session")
+    store.start()
+    yield store
+    store.close()
+
+
+def test_changed_tables_follow_session_updates(v4_info, store, writers):
+    msg_writer, session_writer = writers
+    assert store.get_changed_tables() == []
+
+    talker = "wxid_friend000001"
+    local_id = synthetic.append_message_v4(
+        msg_writer, v4_info["wxid"], talker, talker, "hello"
+    )
+    synthetic.update_session_v4(
+        session_writer, talker, local_id, "hello", sender=talker
+    )
+    assert store.get_changed_tables() == [msg_table(talker)]
+    # 快照已更新，没有新的变化时不再查询
+    assert store.get_changed_tables() == []
+
+
+def test_poll_reads_only_changed_sessions(v4_info, store, writers):
+    msg_writer, session_writer = writers
+    talkers = ["wxid_friend000000", "wxid_friend000002"]
+    for talker in talkers:
+        local_id = synthetic.append_message_v4(
+            msg_writer, v4_info["wxid"], talker, talker, f"to {talker}"
+        )
+        synthetic.update_session_v4(
+            session_writer, talker, local_id, f"to {talker}", sender=talker
+        )
+    # 消息已写入但会话记录没有更新的会话不会被读取
+    synthetic.append_message_v4(
+        msg_writer,
+        v4_info["wxid"],
+        "wxid_friend000003",
+        "wxid_friend000003",
+        "no session",
+    )
+    assert store.poll() == 2
+    assert store.poll() == 0
+
+
+def test_session_ahead_of_messages_is_retried(v4_info, store, writers):
+    msg_writer, session_writer = writers
+    talker = "wxid_friend000004"
+    table = msg_table(talker)
+    next_local_id = store.msg_table_max_local_id[table] + 1
+    # 会话记录先于消息更新
+    synthetic.update_session_v4(
+        session_writer, talker, next_local_id, "late", sender=talker
+    )
+    assert store.poll() == 0
+    assert store.pending_tables[table] == store.session_retries
+
+    synthetic.append_message_v4(msg_writer, v4_info["wxid"], talker, talker, "late")
+    assert store.poll() == 1
+    assert table not in store.pending_tables
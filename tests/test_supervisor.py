@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from tests import synthetic
+from wxutil.supervisor import Supervisor
+
+
+@pytest.fixture
+def supervisor(tmp_path, key):
+    supervisor = Supervisor(
+        period=0.05, poll_limit=5, max_pending=10, max_workers=2, max_backoff=0.3
+    )
+    for i in range(2):
+        info = synthetic.generate_v3(
+            os.path.join(tmp_path, str(i)), key, contacts=2, rooms=0, messages=5, seed=i
+        )
+        supervisor.add_dir("v3", **info)
+    # 第一轮启动所有账号
+    supervisor.tick()
+    yield supervisor
+    supervisor.close()
+
+
+def append_messages(store, count):
+    path = os.path.join(store.data_dir, "Msg", "Multi", "MSG0.db")
+    writer = synthetic.connect(path, store.key, "3")
+    for i in range(count):
+        synthetic.append_message_v3(writer, "wxid_friend000000", f"{i}")
+    writer.close()
+
+
+def test_poll_limit_splits_backlog(supervisor):
+    busy, quiet = supervisor.accounts
+    append_messages(busy.store, 12)
+    append_messages(quiet.store, 1)
+
+    supervisor.poll_account(busy, 100.0)
+    supervisor.poll_account(quiet, 100.0)
+    assert busy.events == 5
+    # 达到单次上限的账号下一轮立即继续，其余账号按自适应间隔
+    assert busy.next_poll == 100.0
+    assert quiet.events == 1
+    assert quiet.next_poll > 100.0
+
+    for _ in range(2):
+        supervisor.poll_account(busy, 100.0)
+    assert busy.events == 12
+    assert busy.next_poll > 100.0
+
+
+def test_tick_rotates_accounts(supervisor):
+    first = supervisor.accounts[0]
+    supervisor.tick()
+    assert supervisor.accounts[-1] is first
+
+
+def test_busy_account_is_skipped(supervisor, monkeypatch):
+    account = supervisor.accounts[0]
+    account.executor.pending = account.executor.max_pending
+
+    def poll():
+        raise AssertionError("busy account polled")
+
+    monkeypatch.setattr(account.store, "poll", poll)
+    supervisor.poll_account(account, 100.0)
+    assert account.skipped == 1
+    assert account.next_poll == 100.0 + supervisor.period
+    account.executor.pending = 0
+
+
+def test_poll_error_backoff(supervisor, monkeypatch):
+    account = supervisor.accounts[0]
+    other = supervisor.accounts[1]
+    poll = account.store.poll
+
+    def fail():
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(account.store, "poll", fail)
+    delays = []
+    for _ in range(4):
+        supervisor.poll_account(account, 100.0)
+        delays.append(round(account.next_poll - 100.0, 6))
+    # 每次出错间隔翻倍，最长为 max_backoff
+    assert delays == [0.1, 0.2, 0.3, 0.3]
+    assert account.errors == 4
+    # 只对出错的账号退避
+    supervisor.poll_account(other, 100.0)
+    assert other.errors == 0
+
+    monkeypatch.setattr(account.store, "poll", poll)
+    supervisor.poll_account(account, 100.0)
+    assert account.errors == 0
+    assert account.next_poll - 100.0 <= supervisor.ceiling
@@ -0,0 +1,192 @@
+"""
+Description: 头像缓存。直接读取微信本地保存的头像图片（4.x head_image.db，3.x Misc.db
+的 ContactHeadImg1），不需要再通过 small_head_url 下载。
+
+内存中只保存 wxid -> (md5, update_time) 与按字节数限制大小的 LRU 图片缓存；
+数据库文件变化时只读取 update_time 不早于上次最大值的行，
+update_time 前进的 wxid 才会从缓存中移除并在下次访问时重新读取。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from wxutil.logger import logger
+
+
+class AvatarSource:
+    """meta_sql 返回 (wxid, md5, update_time)，以 update_time >= ? 过滤；
+    data_sql 按 wxid 返回图片；all_sql 返回全部 (wxid, 图片)"""
+
+    def __init__(
+        self, db_name: str, meta_sql: str, data_sql: str, all_sql: str
+    ) -> None:
+        self.db_name = db_name
+        self.meta_sql = meta_sql
+        self.data_sql = data_sql
+        self.all_sql = all_sql
+
+
+V4_SOURCE = AvatarSource(
+    os.path.join("db_storage", "head_image", "head_image.db"),
+    "SELECT username, md5, update_time FROM head_image WHERE update_time >= ?;",
+    "SELECT image_buffer FROM head_image WHERE username = ?;",
+    "SELECT username, image_buffer FROM head_image;",
+)
+
+V3_SOURCE = AvatarSource(
+    "Msg/Misc.db",
+    "SELECT usrName, m_headImgMD5, createTime FROM ContactHeadImg1 WHERE createTime >= ?;",
+    "SELECT smallHeadBuf FROM ContactHeadImg1 WHERE usrName = ?;",
+    "SELECT usrName, smallHeadBuf FROM ContactHeadImg1;",
+)
+
+
+def get_image_ext(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8"):
+        return "jpg"
+    if data.startswith(b"\x89PNG"):
+        return "png"
+    if data.startswith(b"GIF8"):
+        return "gif"
+    if data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+        return "webp"
+    return "bin"
+
+
+class AvatarCache:
+    def __init__(
+        self,
+        data_dir: str,
+        source: AvatarSource,
+        get_connection: Callable[[str], Any],
+        max_bytes: int = 32 * 1024 * 1024,
+    ) -> None:
+        self.data_dir = data_dir
+        self.source = source
+        self.get_connection = get_connection
+        self.max_bytes = max_bytes
+        # wxid -> (md5, update_time)
+        self.meta = {}
+        # wxid -> (update_time, 图片)
+        self.images = OrderedDict()
+        self.size = 0
+        self.update_time = 0
+        self.mtime = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_db_mtime(self) -> Optional[float]:
+        path = os.path.join(self.data_dir, self.source.db_name)
+        if not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        if os.path.exists(f"{path}-wal"):
+            mtime = max(mtime, os.path.getmtime(f"{path}-wal"))
+        return mtime
+
+    def refresh(self) -> int:
+        """数据库文件变化时读取 update_time 前进的行，移除其缓存的图片，返回读取的行数"""
+        mtime = self.get_db_mtime()
+        if mtime is None or mtime == self.mtime:
+            return 0
+        count = 0
+        conn = self.get_connection(self.source.db_name)
+        with self.lock:
+            with conn:
+                rows = conn.execute(self.source.meta_sql, (self.update_time,))
+                for wxid, md5, update_time in rows:
+                    update_time = update_time or 0
+                    old = self.meta.get(wxid)
+                    if old is not None and old[1] >= update_time:
+                        continue
+                    self.meta[wxid] = (md5, update_time)
+                    self.discard(wxid)
+                    self.update_time = max(self.update_time, update_time)
+                    count += 1
+            self.mtime = mtime
+        return count
+
+    def discard(self, wxid: str) -> None:
+        entry = self.images.pop(wxid, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def put(self, wxid: str, update_time: int, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            self.discard(wxid)
+            self.images[wxid] = (update_time, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.images.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get(self, wxid: str) -> Optional[bytes]:
+        """wxid 的头像图片，没有保存头像时返回 None"""
+        self.refresh()
+        meta = self.meta.get(wxid)
+        if meta is None:
+            return None
+        with self.lock:
+            entry = self.images.get(wxid)
+            if entry is not None and entry[0] == meta[1]:
+                self.images.move_to_end(wxid)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        conn = self.get_connection(self.source.db_name)
+        with conn:
+            row = conn.execute(self.source.data_sql, (wxid,)).fetchone()
+        if not row or not row[0]:
+            return None
+        data = bytes(row[0])
+        self.put(wxid, meta[1], data)
+        return data
+
+    def get_md5(self, wxid: str) -> Optional[str]:
+        self.refresh()
+        meta = self.meta.get(wxid)
+        return meta[0] if meta else None
+
+    def export(self, dst: str) -> Dict[str, Any]:
+        """把全部头像按图片内容的 md5 写入 dst/<md5[:2]>/<md5>.<ext>，相同图片只写一次，
+        并写入 dst/index.json（wxid -> 相对路径）。返回数量与耗时"""
+        os.makedirs(dst, exist_ok=True)
+        started = time.perf_counter()
+        index = {}
+        stats = {"avatars": 0, "files": 0, "bytes": 0}
+        if self.get_db_mtime() is not None:
+            conn = self.get_connection(self.source.db_name)
+            with conn:
+                for wxid, data in conn.execute(self.source.all_sql):
+                    if not data:
+                        continue
+                    data = bytes(data)
+                    md5 = hashlib.md5(data).hexdigest()
+                    name = os.path.join(md5[:2], f"{md5}.{get_image_ext(data)}")
+                    path = os.path.join(dst, name)
+                    if not os.path.exists(path):
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        with open(path, "wb") as f:
+                            f.write(data)
+                        stats["files"] += 1
+                        stats["bytes"] += len(data)
+                    index[wxid] = name.replace(os.sep, "/")
+                    stats["avatars"] += 1
+        with open(os.path.join(dst, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        stats["seconds"] = time.perf_counter() - started
+        logger.info(
+            f"Exported {stats['avatars']} avatars ({stats['files']} files, {stats['bytes']} bytes) in {stats['seconds']:.2f}s"
+        )
+        return stats
+
+    def __len__(self) -> int:
+        return len(self.meta)
@@ -1,18 +1,36 @@
+import glob
+import itertools
 import os
+import re
 import time
-from typing import Callable, Dict, List, Any, Optional, Tuple, Union
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Any, Optional, Tuple, Union
 
-from pyee.executor import ExecutorEventEmitter
 from sqlcipher3 import _sqlite3 as sqlite
 
-from logger import logger
-from utils import (
+from wxutil.avatar import V3_SOURCE
+from wxutil.session import V3_SOURCE as SESSION_SOURCE
+from wxutil.hardlink import FILE, IMAGE, VIDEO, v3_sources
+from wxutil.logger import logger
+from wxutil.metrics import timed
+from wxutil.process import read_info
+from wxutil.store import (
+    MessageStore,
+    apply_connection_profile,
+    decode_extra_buf,
+    fts_content_columns,
+    fts_phrase,
+    open_connection,
+    parse_fts_table,
+)
+from wxutil.utils import (
     deserialize_bytes_extra,
     decompress_compress_content,
     parse_xml,
     get_db_key,
-    read_info,
+    is_plain_db,
 )
+from wxutil.wxids import MemberList
 
 ALL_MESSAGE = (0, 0)
 TEXT_MESSAGE = (1, 0)  # 文本消息
@@ -48,64 +66,6 @@ PAT_MESSAGE = (10000, 4)  # 拍一拍消息
 GROUP_INVITATION_MESSAGE = (10000, 8000)  # 邀请入群通知消息
 
 
-def decode_extra_buf(extra_buf_content: bytes):
-    data = {
-        "country": "",
-        "province": "",
-        "city": "",
-        "signature": "",
-        "phone": "",
-        "sex": "",
-    }
-    if not extra_buf_content:
-        return data
-    trunk_name = {
-        b"\x46\xcf\x10\xc4": "个性签名",
-        b"\xa4\xd9\x02\x4a": "国家",
-        b"\xe2\xea\xa8\xd1": "省份",
-        b"\x1d\x02\x5b\xbf": "市区",
-        # b"\x81\xAE\x19\xB4": "朋友圈背景url",
-        # b"\xF9\x17\xBC\xC0": "公司名称",
-        # b"\x4E\xB9\x6D\x85": "企业微信属性",
-        # b"\x0E\x71\x9F\x13": "备注图片",
-        b"\x75\x93\x78\xad": "手机号",
-        b"\x74\x75\x2c\x06": "性别",
-    }
-    res = {"手机号": ""}
-    off = 0
-    try:
-        for key in trunk_name:
-            trunk_head = trunk_name[key]
-            try:
-                off = extra_buf_content.index(key) + 4
-            except:
-                pass
-            char = extra_buf_content[off : off + 1]
-            off += 1
-            if char == b"\x04":  # 四个字节的int，小端序
-                int_content = extra_buf_content[off : off + 4]
-                off += 4
-                int_content = int.from_bytes(int_content, "little")
-                res[trunk_head] = int_content
-            elif char == b"\x18":  # utf-16字符串
-                length_content = extra_buf_content[off : off + 4]
-                off += 4
-                length_content = int.from_bytes(length_content, "little")
-                strContent = extra_buf_content[off : off + length_content]
-                off += length_content
-                res[trunk_head] = strContent.decode("utf-16").rstrip("\x00")
-        return {
-            "country": res["国家"],
-            "province": res["省份"],
-            "city": res["市区"],
-            "signature": res["个性签名"],
-            "phone": res["手机号"],
-            "sex": res["性别"],
-        }
-    except Exception:
-        return data
-
-
 def get_room_member_wxid(bytes_extra: Dict[str, Any]) -> Union[str, None]:
     try:
         return bytes_extra["3"][0]["2"]
@@ -113,6 +73,11 @@ def get_room_member_wxid(bytes_extra: Dict[str, Any]) -> Union[str, None]:
         return None
 
 
+def is_revoke_row(row: Tuple[Any, ...]) -> bool:
+    """撤回提示：Type 10000 / SubType 0 且内容为 <revokemsg>"""
+    return row[3] == 10000 and row[4] == 0 and "<revokemsg>" in (row[14] or "")
+
+
 def get_message(row: Tuple[Any, ...]) -> Dict[str, Any]:
     return {
         "local_id": row[0],
@@ -144,28 +109,61 @@ def get_message(row: Tuple[Any, ...]) -> Dict[str, Any]:
     }
 
 
-class WeChatDB:
+class WeChatDB(MessageStore):
+    version = "v3"
+    all_message = ALL_MESSAGE
+    # 微信只能撤回 2 分钟内的消息，这段时间内的消息留在撤回检测窗口中，多留一些余量
+    revoke_window = 300
+
     def __init__(self, pid: Optional[int] = None) -> None:
         result = read_info(pid)
         if result:
-            self.info = result[0]
+            self.setup(result[0])
         else:
             raise Exception("Not found wechat key!")
+
+    @classmethod
+    def from_dir(
+        cls,
+        data_dir: str,
+        key: Optional[str] = None,
+        wxid: Optional[str] = None,
+        db_profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> "WeChatDB":
+        """不查找微信进程，直接打开数据目录；已解密的数据库可不传 key，
+        db_profiles 按文件名覆盖连接参数，如 {"MSG0.db": {"cache_size": -262144}}"""
+        wechat_db = cls.__new__(cls)
+        wechat_db.setup(
+            {
+                "pid": None,
+                "wxid": wxid,
+                "file_path": data_dir,
+                "key": key,
+                "db_profiles": db_profiles,
+            }
+        )
+        return wechat_db
+
+    def setup(self, info: Dict[str, Any]) -> None:
+        self.info = info
+        if info.get("db_profiles"):
+            self.db_profiles = {**self.db_profiles, **info["db_profiles"]}
         self.pid = self.info["pid"]
         self.key = self.info["key"]
         self.data_dir = self.info["file_path"]
         self.msg_db = self.get_msg_db()
-        self.conn = self.create_connection(rf"Msg\Multi\{self.msg_db}")
-        self.wxid = self.data_dir.split("\\")[-1]
-        self.event_emitter = ExecutorEventEmitter()
-
-    def get_db_path(self, db_name: str) -> str:
-        return os.path.join(self.data_dir, db_name)
+        self.msg_db_path = self.get_db_path(os.path.join("Msg", "Multi", self.msg_db))
+        self.msg_db_wal = f"{self.msg_db_path}-wal"
+        self.conn = self.create_connection(os.path.join("Msg", "Multi", self.msg_db))
+        self.wxid = (
+            self.info.get("wxid") or re.split(r"[\\/]", self.data_dir.rstrip("\\/"))[-1]
+        )
+        self.init_store()
 
     def get_msg_db(self) -> str:
         try:
             with open(
-                os.path.join(self.data_dir, r"Msg\Multi\config.ini"),
+                os.path.join(self.data_dir, "Msg", "Multi", "config.ini"),
                 "r",
                 encoding="utf-8",
             ) as f:
@@ -173,32 +171,40 @@ class WeChatDB:
         except Exception:
             return "MSG0.db"
 
+    @timed("connect")
     def create_connection(self, db_name: str) -> sqlite.Connection:
-        conn = sqlite.connect(self.get_db_path(db_name))
-        db_key = get_db_key(self.key, self.get_db_path(db_name), "3")
+        db_path = self.get_db_path(db_name)
+        profile = self.get_connection_profile(db_name)
+        conn = open_connection(sqlite, db_path, profile)
+        if is_plain_db(db_path):
+            apply_connection_profile(conn, profile, encrypted=False)
+            return conn
+        if self.key is None:
+            raise Exception(f"Database is encrypted, key is required: {db_name}")
+        db_key = get_db_key(self.key, db_path, "3")
         conn.execute(f"PRAGMA key = \"x'{db_key}'\";")
         conn.execute(f"PRAGMA cipher_page_size = 4096;")
         conn.execute(f"PRAGMA kdf_iter = 64000;")
         conn.execute(f"PRAGMA cipher_hmac_algorithm = HMAC_SHA1;")
         conn.execute(f"PRAGMA cipher_kdf_algorithm = PBKDF2_HMAC_SHA1;")
+        apply_connection_profile(conn, profile, encrypted=True)
         return conn
 
     def get_labels(self):
         labels = []
-        conn = self.create_connection("Msg/MicroMsg.db")
+        conn = self.get_connection("Msg/MicroMsg.db")
         with conn:
-            rows = conn.execute("""
+            for row in conn.execute("""
             SELECT 
                 LabelId, 
                 LabelName 
             FROM ContactLabel;
-            """).fetchall()
-            for row in rows:
+            """):
                 labels.append({"id": row[0], "name": row[1]})
         return labels
 
     def get_label(self, id: int) -> Optional[Dict]:
-        conn = self.create_connection("Msg/MicroMsg.db")
+        conn = self.get_connection("Msg/MicroMsg.db")
         with conn:
             row = conn.execute(
                 """
@@ -215,12 +221,11 @@ class WeChatDB:
 
     def get_corporate_contacts(self) -> List:
         corporate_contacts = []
-        conn = self.create_connection("Msg/OpenIMContact.db")
+        conn = self.get_connection("Msg/OpenIMContact.db")
         with conn:
-            rows = conn.execute(
+            for row in conn.execute(
                 "SELECT UserName, NickName, SmallHeadImgUrl, Sex, Remark FROM OpenIMContact WHERE Type = 1;"
-            ).fetchall()
-            for row in rows:
+            ):
                 corporate_contacts.append(
                     {
                         "wxid": row[0],
@@ -240,7 +245,7 @@ class WeChatDB:
         return corporate_contacts
 
     def get_corporate_contact(self, wxid: str) -> Optional[Dict]:
-        conn = self.create_connection("Msg/OpenIMContact.db")
+        conn = self.get_connection("Msg/OpenIMContact.db")
         with conn:
             row = conn.execute(
                 """SELECT UserName, NickName, SmallHeadImgUrl, Sex, Remark FROM OpenIMContact WHERE Type = 1 AND UserName = ?;""",
@@ -265,9 +270,9 @@ class WeChatDB:
 
     def get_contacts(self) -> List:
         contacts = []
-        conn = self.create_connection("Msg/MicroMsg.db")
+        conn = self.get_connection("Msg/MicroMsg.db")
         with conn:
-            rows = conn.execute("""
+            for row in conn.execute("""
             SELECT 
                 UserName, 
                 Alias,
@@ -278,8 +283,7 @@ class WeChatDB:
                 ExtraBuf
             FROM Contact
             LEFT JOIN ContactHeadImgUrl on ContactHeadImgUrl.usrName = Contact.UserName
-            WHERE type = 3 AND VerifyFlag = 0;""").fetchall()
-            for row in rows:
+            WHERE type = 3 AND VerifyFlag = 0;"""):
                 extra_buf = decode_extra_buf(row[-1])
                 contact = {
                     "wxid": row[0],
@@ -300,7 +304,7 @@ class WeChatDB:
         return contacts
 
     def get_contact(self, wxid: str) -> Optional[Dict]:
-        conn = self.create_connection("Msg/MicroMsg.db")
+        conn = self.get_connection("Msg/MicroMsg.db")
         with conn:
             row = conn.execute(
                 """
@@ -334,9 +338,9 @@ class WeChatDB:
 
     def get_rooms(self) -> List:
         rooms = []
-        conn = self.create_connection("Msg/MicroMsg.db")
+        conn = self.get_connection("Msg/MicroMsg.db")
         with conn:
-            rows = conn.execute("""
+            for row in conn.execute("""
             SELECT 
                 UserName, 
                 NickName, 
@@ -352,8 +356,7 @@ class WeChatDB:
             LEFT JOIN ContactHeadImgUrl on ContactHeadImgUrl.usrName = Contact.UserName
             LEFT JOIN ChatRoom on ChatRoom.ChatRoomName = Contact.UserName
             LEFT JOIN ChatRoomInfo on ChatRoomInfo.ChatRoomName = Contact.UserName
-            WHERE type = 2;""").fetchall()
-            for row in rows:
+            WHERE type = 2;"""):
                 rooms.append(
                     {
                         "wxid": row[0],
@@ -370,7 +373,7 @@ class WeChatDB:
         return rooms
 
     def get_room(self, room_wxid: str, detail: bool = False) -> Optional[Dict]:
-        conn = self.create_connection("Msg/MicroMsg.db")
+        conn = self.get_connection("Msg/MicroMsg.db")
         with conn:
             row = conn.execute(
                 """
@@ -424,7 +427,7 @@ class WeChatDB:
         if not room:
             return []
         member_list = room["member_list"]
-        conn = self.create_connection("Msg/MicroMsg.db")
+        conn = self.get_connection("Msg/MicroMsg.db")
         room_members = []
         with conn:
             for member_wxid in member_list:
@@ -457,11 +460,32 @@ class WeChatDB:
                     )
         return room_members
 
+    def get_room_member_list(self, room_wxid: str) -> MemberList:
+        """群成员 wxid 的紧凑表示（wxid 驻留为整数 id），get_room 的 member_list 仍为 list"""
+        conn = self.get_connection("Msg/MicroMsg.db")
+        with conn:
+            row = conn.execute(
+                "SELECT UserNameList FROM ChatRoom WHERE ChatRoomName = ?;",
+                (room_wxid,),
+            ).fetchone()
+        return MemberList.from_string(row[0] if row else None, "^G")
+
+    def get_room_member_lists(self) -> Dict[str, MemberList]:
+        """全部群聊的成员列表：群 wxid -> MemberList，适合长期保存大量群的成员"""
+        conn = self.get_connection("Msg/MicroMsg.db")
+        with conn:
+            return {
+                row[0]: MemberList.from_string(row[1], "^G")
+                for row in conn.execute(
+                    "SELECT ChatRoomName, UserNameList FROM ChatRoom;"
+                )
+            }
+
     def get_room_member_wxids(self, room_wxid: str) -> List:
-        conn = self.create_connection("Msg/ChatRoomUser.db")
+        conn = self.get_connection("Msg/ChatRoomUser.db")
         room_member_wxids = []
         with conn:
-            rows = conn.execute(
+            for row in conn.execute(
                 """
             SELECT 
                 ChatRoomUserNameToId.UsrName AS wxid
@@ -474,11 +498,11 @@ class WeChatDB:
                 WHERE UsrName = ?
             );""",
                 (room_wxid,),
-            ).fetchall()
-            for row in rows:
+            ):
                 room_member_wxids.append(row[0])
         return room_member_wxids
 
+    @timed("get_event")
     def get_event(self, row: Optional[Tuple[Any, ...]]) -> Optional[Dict[str, Any]]:
         if not row:
             return None
@@ -499,6 +523,7 @@ class WeChatDB:
             "from_wxid": None,
             "to_wxid": None,
             "extra": None,
+            "media_path": None,
         }
 
         bytes_extra = deserialize_bytes_extra(message["bytes_extra"])
@@ -535,6 +560,9 @@ class WeChatDB:
             except Exception:
                 pass
 
+        if self.resolve_media:
+            data["media_path"] = self.get_media_path(data)
+
         return data
 
     def get_recently_messages(
@@ -544,77 +572,333 @@ class WeChatDB:
             rows = self.conn.execute(
                 "SELECT * FROM MSG ORDER BY localId {} LIMIT ?;".format(order), (count,)
             ).fetchall()
-            return [self.get_event(row) for row in rows]
+            return self.get_events(rows)
+
+    def iter_messages(
+        self,
+        talker: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        types: Optional[List[Union[int, Tuple[int, int]]]] = None,
+        page_size: int = 500,
+    ) -> Iterator[Dict[str, Any]]:
+        """按 (CreateTime, localId) 升序分页读取 start <= CreateTime < end 的消息"""
+        where, params = [], []
+        if talker is not None:
+            where.append("StrTalker = ?")
+            params.append(talker)
+        if start is not None:
+            where.append("CreateTime >= ?")
+            params.append(int(start))
+        if end is not None:
+            where.append("CreateTime < ?")
+            params.append(int(end))
+        if types:
+            conditions = []
+            for type in types:
+                if isinstance(type, tuple):
+                    conditions.append("(Type = ? AND SubType = ?)")
+                    params.extend(type)
+                else:
+                    conditions.append("Type = ?")
+                    params.append(type)
+            where.append("({})".format(" OR ".join(conditions)))
+
+        sql = "SELECT * FROM MSG WHERE {} ORDER BY CreateTime, localId LIMIT ?;"
+        last = None
+        while True:
+            page_where, page_params = list(where), list(params)
+            if last is not None:
+                # keyset 分页：CreateTime >= ? 可走 (StrTalker, CreateTime) 索引
+                page_where.append("CreateTime >= ? AND (CreateTime > ? OR localId > ?)")
+                page_params.extend((last[0], last[0], last[1]))
+            with self.conn:
+                rows = self.conn.execute(
+                    sql.format(" AND ".join(page_where) or "1"),
+                    (*page_params, page_size),
+                ).fetchall()
+            for event in self.get_events(rows):
+                if event:
+                    yield event
+            if len(rows) < page_size:
+                return
+            last = (rows[-1][6], rows[-1][0])
+
+    def iter_fts_hits(
+        self, keyword: str, talker: Optional[str], page_size: int
+    ) -> Iterator[List[int]]:
+        """在 FTSMSG.db 的 FTSChatMsg2 中搜索，按页返回命中消息的 MsgSvrID
+        （FTSChatMsg2_MetaData.msgId）"""
+        conn = self.get_connection("Msg/FTSMSG.db")
+        with conn:
+            row = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE name = 'FTSChatMsg2';"
+            ).fetchone()
+        if not row:
+            return
+        module, columns = parse_fts_table(row[0])
+        content = next((c for c in columns if "content" in c.lower()), columns[0])
+        rowid, names = fts_content_columns(module, columns)
+        content_name = names[columns.index(content)]
+
+        last = 2**63 - 1
+        while True:
+            rows = self.query_fts(
+                conn,
+                "FTSChatMsg2",
+                (
+                    "SELECT FTSChatMsg2.rowid, m.msgId FROM FTSChatMsg2 JOIN FTSChatMsg2_MetaData AS m ON m.docid = FTSChatMsg2.rowid WHERE FTSChatMsg2 MATCH ? AND FTSChatMsg2.rowid < ? ORDER BY FTSChatMsg2.rowid DESC LIMIT ?;",
+                    (fts_phrase(keyword), last, page_size),
+                ),
+                (
+                    f"SELECT c.{rowid}, m.msgId FROM FTSChatMsg2_content AS c JOIN FTSChatMsg2_MetaData AS m ON m.docid = c.{rowid} WHERE instr(c.{content_name}, ?) > 0 AND c.{rowid} < ? ORDER BY c.{rowid} DESC LIMIT ?;",
+                    (keyword, last, page_size),
+                ),
+            )
+            if rows:
+                yield [row[1] for row in rows]
+            if len(rows) < page_size:
+                return
+            last = rows[-1][0]
+
+    def load_fts_hits(
+        self, hits: List[int], talker: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """按 MsgSvrID 批量读取命中的消息，可走 MSG 的 MsgSvrID 索引"""
+        events = {}
+        for i in range(0, len(hits), 500):
+            chunk = hits[i : i + 500]
+            sql = "SELECT * FROM MSG WHERE MsgSvrID IN ({})".format(
+                ",".join("?" * len(chunk))
+            )
+            params = list(chunk)
+            if talker is not None:
+                sql += " AND StrTalker = ?"
+                params.append(talker)
+            with self.conn:
+                rows = self.conn.execute(sql + ";", params).fetchall()
+            for event in self.get_events(rows):
+                if event:
+                    events[event["msg_id"]] = event
+        return [events[msg_id] for msg_id in hits if msg_id in events]
+
+    def get_media_dbs(self) -> List[str]:
+        """Msg/Multi 下的 MediaMSG<N>.db，编号大的在前"""
+        db_files = [
+            os.path.basename(db_file)
+            for db_file in glob.glob(
+                os.path.join(self.data_dir, "Msg", "Multi", "MediaMSG*.db")
+            )
+            if re.match(r"^MediaMSG\d+\.db$", os.path.basename(db_file))
+        ]
+        return [
+            f"Msg/Multi/{db_file}"
+            for db_file in sorted(db_files, key=lambda x: int(x[8:-3]), reverse=True)
+        ]
+
+    def open_voice(self, event: Dict[str, Any]) -> Any:
+        """按 MsgSvrID（Media.Reserved0）查找语音，返回 Buf 的只读 BLOB 流"""
+        for db_name in self.get_media_dbs():
+            conn = self.get_connection(db_name)
+            with conn:
+                row = conn.execute(
+                    "SELECT rowid FROM Media WHERE Reserved0 = ?;", (event["msg_id"],)
+                ).fetchone()
+            if row:
+                return conn.open_blob("Media", "Buf", row[0], readonly=True)
+        return None
+
+    def get_avatar_source(self) -> Any:
+        return V3_SOURCE
+
+    def get_session_source(self) -> Any:
+        return SESSION_SOURCE
+
+    def get_hardlink_sources(self) -> List[Any]:
+        return v3_sources()
+
+    def get_media_md5(
+        self, event: Dict[str, Any]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """图片、视频的 md5 在 StrContent 中，文件的 md5 在 CompressContent 中"""
+        type = (event["type"], event["sub_type"])
+        try:
+            if type == IMAGE_MESSAGE:
+                return IMAGE, parse_xml(event["msg"])["msg"]["img"]["@md5"]
+            if type == VIDEO_MESSAGE:
+                return VIDEO, parse_xml(event["msg"])["msg"]["videomsg"]["@md5"]
+            if type == FILE_MESSAGE:
+                return FILE, parse_xml(event["raw_msg"])["msg"]["appmsg"]["md5"]
+        except Exception:
+            pass
+        return None, None
 
     def get_latest_revoke_message(self) -> Optional[Dict[str, Any]]:
+        # 只按 Type、SubType 在 SQLite 中筛选，是否为 <revokemsg> 与撤回窗口一样用 is_revoke_row 判断，
+        # 不对 StrContent 做 LIKE 扫描
         with self.conn:
-            row = self.conn.execute(
-                "SELECT * FROM MSG WHERE Type = 10000 AND SubType = 0 AND StrContent like '%<revokemsg>%' ORDER BY localId DESC LIMIT 1;"
-            ).fetchone()
-            return self.get_event(row)
-
-    def handle(
-        self, events: Union[tuple, list] = (0, 0), once: bool = False
-    ) -> Callable[[Callable[..., Any]], None]:
-        def wrapper(func: Callable[..., Any]) -> None:
-            listen = self.event_emitter.on if not once else self.event_emitter.once
-            if isinstance(events, tuple):
-                type, sub_type = events
-                listen(f"{type}:{sub_type}", func)
-            elif isinstance(events, list):
-                for event in events:
-                    type, sub_type = event
-                    listen(f"{type}:{sub_type}", func)
-            else:
-                raise TypeError("events must be tuple or list.")
+            cursor = self.conn.execute(
+                "SELECT * FROM MSG WHERE Type = 10000 AND SubType = 0 ORDER BY localId DESC;"
+            )
+            for rows in self.iter_batches(cursor, 100):
+                for row in rows:
+                    if is_revoke_row(row):
+                        return self.get_event(row)
+        return None
 
-        return wrapper
+    def get_event_name(self, type: Tuple[int, int]) -> str:
+        if not isinstance(type, tuple):
+            raise TypeError("events must be tuple or list.")
+        return "{}:{}".format(*type)
 
-    def run(self, period: float = 0.1) -> None:
+    def get_event_type(self, event: Dict[str, Any]) -> Tuple[int, int]:
+        return event["type"], event["sub_type"]
+
+    def normalize_event(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "id": event["id"],
+            "msg_id": event["msg_id"],
+            "sequence": event["sequence"],
+            "type": event["type"],
+            "sub_type": event["sub_type"],
+            "is_sender": event["is_sender"],
+            "create_time": event["create_time"],
+            "talker": event["room_wxid"]
+            or (event["to_wxid"] if event["is_sender"] else event["from_wxid"]),
+            "room_wxid": event["room_wxid"],
+            "from_wxid": event["from_wxid"],
+            "to_wxid": event["to_wxid"],
+            "content": event["raw_msg"] or event["msg"],
+            "at_user_list": event["at_user_list"],
+            "raw": event,
+        }
+
+    def start(self) -> None:
         recently_messages = self.get_recently_messages(1)
-        current_local_id = (
+        self.current_local_id = (
             recently_messages[0]["id"]
             if recently_messages and recently_messages[0]
             else 0
         )
-        revoke_message = self.get_latest_revoke_message()
-        current_revoke_local_id = revoke_message["id"] if revoke_message else 0
+        self.load_recent_messages()
+        self.last_mtime = None
         logger.info("Start listening...")
-        while True:
-            with self.conn:
-                rows = self.conn.execute(
-                    "SELECT * FROM MSG where localId > ? ORDER BY localId;",
-                    (current_local_id,),
-                ).fetchall()
-                for row in rows:
-                    event = self.get_event(row)
-                    logger.debug(event)
-                    if event:
-                        current_local_id = event["id"]
-                        self.event_emitter.emit(f"0:0", self, event)
-                        self.event_emitter.emit(
-                            f"{event['type']}:{event['sub_type']}", self, event
-                        )
 
-            with self.conn:
-                rows = self.conn.execute(
-                    "SELECT * FROM MSG WHERE localId > ? AND Type = 10000 AND SubType = 0 AND StrContent like '%<revokemsg>%' ORDER BY localId;",
-                    (current_revoke_local_id,),
-                ).fetchall()
-                for row in rows:
-                    event = self.get_event(row)
-                    logger.debug(event)
-                    if event:
-                        current_revoke_local_id = event["id"]
-                        self.event_emitter.emit(f"0:0", self, event)
-                        self.event_emitter.emit(
-                            f"{event['type']}:{event['sub_type']}", self, event
-                        )
+    def load_recent_messages(self) -> None:
+        """读取撤回时限内的消息，作为撤回检测窗口：localId -> [create_time, 是否已撤回, 事件]"""
+        self.recent_messages = OrderedDict()
+        cutoff = time.time() - self.revoke_window
+        rows = []
+        with self.conn:
+            cursor = self.conn.execute(
+                "SELECT * FROM MSG WHERE localId <= ? ORDER BY localId DESC;",
+                (self.current_local_id,),
+            )
+            for batch in self.iter_batches(cursor, 100):
+                rows.extend(row for row in batch if row[6] >= cutoff)
+                if batch[-1][6] < cutoff:
+                    break
+        rows.reverse()
+        for row, event in zip(rows, self.get_events(rows)):
+            if event:
+                self.recent_messages[row[0]] = [row[6], is_revoke_row(row), event]
+
+    def prune_recent_messages(self) -> float:
+        cutoff = time.time() - self.revoke_window
+        while self.recent_messages:
+            local_id, entry = next(iter(self.recent_messages.items()))
+            if entry[0] >= cutoff:
+                break
+            del self.recent_messages[local_id]
+        return cutoff
+
+    def is_revoked_row(self, row: Tuple[Any, ...]) -> bool:
+        """窗口内的旧消息被改写为撤回提示"""
+        entry = self.recent_messages.get(row[0])
+        return entry is not None and not entry[1] and is_revoke_row(row)
+
+    def get_revoke_msg_id(self, event: Dict[str, Any]) -> Optional[int]:
+        """新插入的撤回提示（<sysmsg type="revokemsg">）中原消息的 MsgSvrID，
+        原地改写的撤回提示没有 <newmsgid>，返回 None"""
+        msg = event["msg"] or ""
+        if "<newmsgid>" not in msg:
+            return None
+        try:
+            # 群聊中的系统消息可能带有 "wxid:\n" 前缀
+            return int(
+                parse_xml(msg[msg.find("<") :])["sysmsg"]["revokemsg"]["newmsgid"]
+            )
+        except Exception:
+            return None
+
+    def find_revoked_message(self, msg_id: int) -> Optional[Dict[str, Any]]:
+        """新插入的撤回提示：按原消息的 msg_id 在窗口中查找尚未撤回的原消息"""
+        for entry in reversed(self.recent_messages.values()):
+            if not entry[1] and entry[2]["msg_id"] == msg_id:
+                entry[1] = True
+                return entry[2]
+        return None
 
-            time.sleep(period)
+    def poll(self) -> int:
+        if not self.check_changed():
+            return 0
+
+        # 撤回会把窗口内的原消息改写为撤回提示，按主键范围与 Type 在 SQLite 中筛出这些行，
+        # 不再把窗口内的全部消息读回 Python
+        cutoff = self.prune_recent_messages()
+        rewritten = []
+        if self.recent_messages:
+            cursor = self.conn.execute(
+                "SELECT * FROM MSG WHERE localId BETWEEN ? AND ? AND Type = 10000 AND SubType = 0;",
+                (next(iter(self.recent_messages)), self.current_local_id),
+            )
+            rewritten = [row for row in cursor if self.is_revoked_row(row)]
+
+        count = 0
+        cursor = self.conn.execute(
+            "SELECT * FROM MSG WHERE localId > ? ORDER BY localId LIMIT ?;",
+            (self.current_local_id, self.get_poll_limit(0)),
+        )
+        for rows in itertools.chain([rewritten], self.iter_batches(cursor)):
+            for row, event in zip(rows, self.get_events(rows)):
+                if not event:
+                    continue
+                revoked = is_revoke_row(row)
+                msg_id = event["msg_id"]
+                if row[0] > self.current_local_id:
+                    self.current_local_id = row[0]
+                    if revoked:
+                        msg_id = self.get_revoke_msg_id(event) or msg_id
+                        event["revoked_message"] = self.find_revoked_message(
+                            msg_id
+                        ) or self.revoke_index.get(msg_id)
+                else:
+                    event["revoked_message"] = self.recent_messages[row[0]][2]
+                if row[6] >= cutoff:
+                    self.recent_messages[row[0]] = [row[6], revoked, event]
+                logger.debug(event)
+                self.emit(event)
+                if revoked:
+                    self.emit_revoke(
+                        self.get_revoke(
+                            msg_id,
+                            event["room_wxid"]
+                            or (
+                                event["to_wxid"]
+                                if event["is_sender"]
+                                else event["from_wxid"]
+                            ),
+                            event["create_time"],
+                            event["is_sender"],
+                            event.get("revoked_message"),
+                            event,
+                        )
+                    )
+                count += 1
 
-    def __str__(self) -> str:
-        return f"<WeChatDB pid={repr(self.pid)} wxid={repr(self.wxid)} msg_db={repr(self.msg_db)}>"
+        self.mark_polled(count)
+        return count
 
 
 if __name__ == "__main__":
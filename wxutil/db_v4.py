@@ -1,15 +1,51 @@
 import glob
 import hashlib
+import heapq
+import itertools
+import json
 import os
 import re
+import threading
 import time
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union, NoReturn
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from pyee.executor import ExecutorEventEmitter
 from sqlcipher3 import dbapi2 as sqlite
 
+from wxutil.avatar import V4_SOURCE, get_image_ext
+from wxutil.favorite import (
+    FAVORITE_COLUMNS,
+    FAVORITE_DB,
+    FAVORITE_FTS_DB,
+    FAVORITE_FTS_TABLE,
+    FavoriteItem,
+)
+from wxutil.hardlink import FILE, IMAGE, VIDEO, v4_sources
 from wxutil.logger import logger
-from wxutil.utils import decompress, get_db_key, get_wx_info, parse_xml
+from wxutil.metrics import metrics, timed
+from wxutil.process import get_wx_info
+from wxutil.session import V4_SOURCE as SESSION_SOURCE
+from wxutil.sns import SnsPost, SnsTimeline
+from wxutil.store import (
+    AccountExecutor,
+    LRUCache,
+    MessageStore,
+    apply_connection_profile,
+    decode_extra_buf,
+    fts_content_columns,
+    fts_phrase,
+    open_connection,
+    parse_fts_table,
+    split_message_type,
+    to_json,
+)
+from wxutil.utils import (
+    decompress,
+    get_db_key,
+    is_plain_db,
+    parse_xml,
+)
+from wxutil.wxids import MemberList
 
 ALL_MESSAGE = 0
 TEXT_MESSAGE = 1
@@ -42,79 +78,152 @@ COLLECTION_MESSAGE = 103079215153
 PAT_MESSAGE = 266287972401
 GROUP_ANNOUNCEMENT_MESSAGE = 373662154801
 
+SESSION_DB = os.path.join("db_storage", "session", "session.db")
+# 自己撤回的消息记录在 revokemessage 表中，按 revoke_time 增量读取
+REVOKE_DB = os.path.join("db_storage", "message", "message_revoke.db")
+FTS_DB = os.path.join("db_storage", "message", "message_fts.db")
 
-def decode_extra_buf(extra_buf_content: bytes):
-    data = {
-        "country": "",
-        "province": "",
-        "city": "",
-        "signature": "",
-        "phone": "",
-        "sex": "",
-    }
-    if not extra_buf_content:
-        return data
-    trunk_name = {
-        b"\x46\xcf\x10\xc4": "个性签名",
-        b"\xa4\xd9\x02\x4a": "国家",
-        b"\xe2\xea\xa8\xd1": "省份",
-        b"\x1d\x02\x5b\xbf": "市区",
-        # b"\x81\xAE\x19\xB4": "朋友圈背景url",
-        # b"\xF9\x17\xBC\xC0": "公司名称",
-        # b"\x4E\xB9\x6D\x85": "企业微信属性",
-        # b"\x0E\x71\x9F\x13": "备注图片",
-        b"\x75\x93\x78\xad": "手机号",
-        b"\x74\x75\x2c\x06": "性别",
-    }
-    res = {"手机号": ""}
-    off = 0
-    try:
-        for key in trunk_name:
-            trunk_head = trunk_name[key]
-            try:
-                off = extra_buf_content.index(key) + 4
-            except:
-                pass
-            char = extra_buf_content[off : off + 1]
-            off += 1
-            if char == b"\x04":  # 四个字节的int，小端序
-                int_content = extra_buf_content[off : off + 4]
-                off += 4
-                int_content = int.from_bytes(int_content, "little")
-                res[trunk_head] = int_content
-            elif char == b"\x18":  # utf-16字符串
-                length_content = extra_buf_content[off : off + 4]
-                off += 4
-                length_content = int.from_bytes(length_content, "little")
-                strContent = extra_buf_content[off : off + length_content]
-                off += length_content
-                res[trunk_head] = strContent.decode("utf-16").rstrip("\x00")
-        return {
-            "country": res["国家"],
-            "province": res["省份"],
-            "city": res["市区"],
-            "signature": res["个性签名"],
-            "phone": res["手机号"],
-            "sex": res["性别"],
-        }
-    except Exception:
-        return data
+
+def get_msg_table(wxid: str) -> str:
+    return f"Msg_{hashlib.md5(wxid.encode()).hexdigest()}"
 
 
-class WeChatDB:
+class MsgTableIndex:
+    """Msg_<md5(wxid)> 表名与会话 wxid 的双向索引。
+    由 Name2Id 一次性批量计算 md5 建立，之后只扫描 rowid 更大的新用户名"""
+
+    def __init__(self) -> None:
+        self.table_to_wxid = {}
+        self.wxid_to_table = {}
+        # 已出现但还没在 Name2Id 中找到对应用户名的表
+        self.unresolved = set()
+        self.last_rowid = 0
+        self.lock = threading.Lock()
+
+    def update(self, conn: sqlite.Connection, tables: Iterable[str]) -> None:
+        new_tables = [
+            table
+            for table in tables
+            if table not in self.table_to_wxid and table not in self.unresolved
+        ]
+        if not new_tables and not self.unresolved:
+            return
+        with self.lock:
+            self.unresolved.update(new_tables)
+            # 新会话的用户名通常是新登记的，先只扫描新增的行
+            self.scan(conn, self.last_rowid)
+            if any(table in self.unresolved for table in new_tables):
+                self.scan(conn, 0)
+
+    def scan(self, conn: sqlite.Connection, after: int) -> None:
+        with conn:
+            cursor = conn.execute(
+                "SELECT rowid, user_name FROM Name2Id WHERE rowid > ? ORDER BY rowid;",
+                (after,),
+            )
+            for rowid, wxid in cursor:
+                self.last_rowid = max(self.last_rowid, rowid)
+                if not wxid:
+                    continue
+                table = get_msg_table(wxid)
+                if table in self.unresolved:
+                    self.unresolved.discard(table)
+                    self.table_to_wxid[table] = wxid
+                    self.wxid_to_table[wxid] = table
+
+    def get_table(self, wxid: str) -> str:
+        return self.wxid_to_table.get(wxid) or get_msg_table(wxid)
+
+    def get_wxid(self, table: str) -> Optional[str]:
+        return self.table_to_wxid.get(table)
+
+    def __len__(self) -> int:
+        return len(self.table_to_wxid)
+
+
+class WeChatDB(MessageStore):
+    version = "v4"
+    all_message = ALL_MESSAGE
+    # "tables"：消息库变化时检查所有 Msg_* 表；
+    # "session"：对比 SessionTable 快照，只查询最后一条消息有变化的会话表
+    listen_mode = "tables"
+    # session 模式下会话已更新但消息还没读到时，最多再重试的 poll 次数
+    session_retries = 3
+    # 朋友圈增量同步的检查点文件，None 时只保存在内存中
+    sns_checkpoint_path = None
+    # 公众号消息（biz_message_N.db）：独立的检查间隔、单次上限与分发队列，
+    # 大量公众号推送不会占用普通消息的轮询与处理线程
+    listen_biz = True
+    biz_interval = 5.0
+    biz_poll_limit = 200
+    # 公众号分发队列中最多积压的消息数（不是处理任务数）
+    biz_max_pending = 1000
+    biz_workers = 1
+    # 最近的消息按 server_id 保存在环形缓冲中，收到撤回时直接取出原消息，不再查询历史；
+    # 启动时载入 revoke_window 秒内的消息（微信只能撤回 2 分钟内的消息）
+    revoke_buffer_size = 5000
+    revoke_window = 300
+
     def __init__(self, pid: Optional[int] = None) -> None:
-        self.info = get_wx_info("v4", pid)
+        self.setup(get_wx_info("v4", pid))
+
+    @classmethod
+    def from_dir(
+        cls,
+        data_dir: str,
+        key: Optional[str] = None,
+        wxid: Optional[str] = None,
+        db_profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+        listen_mode: Optional[str] = None,
+    ) -> "WeChatDB":
+        """不查找微信进程，直接打开数据目录；已解密的数据库可不传 key，
+        db_profiles 按文件名覆盖连接参数，如 {"message_0.db": {"cache_size": -262144}}，
+        listen_mode 见 WeChatDB.listen_mode"""
+        wechat_db = cls.__new__(cls)
+        wechat_db.setup(
+            {
+                "pid": None,
+                "version": None,
+                "account": wxid,
+                "data_dir": data_dir,
+                "key": key,
+                "wxid": wxid,
+                "db_profiles": db_profiles,
+                "listen_mode": listen_mode,
+            }
+        )
+        return wechat_db
+
+    def setup(self, info: Dict[str, Any]) -> None:
+        self.info = info
+        if info.get("db_profiles"):
+            self.db_profiles = {**self.db_profiles, **info["db_profiles"]}
+        if info.get("listen_mode"):
+            self.listen_mode = info["listen_mode"]
         self.pid = self.info["pid"]
         self.key = self.info["key"]
         self.data_dir = self.info["data_dir"]
+        self.session_db_path = self.get_db_path(SESSION_DB)
         self.msg_db = self.get_msg_db()
-        self.msg_db_wal = self.get_db_path(rf"db_storage\message\{self.msg_db}-wal")
-        self.conn = self.create_connection(rf"db_storage\message\{self.msg_db}")
-        self.wxid = self.data_dir.rstrip("\\").split("\\")[-1][:-5]
-        self.event_emitter = ExecutorEventEmitter()
-
-    def get_db_path(self, db_name: str) -> str:
-        return os.path.join(self.data_dir, db_name)
+        self.msg_db_path = self.get_db_path(
+            os.path.join("db_storage", "message", self.msg_db)
+        )
+        self.msg_db_wal = f"{self.msg_db_path}-wal"
+        self.conn = self.create_connection(
+            os.path.join("db_storage", "message", self.msg_db)
+        )
+        self.msg_table_index = MsgTableIndex()
+        # biz_message_N.db -> 该库的 MsgTableIndex
+        self.biz_table_indexes = {}
+        # biz_message_N.db -> {Msg_ 表: 已分发的最大 local_id}
+        self.biz_max_local_id = {}
+        self.biz_pool = None
+        self.sns_timeline = SnsTimeline(self.get_connection, self.sns_checkpoint_path)
+        self.wxid = (
+            self.info.get("wxid")
+            or re.split(r"[\\/]", self.data_dir.rstrip("\\/"))[-1][:-5]
+        )
+        self.init_store()
 
     def get_msg_db(self) -> str:
         db_files = glob.glob(
@@ -132,14 +241,23 @@ class WeChatDB:
         latest_file = max(db_files, key=os.path.getmtime)
         return os.path.basename(latest_file)
 
+    @timed("connect")
     def create_connection(self, db_name: str) -> sqlite.Connection:
-        conn = sqlite.connect(self.get_db_path(db_name), check_same_thread=False)
-        db_key = get_db_key(self.key, self.get_db_path(db_name), "4")
+        db_path = self.get_db_path(db_name)
+        profile = self.get_connection_profile(db_name)
+        conn = open_connection(sqlite, db_path, profile)
+        if is_plain_db(db_path):
+            apply_connection_profile(conn, profile, encrypted=False)
+            return conn
+        if self.key is None:
+            raise Exception(f"Database is encrypted, key is required: {db_name}")
+        db_key = get_db_key(self.key, db_path, "4")
         conn.execute(f"PRAGMA key = \"x'{db_key}'\";")
         conn.execute(f"PRAGMA cipher_page_size = 4096;")
         conn.execute(f"PRAGMA kdf_iter = 256000;")
         conn.execute(f"PRAGMA cipher_hmac_algorithm = HMAC_SHA512;")
         conn.execute(f"PRAGMA cipher_kdf_algorithm = PBKDF2_HMAC_SHA512;")
+        apply_connection_profile(conn, profile, encrypted=True)
         return conn
 
     def get_message(self, row: Tuple) -> Dict:
@@ -164,13 +282,17 @@ class WeChatDB:
             "sender": row[17],
         }
 
-    def get_event(self, table: str, row: Optional[Tuple]) -> Optional[Dict]:
+    @timed("get_event")
+    def get_event(
+        self, table: str, row: Optional[Tuple], biz: bool = False
+    ) -> Optional[Dict]:
         if not row:
             return None
 
         message = self.get_message(row)
         data = {
             "table": table,
+            "talker": self.get_table_wxid(table),
             "id": message["local_id"],
             "msg_id": message["server_id"],
             "sequence": message["sort_seq"],
@@ -185,6 +307,8 @@ class WeChatDB:
             "extra": message["packed_info_data"],
             "status": message["status"],
             "create_time": message["create_time"],
+            "media_path": None,
+            "biz": biz,
         }
 
         if message["source"]:
@@ -204,7 +328,18 @@ class WeChatDB:
             except Exception:
                 pass
 
-        if data["is_sender"] == 1:
+        if data["talker"]:
+            # 会话表对应的 wxid 已知，不再从 packed_info_data 推断
+            if data["talker"].endswith("@chatroom"):
+                data["room_wxid"] = data["talker"]
+            elif data["is_sender"] == 1:
+                data["to_wxid"] = data["talker"]
+            else:
+                data["to_wxid"] = self.wxid
+        elif biz:
+            # packed_info_data 中的 id 属于公众号消息库的 Name2Id，不在主消息库中推断
+            data["to_wxid"] = self.wxid
+        elif data["is_sender"] == 1:
             wxid = self.id_to_wxid(message["packed_info_data"][:4][-1])
             if wxid.endswith("@chatroom"):
                 data["room_wxid"] = wxid
@@ -217,10 +352,23 @@ class WeChatDB:
             else:
                 data["to_wxid"] = self.id_to_wxid(message["packed_info_data"][:4][-1])
 
+        if self.resolve_media:
+            data["media_path"] = self.get_media_path(data)
+
         return data
 
     def get_msg_table(self, wxid: str) -> str:
-        return f"Msg_{hashlib.md5(wxid.encode()).hexdigest()}"
+        return self.msg_table_index.get_table(wxid)
+
+    def get_table_wxid(self, table: str) -> Optional[str]:
+        """Msg_<md5> 表对应的会话 wxid"""
+        wxid = self.msg_table_index.get_wxid(table)
+        if wxid is None:
+            for index in list(self.biz_table_indexes.values()):
+                wxid = index.get_wxid(table)
+                if wxid is not None:
+                    break
+        return wxid
 
     def get_text_msg(
         self,
@@ -271,7 +419,7 @@ class WeChatDB:
                     if content in msg:
                         data.append(row)
                 data = data[:decompress_limit]
-            return [self.get_event(table, item) for item in data]
+            return self.get_events(data, table)
 
     def get_image_msg(
         self, self_wxid: str, to_wxid: str, md5: str, seconds: int = 30, limit: int = 1
@@ -299,7 +447,7 @@ class WeChatDB:
                 message_content = parse_xml(decompress(row[12]))
                 if message_content["msg"]["img"]["@md5"] == md5:
                     data.append(row)
-        return [self.get_event(table, item) for item in data]
+        return self.get_events(data, table)
 
     def get_file_msg(
         self, self_wxid: str, to_wxid: str, md5: str, seconds: int = 30, limit: int = 1
@@ -327,7 +475,7 @@ class WeChatDB:
                 message_content = parse_xml(decompress(row[12]))
                 if message_content["msg"]["appmsg"]["md5"] == md5:
                     data.append(row)
-        return [self.get_event(table, item) for item in data]
+        return self.get_events(data, table)
 
     def get_recently_messages(
         self, table: str, count: int = 10, order: str = "DESC"
@@ -345,7 +493,430 @@ class WeChatDB:
                 """.format(table, order),
                 (count,),
             ).fetchall()
-            return [self.get_event(table, row) for row in rows]
+            return self.get_events(rows, table)
+
+    def iter_messages(
+        self,
+        talker: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        types: Optional[List[int]] = None,
+        page_size: int = 500,
+        include_biz: bool = False,
+    ) -> Iterator[Dict]:
+        """按 (sort_seq, local_id) 升序分页读取 start <= create_time < end 的消息，
+        不指定 talker 时按 sort_seq 归并所有会话表。include_biz 为 True 或 talker 为
+        公众号（gh_ 开头）时同时读取公众号消息库，否则不打开公众号消息库"""
+        sources = [(self.conn, table, False) for table in self.get_msg_tables()]
+        if include_biz or (talker is not None and talker.startswith("gh_")):
+            for db_name in self.get_biz_msg_dbs():
+                sources.extend(
+                    (self.get_connection(db_name), table, True)
+                    for table in self.get_biz_msg_tables(db_name)
+                )
+        if talker is not None:
+            table = self.get_msg_table(talker)
+            sources = [source for source in sources if source[1] == table]
+        iterators = [
+            self.iter_table_messages(
+                table, start, end, types, page_size, conn=conn, biz=biz
+            )
+            for conn, table, biz in sources
+        ]
+        if len(iterators) == 1:
+            yield from iterators[0]
+        else:
+            yield from heapq.merge(*iterators, key=lambda event: event["sequence"])
+
+    def iter_table_messages(
+        self,
+        table: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        types: Optional[List[int]] = None,
+        page_size: int = 500,
+        conn: Optional[sqlite.Connection] = None,
+        biz: bool = False,
+    ) -> Iterator[Dict]:
+        conn = conn or self.conn
+        where, params = [], []
+        if start is not None:
+            where.append("m.create_time >= ?")
+            params.append(int(start))
+        if end is not None:
+            where.append("m.create_time < ?")
+            params.append(int(end))
+        if types:
+            where.append("m.local_type IN ({})".format(",".join("?" * len(types))))
+            params.extend(types)
+
+        sql = """
+            SELECT
+                m.*,
+                n.user_name AS sender
+            FROM {} AS m
+            LEFT JOIN Name2Id AS n ON m.real_sender_id = n.rowid
+            WHERE {}
+            ORDER BY m.sort_seq, m.local_id
+            LIMIT ?;
+            """
+        # 归并多个会话表时每个表都会先取一页，首页取小一些再逐步放大
+        limit = min(16, page_size)
+        last = None
+        while True:
+            page_where, page_params = list(where), list(params)
+            if last is not None:
+                # keyset 分页：sort_seq >= ? 可走 {table}_SORTSEQ 索引
+                page_where.append(
+                    "m.sort_seq >= ? AND (m.sort_seq > ? OR m.local_id > ?)"
+                )
+                page_params.extend((last[0], last[0], last[1]))
+            with conn:
+                rows = conn.execute(
+                    sql.format(table, " AND ".join(page_where) or "1"),
+                    (*page_params, limit),
+                ).fetchall()
+            for event in self.get_events(rows, table, biz):
+                if event:
+                    yield event
+            if len(rows) < limit:
+                return
+            last = (rows[-1][3], rows[-1][0])
+            limit = min(limit * 2, page_size)
+
+    def get_fts_tables(self) -> List[Tuple[str, str, List[str]]]:
+        """message_fts.db 中的 message_fts_v3_N 全文索引表：(表名, 模块名, 列名)"""
+        conn = self.get_connection(FTS_DB)
+        with conn:
+            rows = conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name LIKE 'message_fts_v3_%';"
+            ).fetchall()
+        tables = [
+            (name, *parse_fts_table(sql))
+            for name, sql in rows
+            if sql and re.fullmatch(r"message_fts_v3_\d+", name)
+        ]
+        return sorted(tables, key=lambda table: int(table[0].rsplit("_", 1)[1]))
+
+    def iter_fts_hits(
+        self, keyword: str, talker: Optional[str], page_size: int
+    ) -> Iterator[List[Tuple[Any, int]]]:
+        """按页返回命中的 (session_id, message_local_id)；
+        session_id 可能是用户名，也可能是 Name2Id 的 rowid"""
+        conn = self.get_connection(FTS_DB)
+        sessions = []
+        if talker is not None:
+            sessions.append(talker)
+            with self.conn:
+                row = self.conn.execute(
+                    "SELECT rowid FROM Name2Id WHERE user_name = ?;", (talker,)
+                ).fetchone()
+            if row:
+                sessions.append(row[0])
+
+        for table, module, columns in self.get_fts_tables():
+            if "session_id" not in columns or "message_local_id" not in columns:
+                continue
+            content = next((c for c in columns if "content" in c), columns[0])
+            rowid, names = fts_content_columns(module, columns)
+            session_name = names[columns.index("session_id")]
+            local_id_name = names[columns.index("message_local_id")]
+            content_name = names[columns.index(content)]
+            match_where = content_where = ""
+            if sessions:
+                placeholders = ",".join("?" * len(sessions))
+                match_where = f" AND session_id IN ({placeholders})"
+                content_where = f" AND {session_name} IN ({placeholders})"
+
+            last = 2**63 - 1
+            while True:
+                rows = self.query_fts(
+                    conn,
+                    table,
+                    (
+                        f"SELECT rowid, session_id, message_local_id FROM {table} WHERE {table} MATCH ?{match_where} AND rowid < ? ORDER BY rowid DESC LIMIT ?;",
+                        (fts_phrase(keyword), *sessions, last, page_size),
+                    ),
+                    (
+                        f"SELECT {rowid}, {session_name}, {local_id_name} FROM {table}_content WHERE instr({content_name}, ?) > 0{content_where} AND {rowid} < ? ORDER BY {rowid} DESC LIMIT ?;",
+                        (keyword, *sessions, last, page_size),
+                    ),
+                )
+                if rows:
+                    yield [(row[1], row[2]) for row in rows]
+                if len(rows) < page_size:
+                    break
+                last = rows[-1][0]
+
+    def load_fts_hits(
+        self, hits: List[Tuple[Any, int]], talker: Optional[str]
+    ) -> List[Dict]:
+        """按会话分组，每个 Msg_* 表用 IN 批量读取命中的消息"""
+        self.load_wxids(session for session, _ in hits if isinstance(session, int))
+        msg_tables = set(self.get_msg_tables())
+        keys = []
+        groups = {}
+        for session, local_id in hits:
+            username = session if isinstance(session, str) else self.id_to_wxid(session)
+            if not username:
+                continue
+            table = self.get_msg_table(username)
+            if table not in msg_tables:
+                continue
+            keys.append((table, local_id))
+            groups.setdefault(table, []).append(local_id)
+
+        events = {}
+        for table, local_ids in groups.items():
+            for i in range(0, len(local_ids), 500):
+                chunk = local_ids[i : i + 500]
+                with self.conn:
+                    rows = self.conn.execute(
+                        """
+                        SELECT
+                            m.*,
+                            n.user_name AS sender
+                        FROM {} AS m
+                        LEFT JOIN Name2Id AS n ON m.real_sender_id = n.rowid
+                        WHERE m.local_id IN ({});
+                        """.format(table, ",".join("?" * len(chunk))),
+                        chunk,
+                    ).fetchall()
+                for event in self.get_events(rows, table):
+                    if event:
+                        events[(table, event["id"])] = event
+        return [events[key] for key in keys if key in events]
+
+    def get_media_dbs(self) -> List[str]:
+        """db_storage/message 下的 media_N.db，较新的在前"""
+        message_dir = os.path.join(self.data_dir, "db_storage", "message")
+        db_files = [
+            db_file
+            for db_file in glob.glob(os.path.join(message_dir, "media_*.db"))
+            if re.match(r".*media_\d+\.db$", db_file)
+        ]
+        return [
+            os.path.join("db_storage", "message", os.path.basename(db_file))
+            for db_file in sorted(db_files, key=os.path.getmtime, reverse=True)
+        ]
+
+    def open_voice(self, event: Dict) -> Any:
+        """按 (chat_name_id, svr_id) 在 VoiceInfo 中查找语音，返回 voice_data 的只读 BLOB 流"""
+        talker = (
+            event.get("talker")
+            or event.get("room_wxid")
+            or (event["to_wxid"] if event["is_sender"] else event["from_wxid"])
+        )
+        for db_name in self.get_media_dbs():
+            conn = self.get_connection(db_name)
+            with conn:
+                row = conn.execute(
+                    """
+                    SELECT
+                        rowid
+                    FROM VoiceInfo
+                    WHERE chat_name_id = (SELECT rowid FROM Name2Id WHERE user_name = ?)
+                    AND svr_id = ?;
+                    """,
+                    (talker, event["msg_id"]),
+                ).fetchone()
+            if row:
+                return conn.open_blob("VoiceInfo", "voice_data", row[0], readonly=True)
+        return None
+
+    def iter_sns_posts(
+        self,
+        wxid: Optional[str] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        page_size: int = 100,
+    ) -> Iterator[SnsPost]:
+        """按 tid 降序读取朋友圈（wxid 为 None 时为全部好友），XML 在访问 post.xml 时才解析"""
+        return self.sns_timeline.iter_posts(wxid, before, after, page_size)
+
+    def iter_sns_messages(self, after: int = 0) -> Iterator[Dict]:
+        return self.sns_timeline.iter_messages(after)
+
+    def sync_sns(self) -> Tuple[List[SnsPost], List[Dict]]:
+        """上次同步后新增的朋友圈与点赞、评论通知"""
+        return self.sns_timeline.sync()
+
+    def iter_favorites(
+        self,
+        types: Optional[List[int]] = None,
+        page_size: int = 200,
+    ) -> Iterator[FavoriteItem]:
+        """按 (update_time, local_id) 降序分页读取收藏，XML 在访问 item.xml 时才解析"""
+        conn = self.get_connection(FAVORITE_DB)
+        where, params = [], []
+        if types:
+            where.append("type IN ({})".format(",".join("?" * len(types))))
+            params.extend(types)
+        last = None
+        while True:
+            page_where = list(where)
+            page_params = list(params)
+            if last is not None:
+                page_where.append(
+                    "(update_time < ? OR (update_time = ? AND local_id < ?))"
+                )
+                page_params.extend((last[0], last[0], last[1]))
+            sql = f"SELECT {FAVORITE_COLUMNS} FROM fav_db_item"
+            if page_where:
+                sql += " WHERE " + " AND ".join(page_where)
+            sql += " ORDER BY update_time DESC, local_id DESC LIMIT ?;"
+            with conn:
+                rows = conn.execute(sql, (*page_params, page_size)).fetchall()
+            for row in rows:
+                yield FavoriteItem(row)
+            if len(rows) < page_size:
+                break
+            last = (rows[-1][3], rows[-1][0])
+
+    def get_favorites(self, local_ids: List[int]) -> List[FavoriteItem]:
+        """按 local_id 批量读取收藏，顺序与 local_ids 相同"""
+        conn = self.get_connection(FAVORITE_DB)
+        items = {}
+        for i in range(0, len(local_ids), 500):
+            chunk = local_ids[i : i + 500]
+            with conn:
+                rows = conn.execute(
+                    f"SELECT {FAVORITE_COLUMNS} FROM fav_db_item WHERE local_id IN ({','.join('?' * len(chunk))});",
+                    chunk,
+                ).fetchall()
+            for row in rows:
+                items[row[0]] = FavoriteItem(row)
+        return [items[local_id] for local_id in local_ids if local_id in items]
+
+    def search_favorites(
+        self, keyword: str, limit: int = 100, page_size: int = 200
+    ) -> List[FavoriteItem]:
+        """在 favorite_fts.db 的 fav_fts_v1 中搜索收藏，按索引从新到旧返回"""
+        conn = self.get_connection(FAVORITE_FTS_DB)
+        with conn:
+            row = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;",
+                (FAVORITE_FTS_TABLE,),
+            ).fetchone()
+        if not row:
+            return []
+        module, columns = parse_fts_table(row[0])
+        rowid, names = fts_content_columns(module, columns)
+        content_name = names[columns.index("content")]
+        local_id_name = names[columns.index("local_id")]
+
+        items = []
+        last = 2**63 - 1
+        while len(items) < limit:
+            rows = self.query_fts(
+                conn,
+                FAVORITE_FTS_TABLE,
+                (
+                    f"SELECT rowid, local_id FROM {FAVORITE_FTS_TABLE} WHERE {FAVORITE_FTS_TABLE} MATCH ? AND rowid < ? ORDER BY rowid DESC LIMIT ?;",
+                    (fts_phrase(keyword), last, page_size),
+                ),
+                (
+                    f"SELECT {rowid}, {local_id_name} FROM {FAVORITE_FTS_TABLE}_content WHERE instr({content_name}, ?) > 0 AND {rowid} < ? ORDER BY {rowid} DESC LIMIT ?;",
+                    (keyword, last, page_size),
+                ),
+            )
+            local_ids = list(dict.fromkeys(int(row[1]) for row in rows))
+            items.extend(self.get_favorites(local_ids))
+            if len(rows) < page_size:
+                break
+            last = rows[-1][0]
+        return items[:limit]
+
+    def export_favorites(
+        self,
+        dst: str,
+        batch_size: int = 200,
+        xor_key: Optional[int] = None,
+        aes_key: Optional[bytes] = None,
+    ) -> Dict[str, Any]:
+        """分批导出收藏到 dst/favorites.jsonl，附件按 fullmd5 在 hardlink 索引中查找，
+        解密后写入 dst/media/<md5>.<ext>；未传入的密钥见 get_media_keys。
+        单个附件读取或解密失败时记入 failed 并继续。返回数量与耗时"""
+        xor_key, aes_key = self.get_media_keys(xor_key, aes_key)
+        media_dir = os.path.join(dst, "media")
+        os.makedirs(media_dir, exist_ok=True)
+        stats = {"favorites": 0, "media": 0, "missing": 0, "failed": 0, "bytes": 0}
+        started = time.perf_counter()
+        with open(os.path.join(dst, "favorites.jsonl"), "w", encoding="utf-8") as f:
+            batch = []
+            for item in self.iter_favorites(page_size=batch_size):
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    self.export_favorite_batch(
+                        batch, f, media_dir, xor_key, aes_key, stats
+                    )
+                    batch = []
+            if batch:
+                self.export_favorite_batch(batch, f, media_dir, xor_key, aes_key, stats)
+        stats["seconds"] = time.perf_counter() - started
+        logger.info(
+            f"Exported {stats['favorites']} favorites, {stats['media']} media ({stats['bytes']} bytes), "
+            f"missing {stats['missing']}, failed {stats['failed']} in {stats['seconds']:.2f}s"
+        )
+        return stats
+
+    def export_favorite_batch(
+        self,
+        items: List[FavoriteItem],
+        f: Any,
+        media_dir: str,
+        xor_key: int,
+        aes_key: bytes,
+        stats: Dict[str, Any],
+    ) -> None:
+        lines = []
+        for item in items:
+            record = item.to_dict()
+            record["media"] = []
+            for kind, data_item in item.get_media():
+                md5 = data_item["fullmd5"]
+                path = self.hardlink_index.get(md5, kind)
+                try:
+                    data = self.read_media(path, xor_key, aes_key) if path else None
+                    if data is None:
+                        stats["missing"] += 1
+                        continue
+                    ext = data_item.get("datafmt") or get_image_ext(data)
+                    name = f"{md5}.{ext}"
+                    with open(os.path.join(media_dir, name), "wb") as media_file:
+                        media_file.write(data)
+                except Exception:
+                    stats["failed"] += 1
+                    logger.exception(f"Export favorite media failed: {path}")
+                    continue
+                record["media"].append(f"media/{name}")
+                stats["media"] += 1
+                stats["bytes"] += len(data)
+            lines.append(json.dumps(record, ensure_ascii=False, default=to_json))
+            stats["favorites"] += 1
+        f.write("\n".join(lines) + "\n")
+
+    def get_avatar_source(self) -> Any:
+        return V4_SOURCE
+
+    def get_session_source(self) -> Any:
+        return SESSION_SOURCE
+
+    def get_hardlink_sources(self) -> List[Any]:
+        return v4_sources()
+
+    def get_media_md5(self, event: Dict) -> Tuple[Optional[str], Optional[str]]:
+        """get_event 已把非文本消息解析为 XML"""
+        try:
+            if event["type"] == IMAGE_MESSAGE:
+                return IMAGE, event["msg"]["msg"]["img"]["@md5"]
+            if event["type"] == VIDEO_MESSAGE:
+                return VIDEO, event["msg"]["msg"]["videomsg"]["@md5"]
+            if event["type"] == FILE_MESSAGE:
+                return FILE, event["msg"]["msg"]["appmsg"]["md5"]
+        except (KeyError, TypeError):
+            pass
+        return None, None
 
     def get_msg_tables(self) -> List[str]:
         with self.conn:
@@ -356,9 +927,72 @@ class WeChatDB:
             WHERE type='table'
             AND name LIKE 'Msg_%';
             """).fetchall()
-            return [row[0] for row in rows]
+        msg_tables = [row[0] for row in rows]
+        self.msg_table_index.update(self.conn, msg_tables)
+        return msg_tables
+
+    def get_biz_msg_dbs(self) -> List[str]:
+        """db_storage/message 下的公众号消息库 biz_message_N.db，较新的在前"""
+        message_dir = os.path.join(self.data_dir, "db_storage", "message")
+        db_files = [
+            db_file
+            for db_file in glob.glob(os.path.join(message_dir, "biz_message_*.db"))
+            if re.match(r".*biz_message_\d+\.db$", db_file)
+        ]
+        return [
+            os.path.join("db_storage", "message", os.path.basename(db_file))
+            for db_file in sorted(db_files, key=os.path.getmtime, reverse=True)
+        ]
+
+    def get_biz_msg_tables(self, db_name: str) -> List[str]:
+        conn = self.get_connection(db_name)
+        with conn:
+            rows = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'Msg_%';"
+            ).fetchall()
+        msg_tables = [row[0] for row in rows]
+        index = self.biz_table_indexes.setdefault(db_name, MsgTableIndex())
+        index.update(conn, msg_tables)
+        return msg_tables
+
+    def get_events(
+        self, rows: Iterable[Tuple], table: str, biz: bool = False
+    ) -> List[Optional[Dict]]:
+        rows = list(rows)
+        if biz or self.get_table_wxid(table):
+            return [self.get_event(table, row, biz) for row in rows]
+        ids = set()
+        for row in rows:
+            packed_info_data = row[14][:4] if row and row[14] else b""
+            if len(packed_info_data) > 1:
+                ids.add(packed_info_data[1])
+            if packed_info_data:
+                ids.add(packed_info_data[-1])
+        self.load_wxids(ids)
+        return super().get_events(rows, table)
+
+    def load_wxids(self, ids: Iterable[int]) -> None:
+        """批量把 Name2Id 的 rowid 载入缓存，解码一批消息只需一次查询"""
+        ids = [id for id in ids if ("wxid", id) not in self.cache]
+        metrics.incr("wxid_cache_misses", len(ids))
+        for i in range(0, len(ids), 500):
+            chunk = ids[i : i + 500]
+            with self.conn:
+                rows = self.conn.execute(
+                    "SELECT rowid, user_name FROM Name2Id WHERE rowid IN ({});".format(
+                        ",".join("?" * len(chunk))
+                    ),
+                    chunk,
+                ).fetchall()
+            for row in rows:
+                self.cache.set(("wxid", row[0]), row[1])
 
     def id_to_wxid(self, id: int) -> Optional[str]:
+        wxid = self.cache.get(("wxid", id))
+        if wxid is not None:
+            metrics.incr("wxid_cache_hits")
+            return wxid
+        metrics.incr("wxid_cache_misses")
         with self.conn:
             row = self.conn.execute(
                 """
@@ -371,13 +1005,14 @@ class WeChatDB:
             ).fetchone()
             if row is None:
                 return None
+            self.cache.set(("wxid", id), row[0])
             return row[0]
 
     def get_contacts(self) -> List:
-        conn = self.create_connection("db_storage/contact/contact.db")
+        conn = self.get_connection("db_storage/contact/contact.db")
         contacts = []
         with conn:
-            rows = conn.execute("""
+            for row in conn.execute("""
             SELECT 
                 username, 
                 alias,
@@ -389,8 +1024,7 @@ class WeChatDB:
             WHERE local_type in (1, 5) 
             AND flag = 3
             AND verify_flag = 0;
-            """).fetchall()
-            for row in rows:
+            """):
                 contact = {
                     "wxid": row[0],
                     "account": row[1],
@@ -403,7 +1037,7 @@ class WeChatDB:
         return contacts
 
     def get_contact(self, wxid: str) -> Optional[Dict]:
-        conn = self.create_connection("db_storage/contact/contact.db")
+        conn = self.get_connection("db_storage/contact/contact.db")
         with conn:
             row = conn.execute(
                 """
@@ -435,10 +1069,10 @@ class WeChatDB:
             return contact
 
     def get_rooms(self) -> List[Dict]:
-        conn = self.create_connection("db_storage/contact/contact.db")
+        conn = self.get_connection("db_storage/contact/contact.db")
         rooms = []
         with conn:
-            rows = conn.execute("""
+            for row in conn.execute("""
             SELECT
                 contact.username,
                 contact.nick_name,
@@ -455,8 +1089,7 @@ class WeChatDB:
              FROM chat_room
              LEFT JOIN contact on contact.username = chat_room.username
              LEFT JOIN chat_room_info_detail on chat_room_info_detail.username_ = chat_room.username
-             WHERE contact.is_in_chat_room != 2;""").fetchall()
-            for row in rows:
+             WHERE contact.is_in_chat_room != 2;"""):
                 room = {
                     "wxid": row[0],
                     "nickname": row[1],
@@ -475,7 +1108,7 @@ class WeChatDB:
         return rooms
 
     def get_room(self, room_wxid: str) -> Optional[Dict]:
-        conn = self.create_connection("db_storage/contact/contact.db")
+        conn = self.get_connection("db_storage/contact/contact.db")
         with conn:
             row = conn.execute(
                 """
@@ -519,10 +1152,10 @@ class WeChatDB:
             return room
 
     def get_room_members(self, room_wxid: str) -> List[Dict]:
-        conn = self.create_connection("db_storage/contact/contact.db")
+        conn = self.get_connection("db_storage/contact/contact.db")
         room_members = []
         with conn:
-            rows = conn.execute(
+            for row in conn.execute(
                 """
             SELECT 
                 contact.username, 
@@ -535,8 +1168,7 @@ class WeChatDB:
             AND chat_room.username = ?;
             """,
                 (room_wxid,),
-            ).fetchall()
-            for row in rows:
+            ):
                 room_members.append(
                     {
                         "wxid": row[0],
@@ -546,21 +1178,36 @@ class WeChatDB:
                 )
         return room_members
 
+    def get_room_member_list(self, room_wxid: str) -> MemberList:
+        conn = self.get_connection("db_storage/contact/contact.db")
+        with conn:
+            cursor = conn.execute(
+                """
+            SELECT
+                contact.username
+            FROM chatroom_member
+            JOIN chat_room ON chatroom_member.room_id = chat_room.rowid
+            JOIN contact ON chatroom_member.member_id = contact.rowid
+            WHERE chat_room.username = ?;
+            """,
+                (room_wxid,),
+            )
+            return MemberList.from_wxids(row[0] for row in cursor)
+
     def get_labels(self) -> List[Dict]:
-        conn = self.create_connection("db_storage/contact/contact.db")
+        conn = self.get_connection("db_storage/contact/contact.db")
         labels = []
         with conn:
-            rows = conn.execute("""
+            for row in conn.execute("""
                 SELECT 
                     label_id_, label_name_
                 FROM contact_label;
-                """).fetchall()
-            for row in rows:
+                """):
                 labels.append({"id": row[0], "name": row[1]})
         return labels
 
     def get_label(self, id) -> Optional[Dict]:
-        conn = self.create_connection("db_storage/contact/contact.db")
+        conn = self.get_connection("db_storage/contact/contact.db")
         with conn:
             row = conn.execute(
                 """
@@ -575,72 +1222,425 @@ class WeChatDB:
             label = {"id": row[0], "name": row[1]}
             return label
 
-    def handle(
-        self, events: Union[int, list] = 0, once: bool = False
-    ) -> Callable[[Callable[..., Any]], None]:
-        def wrapper(func: Callable[..., Any]) -> None:
-            listen = self.event_emitter.on if not once else self.event_emitter.once
-            if isinstance(events, int):
-                listen(str(events), func)
-            elif isinstance(events, list):
-                for event in events:
-                    listen(str(event), func)
-            else:
-                raise TypeError("events must be int or list.")
+    def get_event_name(self, type: int) -> str:
+        if not isinstance(type, int):
+            raise TypeError("events must be int or list.")
+        return str(type)
 
-        return wrapper
+    def get_event_type(self, event: Dict) -> int:
+        return event["type"]
 
-    def run(self, period: float = 0.1) -> NoReturn:
-        msg_table_max_local_id = {}
-        self.msg_tables = self.get_msg_tables()
-        for msg_table in self.msg_tables:
-            recently_messages = self.get_recently_messages(msg_table, 1)
-            current_max_local_id = (
-                recently_messages[0]["id"]
-                if recently_messages and recently_messages[0]
-                else 0
+    def normalize_event(self, event: Dict) -> Dict:
+        type, sub_type = split_message_type(event["type"])
+        return {
+            "version": self.version,
+            "id": event["id"],
+            "msg_id": event["msg_id"],
+            "sequence": event["sequence"],
+            "type": type,
+            "sub_type": sub_type,
+            "is_sender": event["is_sender"],
+            "create_time": event["create_time"],
+            "talker": event["talker"]
+            or event["room_wxid"]
+            or (event["to_wxid"] if event["is_sender"] else event["from_wxid"]),
+            "room_wxid": event["room_wxid"],
+            "from_wxid": event["from_wxid"],
+            "to_wxid": event["to_wxid"],
+            "content": event["msg"],
+            "at_user_list": event["at_user_list"],
+            "raw": event,
+        }
+
+    def get_msg_db_mtime(self) -> float:
+        mtime = super().get_msg_db_mtime()
+        if self.listen_mode == "session":
+            for path in (self.session_db_path, f"{self.session_db_path}-wal"):
+                if os.path.exists(path):
+                    mtime = max(mtime, os.path.getmtime(path))
+        return mtime
+
+    def get_session_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """username -> (sort_timestamp, last_msg_locald_id)，按 sort_timestamp 从新到旧"""
+        conn = self.get_connection(SESSION_DB)
+        with conn:
+            cursor = conn.execute(
+                "SELECT username, sort_timestamp, last_msg_locald_id FROM SessionTable ORDER BY sort_timestamp DESC;"
             )
-            msg_table_max_local_id[msg_table] = current_max_local_id
+            return {row[0]: (row[1], row[2]) for row in cursor}
+
+    def get_changed_tables(self) -> List[str]:
+        """与上次的 SessionTable 快照对比，返回需要查询的会话表"""
+        snapshot = self.get_session_snapshot()
+        tables = [
+            self.get_msg_table(username)
+            for username, state in snapshot.items()
+            if self.session_snapshot.get(username) != state
+        ]
+        self.session_snapshot = snapshot
+        if any(table not in self.msg_table_max_local_id for table in tables):
+            self.update_msg_tables()
+        tables = [table for table in tables if table in self.msg_table_max_local_id]
+        tables.extend(table for table in self.pending_tables if table not in tables)
+        return tables
+
+    def update_pending_table(self, table: str, drained: bool) -> None:
+        """会话记录的 last_msg_locald_id 比已读取的位置新（消息还没写入）或达到单次上限时，
+        后续几次 poll 继续查询该表"""
+        username = self.get_table_wxid(table)
+        state = self.session_snapshot.get(username) if username else None
+        behind = bool(
+            state and state[1] and state[1] > self.msg_table_max_local_id[table]
+        )
+        if not drained:
+            self.pending_tables[table] = self.session_retries
+            return
+        retries = self.pending_tables.pop(table, self.session_retries + 1) - 1
+        if behind and retries > 0:
+            self.pending_tables[table] = retries
+
+    def update_msg_tables(self) -> None:
+        current_msg_tables = self.get_msg_tables()
+        new_msg_tables = list(set(current_msg_tables) - set(self.msg_tables))
+        self.msg_tables = current_msg_tables
+        for new_msg_table in new_msg_tables:
+            self.msg_table_max_local_id[new_msg_table] = 0
+
+    def start(self) -> None:
+        self.msg_table_max_local_id = {}
+        self.msg_tables = self.get_msg_tables()
+        # 只取各表的最大 local_id，不再解码每个表的最后一条消息
+        with self.conn:
+            for msg_table in self.msg_tables:
+                row = self.conn.execute(
+                    f"SELECT MAX(local_id) FROM {msg_table};"
+                ).fetchone()
+                self.msg_table_max_local_id[msg_table] = row[0] or 0
+        self.pending_tables = {}
+        if self.listen_mode == "session":
+            self.session_snapshot = self.get_session_snapshot()
+        self.start_biz()
+        self.start_revokes()
 
         logger.info(self.info)
         logger.info("Message listening...")
-        last_mtime = os.path.getmtime(self.msg_db_wal)
-        while True:
-            mtime = os.path.getmtime(self.msg_db_wal)
-            if mtime != last_mtime:
-                current_msg_tables = self.get_msg_tables()
-                new_msg_tables = list(set(current_msg_tables) - set(self.msg_tables))
-                self.msg_tables = current_msg_tables
-                for new_msg_table in new_msg_tables:
-                    msg_table_max_local_id[new_msg_table] = 0
-
-                for table, max_local_id in msg_table_max_local_id.items():
-                    with self.conn:
-                        rows = self.conn.execute(
-                            """
-                        SELECT 
-                            m.*,
-                            n.user_name AS sender
-                        FROM {} AS m
-                        LEFT JOIN Name2Id AS n ON m.real_sender_id = n.rowid
-                        WHERE local_id > ?;
-                        """.format(table),
-                            (max_local_id,),
-                        ).fetchall()
-                        for row in rows:
-                            event = self.get_event(table, row)
-                            logger.debug(event)
-                            if event:
-                                msg_table_max_local_id[table] = event["id"]
-                                self.event_emitter.emit(f"0", self, event)
-                                self.event_emitter.emit(f"{event['type']}", self, event)
-
-                last_mtime = mtime
-
-            time.sleep(period)
-
-    def __str__(self) -> str:
-        return f"<WeChatDB pid={repr(self.pid)} wxid={repr(self.wxid)} msg_db={repr(self.msg_db)}>"
+        # 第一次 poll 总是查询，避免漏掉 start 期间写入的消息
+        self.last_mtime = None
+
+    def poll(self) -> int:
+        """返回主消息库的消息数。撤回记录与公众号消息按各自数据库的变化读取，
+        只计入 metrics，不计入返回值：record_poll 的检测延迟按主消息库的修改时间计算，
+        自适应间隔也只跟随普通消息"""
+        count = self.poll_messages()
+        metrics.incr("revokes_polled", self.poll_revokes())
+        if self.listen_biz:
+            metrics.incr("biz_polled", self.poll_biz())
+        return count
+
+    def poll_messages(self) -> int:
+        if not self.check_changed():
+            return 0
+
+        if self.listen_mode == "session":
+            tables = self.get_changed_tables()
+        else:
+            self.update_msg_tables()
+            tables = list(self.msg_table_max_local_id)
+
+        count = 0
+        for table in tables:
+            limit = self.get_poll_limit(count)
+            if limit == 0:
+                if self.listen_mode == "session":
+                    self.pending_tables[table] = self.session_retries
+                continue
+            table_count = self.poll_table(table, limit)
+            if self.listen_mode == "session":
+                self.update_pending_table(table, table_count != limit)
+            count += table_count
+
+        self.mark_polled(count)
+        return count
+
+    def poll_table(self, table: str, limit: int, biz_db: Optional[str] = None) -> int:
+        """biz_db 为公众号消息库时读取该库中的表"""
+        biz = biz_db is not None
+        if biz:
+            conn, max_local_id = (
+                self.get_connection(biz_db),
+                self.biz_max_local_id[biz_db],
+            )
+        else:
+            conn, max_local_id = self.conn, self.msg_table_max_local_id
+        count = 0
+        cursor = conn.execute(
+            """
+            SELECT 
+                m.*,
+                n.user_name AS sender
+            FROM {} AS m
+            LEFT JOIN Name2Id AS n ON m.real_sender_id = n.rowid
+            WHERE local_id > ?
+            ORDER BY local_id
+            LIMIT ?;
+            """.format(table),
+            (max_local_id[table], limit),
+        )
+        for event in self.iter_events(cursor, table, biz):
+            logger.debug(event)
+            max_local_id[table] = event["id"]
+            if biz:
+                # 由 EventRouter 提交到公众号消息的执行器
+                self.emit(event)
+            else:
+                revoke = self.track_revoke(event)
+                self.emit(event)
+                if revoke is not None:
+                    self.emit_revoke(revoke)
+            count += 1
+        return count
+
+    def start_revokes(self) -> None:
+        """载入撤回时限内的消息到环形缓冲，并记录 revokemessage 的当前位置"""
+        self.recent_messages = LRUCache(self.revoke_buffer_size)
+        # 已分发撤回事件的 server_id，同一条撤回同时出现在撤回提示与撤回记录中时只分发一次
+        self.revoked_ids = LRUCache(self.revoke_buffer_size)
+        cutoff = int(time.time() - self.revoke_window)
+        tables = self.msg_table_max_local_id
+        if self.listen_mode == "session":
+            # 快照按 sort_timestamp 从新到旧，撤回时限内没有消息的会话不必查询
+            tables = [
+                table
+                for table in (
+                    self.get_msg_table(username)
+                    for username, _ in itertools.takewhile(
+                        lambda item: (item[1][0] or 0) >= cutoff,
+                        self.session_snapshot.items(),
+                    )
+                )
+                if table in self.msg_table_max_local_id
+            ]
+        sort_seq = cutoff * 1000
+        for table in tables:
+            with self.conn:
+                rows = self.conn.execute(
+                    """
+                    SELECT
+                        m.*,
+                        n.user_name AS sender
+                    FROM {} AS m
+                    LEFT JOIN Name2Id AS n ON m.real_sender_id = n.rowid
+                    WHERE m.sort_seq >= ?
+                    ORDER BY m.local_id;
+                    """.format(table),
+                    (sort_seq,),
+                ).fetchall()
+            for event in self.get_events(rows, table):
+                if event and event["msg_id"]:
+                    self.recent_messages.set(event["msg_id"], event)
+
+        self.revoke_time = 0
+        self.revoke_seen = set()
+        self.revoke_mtime = None
+        if self.get_revoke_db_mtime() is not None:
+            conn = self.get_connection(REVOKE_DB)
+            with conn:
+                row = conn.execute(
+                    "SELECT MAX(revoke_time) FROM revokemessage;"
+                ).fetchone()
+                self.revoke_time = row[0] or 0
+                self.revoke_seen = {
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT svr_id FROM revokemessage WHERE revoke_time = ?;",
+                        (self.revoke_time,),
+                    )
+                }
+
+    def get_revoke_msg_id(self, event: Dict) -> Optional[int]:
+        """撤回提示（SYSTEM_MESSAGE 中的 <revokemsg>）对应的原消息 server_id"""
+        if event["type"] != SYSTEM_MESSAGE:
+            return None
+        msg = event["msg"]
+        if isinstance(msg, str):
+            # 群聊中的系统消息可能带有 "wxid:\n" 前缀
+            if "<revokemsg>" not in msg:
+                return None
+            try:
+                msg = parse_xml(msg[msg.find("<") :])
+            except Exception:
+                return None
+        try:
+            return int((msg or {})["sysmsg"]["revokemsg"]["newmsgid"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def track_revoke(self, event: Dict) -> Optional[Dict]:
+        """把消息放入环形缓冲；撤回提示则从缓冲中取出原消息，返回撤回事件参数"""
+        msg_id = self.get_revoke_msg_id(event)
+        if msg_id is None:
+            if event["msg_id"]:
+                self.recent_messages.set(event["msg_id"], event)
+            return None
+        revoked_message = self.recent_messages.get(msg_id) or self.revoke_index.get(
+            msg_id
+        )
+        event["revoked_message"] = revoked_message
+        if msg_id in self.revoked_ids:
+            return None
+        self.revoked_ids.set(msg_id, True)
+        return self.get_revoke(
+            msg_id,
+            event["talker"] or event["room_wxid"] or event["to_wxid"],
+            event["create_time"],
+            event["is_sender"],
+            revoked_message,
+            event,
+        )
+
+    def get_revoke_db_mtime(self) -> Optional[float]:
+        path = self.get_db_path(REVOKE_DB)
+        if not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        if os.path.exists(f"{path}-wal"):
+            mtime = max(mtime, os.path.getmtime(f"{path}-wal"))
+        return mtime
+
+    def poll_revokes(self) -> int:
+        """message_revoke.db 变化时读取 revoke_time 不早于上次最大值的撤回记录"""
+        mtime = self.get_revoke_db_mtime()
+        if mtime is None or mtime == self.revoke_mtime:
+            return 0
+        conn = self.get_connection(REVOKE_DB)
+        with conn:
+            rows = conn.execute(
+                """
+                SELECT
+                    svr_id,
+                    to_user_name,
+                    revoke_time,
+                    content
+                FROM revokemessage
+                WHERE revoke_time >= ?
+                ORDER BY revoke_time;
+                """,
+                (self.revoke_time,),
+            ).fetchall()
+        self.revoke_mtime = mtime
+
+        count = 0
+        for svr_id, to_user_name, revoke_time, content in rows:
+            if revoke_time == self.revoke_time and svr_id in self.revoke_seen:
+                continue
+            if revoke_time > self.revoke_time:
+                self.revoke_time = revoke_time
+                self.revoke_seen = set()
+            self.revoke_seen.add(svr_id)
+            if svr_id in self.revoked_ids:
+                continue
+            self.revoked_ids.set(svr_id, True)
+            revoked_message = self.recent_messages.get(svr_id) or self.revoke_index.get(
+                svr_id
+            )
+            self.emit_revoke(
+                self.get_revoke(
+                    svr_id,
+                    to_user_name,
+                    revoke_time,
+                    1,
+                    revoked_message,
+                    content=content,
+                )
+            )
+            count += 1
+        return count
+
+    def start_biz(self) -> None:
+        """监听所有公众号消息库，已有的消息不分发"""
+        self.biz_max_local_id = {}
+        self.biz_mtimes = {}
+        self.biz_dir_mtime = None
+        self.biz_next_poll = 0.0
+        if not self.listen_biz:
+            return
+        for db_name in self.get_biz_msg_dbs():
+            conn = self.get_connection(db_name)
+            max_local_id = self.biz_max_local_id[db_name] = {}
+            for table in self.get_biz_msg_tables(db_name):
+                with conn:
+                    row = conn.execute(f"SELECT MAX(local_id) FROM {table};").fetchone()
+                max_local_id[table] = row[0] or 0
+        self.biz_dir_mtime = os.path.getmtime(self.get_biz_dir())
+        if self.router.biz is None:
+            # 未由 Supervisor 等传入执行器时使用自己的线程池
+            self.biz_pool = ThreadPoolExecutor(self.biz_workers)
+            self.router.biz = AccountExecutor(self.biz_pool, self.biz_max_pending)
+
+    def get_biz_dir(self) -> str:
+        return os.path.join(self.data_dir, "db_storage", "message")
+
+    def update_biz_msg_dbs(self) -> None:
+        """消息目录变化时查找新出现的公众号消息库，其中的消息都是新消息"""
+        mtime = os.path.getmtime(self.get_biz_dir())
+        if mtime == self.biz_dir_mtime:
+            return
+        self.biz_dir_mtime = mtime
+        for db_name in self.get_biz_msg_dbs():
+            self.biz_max_local_id.setdefault(db_name, {})
+
+    def get_biz_db_mtime(self, db_name: str) -> float:
+        path = self.get_db_path(db_name)
+        mtime = os.path.getmtime(path)
+        if os.path.exists(f"{path}-wal"):
+            mtime = max(mtime, os.path.getmtime(f"{path}-wal"))
+        return mtime
+
+    def poll_biz(self) -> int:
+        """每 biz_interval 秒检查一次公众号消息库，单次最多读取 biz_poll_limit 条；
+        分发队列积压时跳过，还有未读完的消息时下次 poll 继续"""
+        now = time.monotonic()
+        if now < self.biz_next_poll:
+            return 0
+        self.biz_next_poll = now + self.biz_interval
+        executor = self.router.biz
+        # 分发队列按处理任务计数，每条消息最多提交 per_event 个任务，换算成消息数后再与行数比较
+        per_event = self.get_handlers_per_event()
+        pending = -(-executor.pending // per_event)
+        if self.biz_pool is not None:
+            max_pending = self.biz_max_pending
+        else:
+            # 由 Supervisor 传入的执行器按其任务上限换算
+            max_pending = executor.max_pending // per_event
+        limit = min(self.biz_poll_limit, max_pending - pending)
+        if limit <= 0:
+            return 0
+
+        self.update_biz_msg_dbs()
+        count = 0
+        for db_name, max_local_id in list(self.biz_max_local_id.items()):
+            if count >= limit:
+                break
+            mtime = self.get_biz_db_mtime(db_name)
+            if mtime == self.biz_mtimes.get(db_name):
+                continue
+            for table in self.get_biz_msg_tables(db_name):
+                max_local_id.setdefault(table, 0)
+            for table in list(max_local_id):
+                if count >= limit:
+                    break
+                count += self.poll_table(table, limit - count, db_name)
+            # 达到上限时保留该库的 mtime，下次继续读取剩余消息
+            if count < limit:
+                self.biz_mtimes[db_name] = mtime
+        if count >= limit:
+            self.biz_next_poll = now
+        return count
+
+    def close(self) -> None:
+        if self.biz_pool is not None:
+            self.biz_pool.shutdown(wait=False)
+        super().close()
 
 
 if __name__ == "__main__":
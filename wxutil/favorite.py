@@ -0,0 +1,96 @@
+"""
+Description: 收藏（4.x db_storage/favorite/favorite.db）。fav_db_item.content 为收藏的 XML，
+在访问时才解析；搜索使用 favorite_fts.db 中微信自带的全文索引 fav_fts_v1。
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from wxutil.hardlink import FILE, IMAGE, VIDEO
+from wxutil.utils import parse_xml
+
+FAVORITE_DB = os.path.join("db_storage", "favorite", "favorite.db")
+FAVORITE_FTS_DB = os.path.join("db_storage", "favorite", "favorite_fts.db")
+FAVORITE_FTS_TABLE = "fav_fts_v1"
+
+FAVORITE_COLUMNS = (
+    "local_id, server_id, type, update_time, content, fromusr, realchatname"
+)
+
+# dataitem 的 datatype 对应的附件类型
+DATA_TYPE_KINDS = {"2": IMAGE, "4": VIDEO, "8": FILE}
+
+
+class FavoriteItem:
+    """一条收藏，xml 在首次访问时解析"""
+
+    __slots__ = (
+        "local_id",
+        "server_id",
+        "type",
+        "update_time",
+        "content",
+        "from_wxid",
+        "talker",
+        "_xml",
+    )
+
+    def __init__(self, row: Tuple) -> None:
+        (
+            self.local_id,
+            self.server_id,
+            self.type,
+            self.update_time,
+            self.content,
+            self.from_wxid,
+            self.talker,
+        ) = row
+        self._xml = None
+
+    @property
+    def xml(self) -> Optional[Dict[str, Any]]:
+        if self._xml is None and self.content:
+            try:
+                self._xml = parse_xml(self.content)
+            except Exception:
+                self._xml = {}
+        return self._xml
+
+    @property
+    def data_items(self) -> List[Dict[str, Any]]:
+        """datalist 中的各项（笔记、合并转发等包含多项）"""
+        data_list = ((self.xml or {}).get("favitem") or {}).get("datalist") or {}
+        items = data_list.get("dataitem") or []
+        return items if isinstance(items, list) else [items]
+
+    @property
+    def title(self) -> Optional[str]:
+        favitem = (self.xml or {}).get("favitem") or {}
+        for item in [favitem, *self.data_items]:
+            title = item.get("title") or item.get("datatitle") or item.get("datadesc")
+            if title:
+                return title
+        return None
+
+    def get_media(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """包含附件的项：(附件类型, dataitem)"""
+        return [
+            (DATA_TYPE_KINDS[item.get("@datatype")], item)
+            for item in self.data_items
+            if item.get("@datatype") in DATA_TYPE_KINDS and item.get("fullmd5")
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "local_id": self.local_id,
+            "server_id": self.server_id,
+            "type": self.type,
+            "update_time": self.update_time,
+            "from_wxid": self.from_wxid,
+            "talker": self.talker,
+            "title": self.title,
+            "xml": self.xml,
+        }
+
+    def __repr__(self) -> str:
+        return f"FavoriteItem(local_id={self.local_id}, type={self.type})"
@@ -0,0 +1,178 @@
+"""
+Description: 附件路径索引。微信在 hardlink 数据库中记录每个图片、视频、文件的 md5、
+文件名与所在目录，这里把它们载入内存，按 md5 直接得到附件路径，不需要遍历附件目录。
+
+md5 以 16 字节保存，目录名在同一个数据库内只保存一份；之后只读取 modify_time
+不早于上次最大值的行。
+"""
+
+import os
+import threading
+from typing import Any, Callable, List, Optional
+
+IMAGE = "image"
+VIDEO = "video"
+FILE = "file"
+
+
+class HardlinkSource:
+    """一张 hardlink 表：entries_sql 返回 (md5, file_name, dir1, dir2, modify_time)，
+    以 modify_time >= ? 过滤；dirs_sql 返回 (目录 id, 目录名)"""
+
+    def __init__(
+        self, kind: str, db_name: str, entries_sql: str, dirs_sql: str, template: str
+    ) -> None:
+        self.kind = kind
+        self.db_name = db_name
+        self.entries_sql = entries_sql
+        self.dirs_sql = dirs_sql
+        self.template = template
+
+
+def v4_sources() -> List[HardlinkSource]:
+    db_name = os.path.join("db_storage", "hardlink", "hardlink.db")
+    templates = {
+        IMAGE: os.path.join("msg", "attach", "{dir1}", "{dir2}", "Img", "{file_name}"),
+        VIDEO: os.path.join("msg", "video", "{dir1}", "{file_name}"),
+        FILE: os.path.join("msg", "file", "{dir1}", "{file_name}"),
+    }
+    return [
+        HardlinkSource(
+            kind,
+            db_name,
+            f"SELECT md5, file_name, dir1, dir2, modify_time FROM {kind}_hardlink_info_v3 WHERE modify_time >= ?;",
+            "SELECT rowid, username FROM dir2id;",
+            template,
+        )
+        for kind, template in templates.items()
+    ]
+
+
+def v3_sources() -> List[HardlinkSource]:
+    templates = {
+        IMAGE: os.path.join(
+            "FileStorage", "MsgAttach", "{dir1}", "Image", "{dir2}", "{file_name}"
+        ),
+        VIDEO: os.path.join("FileStorage", "Video", "{dir2}", "{file_name}"),
+        FILE: os.path.join("FileStorage", "File", "{dir2}", "{file_name}"),
+    }
+    return [
+        HardlinkSource(
+            kind,
+            f"Msg/HardLink{kind.capitalize()}.db",
+            f"SELECT MD5, FileName, DirID1, DirID2, ModifyTime FROM HardLink{kind.capitalize()}Attribute WHERE ModifyTime >= ?;",
+            f"SELECT DirID, Dir FROM HardLink{kind.capitalize()}ID;",
+            template,
+        )
+        for kind, template in templates.items()
+    ]
+
+
+def to_md5_bytes(md5: Any) -> Optional[bytes]:
+    """3.x 的 MD5 列为 16 字节 BLOB，4.x 为十六进制字符串"""
+    if isinstance(md5, (bytes, bytearray)) and len(md5) == 16:
+        return bytes(md5)
+    try:
+        return bytes.fromhex(md5 if isinstance(md5, str) else bytes(md5).decode())
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+class HardlinkIndex:
+    def __init__(
+        self,
+        data_dir: str,
+        sources: List[HardlinkSource],
+        get_connection: Callable[[str], Any],
+    ) -> None:
+        self.data_dir = data_dir
+        self.sources = sources
+        self.get_connection = get_connection
+        # kind -> {md5: (source, dir1, dir2, file_name)}
+        self.entries = {source.kind: {} for source in sources}
+        # db_name -> {目录 id: 目录名}
+        self.dirs = {}
+        self.modify_times = {}
+        self.mtimes = {}
+        self.lock = threading.Lock()
+
+    def get_db_mtime(self, db_name: str) -> Optional[float]:
+        path = os.path.join(self.data_dir, db_name)
+        if not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        if os.path.exists(f"{path}-wal"):
+            mtime = max(mtime, os.path.getmtime(f"{path}-wal"))
+        return mtime
+
+    def refresh(self) -> int:
+        """读取上次刷新后新增或修改的行，数据库文件没有变化时跳过，返回读取的行数"""
+        count = 0
+        with self.lock:
+            changed = {}
+            for source in self.sources:
+                if source.db_name not in changed:
+                    mtime = self.get_db_mtime(source.db_name)
+                    changed[source.db_name] = (
+                        mtime is not None and mtime != self.mtimes.get(source.db_name)
+                    )
+                    if changed[source.db_name]:
+                        self.mtimes[source.db_name] = mtime
+                        self.load_dirs(source)
+                if changed[source.db_name]:
+                    count += self.load_entries(source)
+        return count
+
+    def load_dirs(self, source: HardlinkSource) -> None:
+        conn = self.get_connection(source.db_name)
+        with conn:
+            self.dirs[source.db_name] = dict(conn.execute(source.dirs_sql))
+
+    def load_entries(self, source: HardlinkSource) -> int:
+        entries = self.entries[source.kind]
+        key = (source.db_name, source.kind)
+        modify_time = self.modify_times.get(key, 0)
+        count = 0
+        conn = self.get_connection(source.db_name)
+        with conn:
+            try:
+                cursor = conn.execute(source.entries_sql, (modify_time,))
+            except Exception:
+                # 还没有产生过该类附件时没有对应的表
+                return 0
+            for md5, file_name, dir1, dir2, row_modify_time in cursor:
+                md5 = to_md5_bytes(md5)
+                if md5 is None:
+                    continue
+                entries[md5] = (source, dir1, dir2, file_name)
+                if row_modify_time and row_modify_time > modify_time:
+                    modify_time = row_modify_time
+                count += 1
+        self.modify_times[key] = modify_time
+        return count
+
+    def lookup(self, md5: bytes, kind: str) -> Optional[str]:
+        entry = self.entries.get(kind, {}).get(md5)
+        if entry is None:
+            return None
+        source, dir1, dir2, file_name = entry
+        dirs = self.dirs.get(source.db_name, {})
+        return os.path.join(
+            self.data_dir,
+            source.template.format(
+                dir1=dirs.get(dir1, ""), dir2=dirs.get(dir2, ""), file_name=file_name
+            ),
+        )
+
+    def get(self, md5: Optional[str], kind: str = IMAGE) -> Optional[str]:
+        """md5（十六进制）对应的附件路径；没有找到时刷新一次再查"""
+        md5 = to_md5_bytes(md5) if md5 else None
+        if md5 is None:
+            return None
+        path = self.lookup(md5, kind)
+        if path is None and self.refresh():
+            path = self.lookup(md5, kind)
+        return path
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.entries.values())
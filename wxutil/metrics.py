@@ -0,0 +1,226 @@
+"""
+Description: 运行指标。记录各阶段耗时直方图、计数器与消息延迟（当前时间 - create_time），
+通过导出器定期输出（Prometheus 文本文件或回调函数）。
+
+   from wxutil.metrics import metrics, PrometheusTextExporter
+
+   metrics.enable(PrometheusTextExporter("/var/lib/node_exporter/wxutil.prom"))
+   metrics.enable(print, interval=5)
+
+默认关闭，关闭时每个埋点只多一次布尔判断。
+"""
+
+import functools
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# 单位：秒
+STAGE_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = STAGE_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = []
+        total = 0
+        for le, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative.append((le, total))
+        return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+
+class Timer:
+    """with metrics.timer("sql"): ..."""
+
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics: "Metrics", stage: str) -> None:
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self.metrics.enabled:
+            self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.exporters = []
+        self.interval = 10.0
+        self.last_export = 0.0
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(
+        self, exporter: Optional[Callable[[Dict], Any]] = None, interval: float = 10.0
+    ) -> None:
+        """开启统计；exporter 接收 snapshot()，在 run 循环中每 interval 秒调用一次"""
+        if exporter is not None:
+            self.exporters.append(exporter)
+        self.interval = interval
+        self.last_export = time.monotonic()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+        self.exporters.clear()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters = {}
+            self.stages = {}
+            self.lag = Histogram(LAG_BUCKETS)
+
+    def incr(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, stage: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_lag(self, create_time: Optional[float]) -> None:
+        if not self.enabled or not create_time:
+            return
+        with self.lock:
+            self.lag.observe(max(time.time() - create_time, 0.0))
+
+    def timer(self, stage: str) -> Timer:
+        return Timer(self, stage)
+
+    def timed(self, stage: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(stage, time.perf_counter() - start)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "stages": {
+                    stage: histogram.snapshot()
+                    for stage, histogram in self.stages.items()
+                },
+                "event_lag": self.lag.snapshot(),
+            }
+
+    def export(self) -> None:
+        snapshot = self.snapshot()
+        for exporter in list(self.exporters):
+            exporter(snapshot)
+
+    def maybe_export(self) -> None:
+        if not self.enabled or not self.exporters:
+            return
+        now = time.monotonic()
+        if now - self.last_export >= self.interval:
+            self.last_export = now
+            self.export()
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshot: Dict[str, Any], prefix: str = "wxutil") -> str:
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {format_value(value)}")
+
+    def histogram_lines(name: str, data: Dict, labels: str = "") -> List[str]:
+        sep = "," if labels else ""
+        result = [
+            f'{name}_bucket{{{labels}{sep}le="{format_value(le)}"}} {count}'
+            for le, count in data["buckets"]
+        ]
+        braces = f"{{{labels}}}" if labels else ""
+        result.append(f"{name}_sum{braces} {format_value(data['sum'])}")
+        result.append(f"{name}_count{braces} {data['count']}")
+        return result
+
+    if snapshot["stages"]:
+        lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+        for stage, data in sorted(snapshot["stages"].items()):
+            lines.extend(
+                histogram_lines(f"{prefix}_stage_seconds", data, f'stage="{stage}"')
+            )
+    lines.append(f"# TYPE {prefix}_event_lag_seconds histogram")
+    lines.extend(histogram_lines(f"{prefix}_event_lag_seconds", snapshot["event_lag"]))
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusTextExporter:
+    """写入 node_exporter textfile collector 可读取的 .prom 文件（先写临时文件再替换）"""
+
+    def __init__(self, path: str, prefix: str = "wxutil") -> None:
+        self.path = path
+        self.prefix = prefix
+
+    def __call__(self, snapshot: Dict[str, Any]) -> None:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(render_prometheus(snapshot, self.prefix))
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+metrics = Metrics()
+timed = metrics.timed
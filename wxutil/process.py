@@ -0,0 +1,748 @@
+import ctypes
+import os
+import pathlib
+import re
+import subprocess
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from ctypes import wintypes
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from wxutil.utils import (
+    KeyVerifier,
+    sort_template_files_by_date,
+    to_wechat_v3_version,
+    to_wechat_v4_version,
+)
+
+# 本模块为 Windows 专用：winreg、pymem、psutil 与 kernel32 均在首次调用时才加载，
+# 以便在其他平台上也能导入 wxutil 的解密与解析功能。
+
+void_p = ctypes.c_void_p
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+wechat_dump_rs = os.path.join(BASE_DIR, "tools", "wechat-dump-rs.exe")
+
+
+def get_wechat_install_path(version: int = 3) -> str:
+    if version == 3:
+        reg_path = r"Software\Tencent\WeChat"
+    elif version == 4:
+        reg_path = r"Software\Tencent\Weixin"
+    else:
+        raise ValueError(f"Not support WeChat version: {version}")
+
+    import winreg
+
+    for KEY in [winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE]:
+        try:
+            key = winreg.OpenKey(KEY, reg_path)
+            install_path, _ = winreg.QueryValueEx(key, "InstallPath")
+            winreg.CloseKey(key)
+            return install_path
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            raise e
+
+
+def get_wechat_version(version: int = 3) -> str:
+    if version == 3:
+        reg_path = r"Software\Tencent\WeChat"
+        to_wechat_version = to_wechat_v3_version
+    elif version == 4:
+        reg_path = r"Software\Tencent\Weixin"
+        to_wechat_version = to_wechat_v4_version
+    else:
+        raise ValueError(f"Not support WeChat version: {version}")
+
+    import winreg
+
+    for KEY in [winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE]:
+        try:
+            key = winreg.OpenKey(KEY, reg_path)
+            version, _ = winreg.QueryValueEx(key, "Version")
+            winreg.CloseKey(key)
+            return to_wechat_version(version)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            raise e
+
+
+def wechat_dump(options: Dict) -> subprocess.CompletedProcess:
+    cmd_args = []
+    for k, v in options.items():
+        if v is not None:
+            cmd_args.append(k)
+            cmd_args.append(v)
+    return subprocess.run([wechat_dump_rs, *cmd_args], capture_output=True)
+
+
+def get_wx_info(version: str = "v3", pid: int = None) -> Dict:
+    if version == "v3":
+        result = wechat_dump({"-p": pid, "--vv": "3"})
+    elif version == "v4":
+        result = wechat_dump({"-p": pid, "--vv": "4"})
+    else:
+        raise ValueError(f"Not support version: {version}")
+
+    stdout = result.stdout.decode()
+    if not stdout:
+        raise Exception("Please login wechat.")
+    else:
+        stderr = result.stderr.decode()
+        if "panicked" in stderr:
+            raise Exception(stderr)
+
+        pid = int(re.findall("ProcessId: (.*?)\n", stdout)[0])
+        version = re.findall("WechatVersion: (.*?)\n", stdout)[0]
+        account = re.findall("AccountName: (.*?)\n", stdout)[0]
+        data_dir = re.findall("DataDir: (.*?)\n", stdout)[0]
+        key = re.findall("key: (.*?)\n", stdout)[0]
+        return {
+            "pid": pid,
+            "version": version,
+            "account": account,
+            "data_dir": data_dir,
+            "key": key,
+        }
+
+
+def get_exe_bit(file_path: str) -> int:
+    with open(file_path, "rb") as f:
+        if f.read(2) != b"MZ":
+            return 64
+
+        f.seek(60)
+        pe_offset = int.from_bytes(f.read(4), "little")
+        f.seek(pe_offset + 4)
+        machine = int.from_bytes(f.read(2), "little")
+        return 32 if machine == 0x14C else 64 if machine == 0x8664 else 64
+
+
+def pattern_scan_all(
+    handle: int, pattern: bytes, *, return_multiple: bool = False, find_num: int = 100
+) -> Union[int, List[int]]:
+    import pymem
+
+    next_region = 0
+    found = []
+    user_space_limit = 0x7FFFFFFF0000 if sys.maxsize > 2**32 else 0x7FFF0000
+    while next_region < user_space_limit:
+        try:
+            next_region, page_found = pymem.pattern.scan_pattern_page(
+                handle, next_region, pattern, return_multiple=return_multiple
+            )
+        except Exception:
+            break
+
+        if not return_multiple and page_found:
+            return page_found
+
+        if page_found:
+            found += page_found
+
+        if len(found) > find_num:
+            break
+
+    return found
+
+
+def get_info_wxid(h_process: int) -> Union[str, None]:
+    addrs = pattern_scan_all(
+        h_process, rb"\\Msg\\FTSContact", return_multiple=True, find_num=100
+    )
+    wxids = []
+    for addr in addrs:
+        array = ctypes.create_string_buffer(80)
+        if (
+            ctypes.windll.kernel32.ReadProcessMemory(
+                h_process, void_p(addr - 30), array, 80, 0
+            )
+            == 0
+        ):
+            return None
+        raw = bytes(array).split(b"\\Msg")[0].split(b"\\")[-1]
+        wxids.append(raw.decode("utf-8", errors="ignore"))
+
+    return max(wxids, key=wxids.count) if wxids else None
+
+
+def get_info_file_path_base_wxid(h_process: int, wxid: str) -> Union[str, None]:
+    addrs = pattern_scan_all(
+        h_process,
+        wxid.encode() + rb"\\Msg\\FTSContact",
+        return_multiple=True,
+        find_num=10,
+    )
+    file_paths = []
+    for addr in addrs:
+        buffer_len = 260
+        array = ctypes.create_string_buffer(buffer_len)
+        if (
+            ctypes.windll.kernel32.ReadProcessMemory(
+                h_process, void_p(addr - buffer_len + 50), array, buffer_len, 0
+            )
+            == 0
+        ):
+            return None
+        raw = bytes(array).split(b"\\Msg")[0].split(b"\00")[-1]
+        file_paths.append(raw.decode("utf-8", errors="ignore"))
+
+    return max(file_paths, key=file_paths.count) if file_paths else None
+
+
+def get_info_file_path(wxid: str = "all") -> Union[str, None]:
+    if not wxid:
+        return None
+
+    import winreg
+
+    is_w_dir = False
+
+    try:
+        key = winreg.OpenKey(
+            winreg.HKEY_CURRENT_USER, r"Software\Tencent\WeChat", 0, winreg.KEY_READ
+        )
+        value, _ = winreg.QueryValueEx(key, "FileSavePath")
+        winreg.CloseKey(key)
+        w_dir = value
+        is_w_dir = True
+    except Exception:
+        w_dir = "MyDocument:"
+
+    if not is_w_dir:
+        try:
+            user_profile = os.environ.get("USERPROFILE")
+            path_3ebffe94 = os.path.join(
+                user_profile,
+                "AppData",
+                "Roaming",
+                "Tencent",
+                "WeChat",
+                "All Users",
+                "config",
+                "3ebffe94.ini",
+            )
+            with open(path_3ebffe94, "r", encoding="utf-8") as f:
+                w_dir = f.read()
+
+        except Exception:
+            w_dir = "MyDocument:"
+
+    if w_dir == "MyDocument:":
+        try:
+            key = winreg.OpenKey(
+                winreg.HKEY_CURRENT_USER,
+                r"Software\Microsoft\Windows\CurrentVersion\Explorer\User Shell Folders",
+            )
+            documents_path = winreg.QueryValueEx(key, "Personal")[0]
+            winreg.CloseKey(key)
+            documents_paths = os.path.split(documents_path)
+            if "%" in documents_paths[0]:
+                w_dir = os.environ.get(documents_paths[0].replace("%", ""))
+                w_dir = os.path.join(w_dir, os.path.join(*documents_paths[1:]))
+            else:
+                w_dir = documents_path
+        except Exception:
+            profile = os.environ.get("USERPROFILE")
+            w_dir = os.path.join(profile, "Documents")
+
+    msg_dir = os.path.join(w_dir, "WeChat Files")
+
+    if wxid == "all" and os.path.exists(msg_dir):
+        return msg_dir
+
+    filePath = os.path.join(msg_dir, wxid)
+    return filePath if os.path.exists(filePath) else None
+
+
+def get_key(pid: int, db_path: str, addr_len: int) -> Union[str, None]:
+    def read_key_addrs(h_process: int, address: int, address_len: int = 8) -> List[int]:
+        # 一次性读取 type 字符串之前 2000 字节，解析出其中的指针
+        addrs = list(range(address, address - 2000, -address_len))
+        start = addrs[-1]
+        size = address - start + address_len
+        array = ctypes.create_string_buffer(size)
+        if (
+            ctypes.windll.kernel32.ReadProcessMemory(
+                h_process, void_p(start), array, size, 0
+            )
+            == 0
+        ):
+            # 窗口跨过不可读的页时整块读取会失败，逐个读取指针并跳过读不到的地址
+            return read_key_addrs_each(h_process, addrs, address_len)
+        raw = bytes(array)
+        return [
+            int.from_bytes(raw[i - start : i - start + address_len], "little")
+            for i in addrs
+        ]
+
+    def read_key_addrs_each(
+        h_process: int, addrs: List[int], address_len: int = 8
+    ) -> List[int]:
+        key_addrs = []
+        array = ctypes.create_string_buffer(address_len)
+        for i in addrs:
+            if (
+                ctypes.windll.kernel32.ReadProcessMemory(
+                    h_process, void_p(i), array, address_len, 0
+                )
+                != 0
+            ):
+                key_addrs.append(int.from_bytes(array.raw, "little"))
+        return key_addrs
+
+    def read_key_bytes(h_process: int, key_addr: int) -> Union[bytes, None]:
+        key_buf = ctypes.create_string_buffer(32)
+        if (
+            ctypes.windll.kernel32.ReadProcessMemory(
+                h_process, void_p(key_addr), key_buf, 32, 0
+            )
+            == 0
+        ):
+            return None
+        return bytes(key_buf)
+
+    import pymem
+
+    micro_msg_path = os.path.join(db_path, "MSG", "MicroMsg.db")
+    pm = pymem.Pymem(pid)
+    module_name = "WeChatWin.dll"
+
+    type_patterns = ["iphone\x00", "android\x00", "ipad\x00"]
+    type_addrs = []
+
+    for type_pattern in type_patterns:
+        addrs = pm.pattern_scan_module(
+            type_pattern.encode(), module_name, return_multiple=True
+        )
+        if len(addrs) >= 2:
+            type_addrs.extend(addrs)
+
+    if not type_addrs:
+        return None
+
+    def iter_candidates() -> Iterator[bytes]:
+        # 边读取边校验，找到密钥后不再读取剩余的指针
+        seen = set()
+        for i in sorted(type_addrs, reverse=True):
+            for key_addr in read_key_addrs(pm.process_handle, i, addr_len):
+                if key_addr not in seen:
+                    seen.add(key_addr)
+                    yield read_key_bytes(pm.process_handle, key_addr)
+
+    key_bytes = KeyVerifier(micro_msg_path).find(iter_candidates())
+    return key_bytes.hex() if key_bytes else None
+
+
+def read_info(pid: Optional[int] = None) -> Union[List[Dict[str, str]], None]:
+    import psutil
+
+    process_name = "WeChat.exe"
+    if pid is None:
+        wechat_processes = [
+            p
+            for p in psutil.process_iter(["name", "exe", "pid"])
+            if p.name() == process_name
+        ]
+    else:
+        wechat_processes = [
+            p
+            for p in psutil.process_iter(["name", "exe", "pid"])
+            if p.name() == process_name and p.pid == pid
+        ]
+
+    if not wechat_processes:
+        return None
+
+    result = []
+    for process in wechat_processes:
+        tmp_rd = {}
+        tmp_rd["pid"] = str(process.pid)
+        Handle = ctypes.windll.kernel32.OpenProcess(0x1F0FFF, False, process.pid)
+        addr_len = get_exe_bit(process.exe()) // 8
+        wxid = get_info_wxid(Handle)
+        tmp_rd["wxid"] = wxid
+        file_path = get_info_file_path_base_wxid(Handle, wxid) if wxid != None else None
+        if file_path == None and wxid != None:
+            file_path = get_info_file_path(wxid)
+        tmp_rd["file_path"] = file_path
+        tmp_rd["key"] = (
+            get_key(process.pid, file_path, addr_len) if file_path != None else None
+        )
+        result.append(tmp_rd)
+
+    return result
+
+
+# 定义必要的常量
+PROCESS_ALL_ACCESS = 0x1F0FFF
+PAGE_READWRITE = 0x04
+MEM_COMMIT = 0x1000
+MEM_PRIVATE = 0x20000
+
+# Constants
+IV_SIZE = 16
+HMAC_SHA256_SIZE = 64
+HMAC_SHA512_SIZE = 64
+KEY_SIZE = 32
+AES_BLOCK_SIZE = 16
+ROUND_COUNT = 256000
+PAGE_SIZE = 4096
+SALT_SIZE = 16
+
+finish_flag = False
+
+
+# 定义 MEMORY_BASIC_INFORMATION 结构
+class MEMORY_BASIC_INFORMATION(ctypes.Structure):
+    _fields_ = [
+        ("BaseAddress", ctypes.c_void_p),
+        ("AllocationBase", ctypes.c_void_p),
+        ("AllocationProtect", ctypes.c_ulong),
+        ("RegionSize", ctypes.c_size_t),
+        ("State", ctypes.c_ulong),
+        ("Protect", ctypes.c_ulong),
+        ("Type", ctypes.c_ulong),
+    ]
+
+
+# Windows API Constants
+PROCESS_VM_READ = 0x0010
+PROCESS_QUERY_INFORMATION = 0x0400
+
+
+def open_process(pid: int) -> int:
+    """打开目标进程"""
+    return ctypes.windll.kernel32.OpenProcess(PROCESS_ALL_ACCESS, False, pid)
+
+
+def read_process_memory(
+    process_handle: int, address: int, size: int
+) -> Optional[bytes]:
+    """读取目标进程内存"""
+    buffer = ctypes.create_string_buffer(size)
+    bytes_read = ctypes.c_size_t(0)
+    success = ctypes.windll.kernel32.ReadProcessMemory(
+        process_handle, ctypes.c_void_p(address), buffer, size, ctypes.byref(bytes_read)
+    )
+    if not success:
+        return None
+    return buffer.raw
+
+
+def read_process_memory_into(
+    process_handle: int, address: int, buffer: ctypes.Array, size: int
+) -> int:
+    """读取目标进程内存到已分配的缓冲区，返回实际读取的字节数"""
+    bytes_read = ctypes.c_size_t(0)
+    success = ctypes.windll.kernel32.ReadProcessMemory(
+        process_handle, ctypes.c_void_p(address), buffer, size, ctypes.byref(bytes_read)
+    )
+    if not success:
+        return 0
+    return bytes_read.value
+
+
+def get_memory_regions(process_handle: int) -> List[Tuple[int, int]]:
+    """获取所有内存区域"""
+    regions = []
+    mbi = MEMORY_BASIC_INFORMATION()
+    address = 0
+    while ctypes.windll.kernel32.VirtualQueryEx(
+        process_handle, ctypes.c_void_p(address), ctypes.byref(mbi), ctypes.sizeof(mbi)
+    ):
+        if mbi.State == MEM_COMMIT and mbi.Type == MEM_PRIVATE:
+            regions.append((mbi.BaseAddress, mbi.RegionSize))
+        address += mbi.RegionSize
+    return regions
+
+
+@lru_cache(maxsize=None)
+def get_kernel32() -> Any:
+    """按需加载 kernel32 并声明 OpenProcess/CloseHandle 的签名"""
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    kernel32.CloseHandle.restype = wintypes.BOOL
+    return kernel32
+
+
+@lru_cache
+def verify(encrypted: bytes, key: bytes) -> bool:
+    from Crypto.Cipher import AES
+
+    aes_key = key[:16]
+    cipher = AES.new(aes_key, AES.MODE_ECB)
+    text = cipher.decrypt(encrypted)
+
+    if text.startswith(b"\xff\xd8\xff"):
+        return True
+    else:
+        return False
+
+
+# 图片 AES 密钥在内存中是前后各有一个非 [a-z0-9] 字节的 32 位字符串
+AES_KEY_RULE = r"""
+rule AesKey {
+    strings:
+        $pattern = /[^a-z0-9][a-z0-9]{32}[^a-z0-9]/
+    condition:
+        $pattern
+}
+"""
+
+# 分块读取内存区域，避免一次性为上百 MB 的区域分配缓冲区
+MEMORY_CHUNK_SIZE = 4 * 1024 * 1024
+# 相邻块的重叠字节数，需大于 AesKey 规则的匹配长度（34 字节）
+MEMORY_CHUNK_OVERLAP = 64
+
+_thread_local = threading.local()
+
+
+def get_thread_buffer(size: int) -> ctypes.Array:
+    """获取当前线程复用的读取缓冲区"""
+    buffer = getattr(_thread_local, "buffer", None)
+    if buffer is None or len(buffer) < size:
+        buffer = ctypes.create_string_buffer(size)
+        _thread_local.buffer = buffer
+    return buffer
+
+
+def iter_memory_chunks(
+    read: Callable[[int, int], Optional[bytes]],
+    base_address: int,
+    region_size: int,
+    chunk_size: int = MEMORY_CHUNK_SIZE,
+    overlap: int = MEMORY_CHUNK_OVERLAP,
+    stop_event: Optional[threading.Event] = None,
+) -> Iterator[Tuple[int, bytes]]:
+    """按块遍历内存区域，相邻块保留 overlap 字节重叠，返回 (地址, 数据)。
+    read 可以返回复用缓冲区的 memoryview，数据只在下一次迭代前有效"""
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    offset = 0
+    while offset < region_size:
+        if stop_event is not None and stop_event.is_set():
+            return
+        size = min(chunk_size, region_size - offset)
+        data = read(base_address + offset, size)
+        if data:
+            yield base_address + offset, data
+        if offset + size >= region_size:
+            return
+        offset += chunk_size - overlap
+
+
+def search_memory_chunk(
+    process_handle,
+    base_address,
+    region_size,
+    encrypted,
+    rules,
+    stop_event: Optional[threading.Event] = None,
+    chunk_size: int = MEMORY_CHUNK_SIZE,
+    overlap: int = MEMORY_CHUNK_OVERLAP,
+    read: Optional[Callable[[int, int], Optional[bytes]]] = None,
+):
+    """搜索单个内存块，read(地址, 长度) 默认读取 process_handle 的内存"""
+    if read is None:
+        buffer = get_thread_buffer(min(chunk_size, region_size))
+
+        view = memoryview(buffer).cast("B")
+
+        def read(address: int, size: int) -> Optional[memoryview]:
+            # 直接把缓冲区交给 yara，不再逐块复制为 bytes
+            bytes_read = read_process_memory_into(process_handle, address, buffer, size)
+            return view[:bytes_read] if bytes_read else None
+
+    for _, memory in iter_memory_chunks(
+        read, base_address, region_size, chunk_size, overlap, stop_event
+    ):
+        matches = rules.match(data=memory)
+        for match in matches:
+            if match.rule != "AesKey":
+                continue
+            for string in match.strings:
+                for instance in string.instances:
+                    content = instance.matched_data[1:-1]
+                    if verify(encrypted, content):
+                        if stop_event is not None:
+                            stop_event.set()
+                        return content[:16]
+    return None
+
+
+def get_aes_key(encrypted: bytes, pid: int) -> Any:
+    process_handle = open_process(pid)
+    if not process_handle:
+        return Exception("无法打开进程：{pid}")
+
+    # 编译YARA规则
+    import yara
+
+    rules = yara.compile(source=AES_KEY_RULE)
+
+    # 获取内存区域
+    process_infos = get_memory_regions(process_handle)
+
+    # 创建线程池
+    found_result = threading.Event()
+    result = [None]
+
+    def process_chunk(args):
+        if found_result.is_set():
+            return None
+        base_address, region_size = args
+        res = search_memory_chunk(
+            process_handle, base_address, region_size, encrypted, rules, found_result
+        )
+        if res:
+            result[0] = res
+        return res
+
+    with ThreadPoolExecutor(max_workers=min(32, len(process_infos))) as executor:
+        executor.map(process_chunk, process_infos)
+
+    get_kernel32().CloseHandle(process_handle)
+    return result[0]
+
+
+def dump_wechat_info_v4(encrypted: bytes, pid: int) -> bytes:
+    process_handle = open_process(pid)
+    if not process_handle:
+        raise Exception(f"无法打开微信进程: {pid}")
+
+    result = get_aes_key(encrypted, pid)
+    if isinstance(result, bytes):
+        return result[:16]
+    else:
+        raise Exception("未找到 AES 密钥")
+
+
+def find_key(
+    weixin_dir: pathlib.Path,
+    version: int = 4,
+    xor_key_: Optional[int] = None,
+    aes_key_: Optional[bytes] = None,
+):
+    """
+    遍历目录下文件, 找到至多 16 个 (.*)_t.dat 文件,
+    收集最后两位字节, 选择出现次数最多的两个字节.
+    """
+    assert version in [3, 4]
+
+    # 查找所有 _t.dat 结尾的文件
+    template_files = sort_template_files_by_date(list(weixin_dir.rglob("*_t.dat")))
+
+    if not template_files:
+        raise Exception("未找到模板文件")
+
+    # 收集所有文件最后两个字节
+    last_bytes_list = []
+    for file in template_files[:16]:
+        try:
+            with open(file, "rb") as f:
+                # 读取最后两个字节
+                f.seek(-2, 2)
+                last_bytes = f.read(2)
+                last_bytes_list.append(last_bytes)
+        except Exception as e:
+            continue
+
+    if not last_bytes_list:
+        raise Exception("对于 XOR, 未能成功读取任何模板文件")
+
+    # 使用 Counter 统计最常见的字节组合
+    counter = Counter(last_bytes_list)
+    most_common = counter.most_common(1)[0][0]
+
+    x, y = most_common
+    if (xor_key := x ^ 0xFF) == y ^ 0xD9:
+        pass
+    else:
+        raise Exception("未能找到 XOR 密钥")
+
+    if xor_key_:
+        if xor_key_ == xor_key:
+            return xor_key_, aes_key_
+        else:
+            raise Exception
+
+    if version == 3:
+        return xor_key, b"cfcd208495d565ef"
+
+    for file in template_files:
+        with open(file, "rb") as f:
+            # 检查文件头
+            if f.read(6) != b"\x07\x08V2\x08\x07":
+                continue
+
+            # 检查文件尾
+            f.seek(-2, 2)
+            if f.read(2) != most_common:
+                continue
+
+            # 读取 AES 密钥
+            f.seek(0xF)
+            ciphertext = f.read(16)
+            break
+    else:
+        raise Exception("对于 AES, 未能成功读取任何模板文件")
+
+    import pymem
+
+    try:
+        pm = pymem.Pymem("Weixin.exe")
+        pid = pm.process_id
+        assert isinstance(pid, int)
+    except:
+        raise Exception("找不到微信进程")
+
+    aes_key = dump_wechat_info_v4(ciphertext, pid)
+    return xor_key, aes_key
+
+
+"""
+ Description: 修改微信内存版本, 原理参考: https://blog.csdn.net/Scoful/article/details/139330910
+"""
+WECHAT_VERSION_OFFSET = {
+    "3.6.0.18": [0x22300E0, 0x223D90C, 0x223D9E8, 0x2253E4C, 0x2255AA4, 0x22585D4]
+}
+
+
+def modify_wechat_version(old_version: str, new_version: str) -> None:
+    import pymem
+
+    pm = pymem.Pymem("WeChat.exe")
+    WeChatWinDll = pymem.process.module_from_name(
+        pm.process_handle, "WeChatWin.dll"
+    ).lpBaseOfDll
+    original_version_hex = version_to_hex(old_version)
+    new_version_hex = version_to_hex(new_version)
+
+    for offset in WECHAT_VERSION_OFFSET[old_version]:
+        addr = WeChatWinDll + offset
+        addr_value = pm.read_uint(addr)
+        if addr_value == original_version_hex:
+            pm.write_uint(addr, new_version_hex)
+
+
+def version_to_hex(version: str) -> int:
+    result = "0x6"
+    version_list = version.split(".")
+
+    for i in range(len(version_list)):
+        if i == 0:
+            result += f"{int(version_list[i]):x}"
+            continue
+        result += f"{int(version_list[i]):02x}"
+
+    return int(result, 16)
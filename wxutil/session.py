@@ -0,0 +1,140 @@
+"""
+Description: 会话列表缓存（4.x session.db 的 SessionTable，3.x MicroMsg.db 的 Session）。
+内存中保存每个会话的未读数、摘要与时间，数据库文件变化时重新读取并逐行对比，
+有变化的会话记为新版本；get_sessions(since) 只返回版本号大于 since 的会话。
+
+清除未读与删除会话不会更新 sort_timestamp，因此按整行对比，而不是只按 sort_timestamp 增量读取。
+版本号从创建缓存时的毫秒时间戳开始递增。since 不是本缓存返回过的版本号（如上一个进程的），
+已删除的会话无从得知，此时返回完整列表并标记 full，调用方应替换而不是合并本地列表。
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+SESSION_KEYS = (
+    "username",
+    "unread_count",
+    "summary",
+    "last_timestamp",
+    "sort_timestamp",
+    "last_msg_type",
+)
+
+
+class SessionSource:
+    """sql 按 SESSION_KEYS 的顺序返回全部会话"""
+
+    def __init__(self, db_name: str, sql: str) -> None:
+        self.db_name = db_name
+        self.sql = sql
+
+
+V4_SOURCE = SessionSource(
+    os.path.join("db_storage", "session", "session.db"),
+    "SELECT username, unread_count, summary, last_timestamp, sort_timestamp, last_msg_type FROM SessionTable;",
+)
+
+V3_SOURCE = SessionSource(
+    "Msg/MicroMsg.db",
+    "SELECT strUsrName, nUnReadCount, strContent, nTime, nOrder, nMsgType FROM Session;",
+)
+
+
+class SessionCache:
+    def __init__(
+        self,
+        data_dir: str,
+        source: SessionSource,
+        get_connection: Callable[[str], Any],
+    ) -> None:
+        self.data_dir = data_dir
+        self.source = source
+        self.get_connection = get_connection
+        # username -> (版本号, 会话行)
+        self.sessions = {}
+        # 已删除的会话：username -> 版本号
+        self.deleted = {}
+        self.version = int(time.time() * 1000)
+        # 本缓存的第一个版本号，更早的 since 来自其他缓存
+        self.base_version = self.version
+        self.mtime = None
+        self.lock = threading.Lock()
+
+    def get_db_mtime(self) -> Optional[float]:
+        path = os.path.join(self.data_dir, self.source.db_name)
+        if not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        if os.path.exists(f"{path}-wal"):
+            mtime = max(mtime, os.path.getmtime(f"{path}-wal"))
+        return mtime
+
+    def refresh(self) -> int:
+        """数据库文件变化时重新读取并对比，返回有变化（含删除）的会话数"""
+        mtime = self.get_db_mtime()
+        if mtime is None or mtime == self.mtime:
+            return 0
+        conn = self.get_connection(self.source.db_name)
+        with conn:
+            rows = conn.execute(self.source.sql).fetchall()
+        with self.lock:
+            first = self.mtime is None
+            version = self.version if first else self.version + 1
+            changed = 0
+            usernames = set()
+            for row in rows:
+                row = tuple(row)
+                usernames.add(row[0])
+                entry = self.sessions.get(row[0])
+                if entry is not None and entry[1] == row:
+                    continue
+                self.sessions[row[0]] = (version, row)
+                self.deleted.pop(row[0], None)
+                changed += 1
+            for username in list(self.sessions):
+                if username not in usernames:
+                    del self.sessions[username]
+                    self.deleted[username] = version
+                    changed += 1
+            if changed and not first:
+                self.version = version
+            self.mtime = mtime
+        return changed
+
+    def get_sessions(self, since: Optional[int] = None) -> Dict[str, Any]:
+        """版本号大于 since 的会话（按 sort_timestamp 从新到旧）与已删除的会话；
+        不传 since 或 since 不属于本缓存时返回全部会话，full 为 True。
+        返回的 version 作为下次调用的 since"""
+        self.refresh()
+        with self.lock:
+            full = since is None or not self.base_version <= since <= self.version
+            entries = list(self.sessions.values())
+            sessions = [
+                dict(zip(SESSION_KEYS, row))
+                for version, row in entries
+                if full or version > since
+            ]
+            deleted = (
+                []
+                if full
+                else [
+                    username
+                    for username, version in self.deleted.items()
+                    if version > since
+                ]
+            )
+            unread_count = sum(row[1] or 0 for _, row in entries)
+            version = self.version
+        sessions.sort(key=lambda session: session["sort_timestamp"] or 0, reverse=True)
+        return {
+            "version": version,
+            "full": full,
+            "sessions": sessions,
+            "deleted": deleted,
+            "unread_count": unread_count,
+        }
+
+    def __len__(self) -> int:
+        return len(self.sessions)
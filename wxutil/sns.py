@@ -0,0 +1,191 @@
+"""
+Description: 朋友圈（4.x db_storage/sns/sns.db）。SnsTimeLine 按 tid 降序分页读取，
+content 的 XML 在访问时才解析；SnsMessage_tmp3 为点赞、评论等通知。
+
+tid 是无符号 64 位整数，大于 2^63 的值在 SQLite 中保存为负数，
+这里对外统一使用无符号值，查询时按符号拆成两段分别按主键范围读取。
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from wxutil.utils import parse_xml
+
+SNS_DB = os.path.join("db_storage", "sns", "sns.db")
+
+U64 = 1 << 64
+I64 = 1 << 63
+
+
+def to_signed(tid: int) -> int:
+    return tid - U64 if tid >= I64 else tid
+
+
+def to_unsigned(tid: int) -> int:
+    return tid + U64 if tid < 0 else tid
+
+
+class SnsPost:
+    """一条朋友圈，xml 在首次访问时解析"""
+
+    __slots__ = ("tid", "wxid", "content", "_xml")
+
+    def __init__(self, tid: int, wxid: str, content: Optional[str]) -> None:
+        self.tid = tid
+        self.wxid = wxid
+        self.content = content
+        self._xml = None
+
+    @property
+    def xml(self) -> Optional[Dict[str, Any]]:
+        if self._xml is None and self.content:
+            try:
+                self._xml = parse_xml(self.content)
+            except Exception:
+                self._xml = {}
+        return self._xml
+
+    @property
+    def timeline(self) -> Dict[str, Any]:
+        return (self.xml or {}).get("TimelineObject") or {}
+
+    @property
+    def create_time(self) -> Optional[int]:
+        create_time = self.timeline.get("createTime")
+        return int(create_time) if create_time else None
+
+    @property
+    def text(self) -> Optional[str]:
+        return self.timeline.get("contentDesc")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tid": self.tid,
+            "wxid": self.wxid,
+            "create_time": self.create_time,
+            "text": self.text,
+            "xml": self.xml,
+        }
+
+    def __repr__(self) -> str:
+        return f"SnsPost(tid={self.tid}, wxid={self.wxid!r})"
+
+
+def get_sns_message(row: Tuple) -> Dict[str, Any]:
+    return {
+        "local_id": row[0],
+        "create_time": row[1],
+        "type": row[2],
+        "tid": to_unsigned(row[3]) if row[3] is not None else None,
+        "is_unread": row[4],
+        "from_wxid": row[5],
+        "from_nickname": row[6],
+        "to_wxid": row[7],
+        "to_nickname": row[8],
+        "content": row[9],
+        "comment_id": row[10],
+    }
+
+
+class SnsTimeline:
+    def __init__(
+        self,
+        get_connection: Callable[[str], Any],
+        checkpoint_path: Optional[str] = None,
+    ) -> None:
+        self.get_connection = get_connection
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = {"tid": 0, "local_id": 0}
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r", encoding="utf-8") as f:
+                self.checkpoint.update(json.load(f))
+
+    def iter_posts(
+        self,
+        wxid: Optional[str] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        page_size: int = 100,
+    ) -> Iterator[SnsPost]:
+        """按 tid 降序读取 after < tid < before 的朋友圈，每页按主键范围查询一次"""
+        conn = self.get_connection(SNS_DB)
+        # 无符号 tid 的高半段（保存为负数）排在前面
+        for low, high in ((I64, U64), (0, I64)):
+            if after is not None:
+                low = max(low, after + 1)
+            if before is not None:
+                high = min(high, before)
+            if low >= high:
+                continue
+            signed_low, signed_high = to_signed(low), to_signed(high - 1)
+            while signed_high >= signed_low:
+                sql = "SELECT tid, user_name, content FROM SnsTimeLine WHERE tid BETWEEN ? AND ?"
+                params = [signed_low, signed_high]
+                if wxid is not None:
+                    sql += " AND user_name = ?"
+                    params.append(wxid)
+                params.append(page_size)
+                with conn:
+                    rows = conn.execute(
+                        sql + " ORDER BY tid DESC LIMIT ?;", params
+                    ).fetchall()
+                for tid, user_name, content in rows:
+                    yield SnsPost(to_unsigned(tid), user_name, content)
+                if len(rows) < page_size:
+                    break
+                signed_high = rows[-1][0] - 1
+
+    def iter_messages(
+        self, after: int = 0, page_size: int = 500
+    ) -> Iterator[Dict[str, Any]]:
+        """按 local_id 升序读取 local_id > after 的点赞、评论通知"""
+        conn = self.get_connection(SNS_DB)
+        while True:
+            with conn:
+                rows = conn.execute(
+                    """
+                    SELECT
+                        local_id,
+                        create_time,
+                        type,
+                        feed_id,
+                        is_unread,
+                        from_username,
+                        from_nickname,
+                        to_username,
+                        to_nickname,
+                        content,
+                        comment_id
+                    FROM SnsMessage_tmp3
+                    WHERE local_id > ?
+                    ORDER BY local_id
+                    LIMIT ?;
+                    """,
+                    (after, page_size),
+                ).fetchall()
+            for row in rows:
+                yield get_sns_message(row)
+            if len(rows) < page_size:
+                break
+            after = rows[-1][0]
+
+    def sync(self) -> Tuple[List[SnsPost], List[Dict[str, Any]]]:
+        """读取上次同步后新增的朋友圈与通知，并推进检查点（最大 tid 与 local_id）"""
+        posts = list(self.iter_posts(after=self.checkpoint["tid"] or None))
+        messages = list(self.iter_messages(self.checkpoint["local_id"]))
+        if posts:
+            self.checkpoint["tid"] = max(self.checkpoint["tid"], posts[0].tid)
+        if messages:
+            self.checkpoint["local_id"] = messages[-1]["local_id"]
+        if posts or messages:
+            self.save_checkpoint()
+        return posts, messages
+
+    def save_checkpoint(self) -> None:
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
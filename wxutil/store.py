@@ -0,0 +1,909 @@
+import importlib.util
+import json
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NoReturn,
+    Optional,
+    Tuple,
+)
+
+from pyee.executor import ExecutorEventEmitter
+
+from wxutil.avatar import AvatarCache
+from wxutil.hardlink import HardlinkIndex
+from wxutil.logger import logger
+from wxutil.metrics import metrics
+from wxutil.session import SessionCache
+from wxutil.utils import (
+    CONFIG_FILE,
+    decrypt_file,
+    read_key_from_config,
+    silk_to_wav,
+    store_key,
+)
+
+# 统一事件名：监听该事件可收到与版本无关的标准化消息
+MESSAGE_EVENT = "message"
+# 撤回事件：参数为撤回信息与撤回前的原消息
+REVOKE_EVENT = "revoke"
+
+
+# 连接参数：微信的数据库只读访问即可。值为 None 的项不设置
+DEFAULT_CONNECTION_PROFILE = {
+    # 以 mode=ro 的 URI 打开，并设置 query_only
+    "readonly": True,
+    # 页缓存大小，负数单位为 KiB（64 MiB）
+    "cache_size": -65536,
+    # 内存映射大小，只对已解密的数据库生效，SQLCipher 加密库不支持 mmap。
+    # 已解密副本的扫描以 Python 侧逐行处理为主，mmap 没有可测的收益，默认不设置
+    "mmap_size": None,
+    "temp_store": "MEMORY",
+    # 关闭 SQLCipher 的内存清零，减少每页解密的开销
+    "cipher_memory_security": "OFF",
+}
+
+
+def open_connection(module: Any, path: str, profile: Dict[str, Any]) -> Any:
+    if profile.get("readonly"):
+        uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+        return module.connect(uri, uri=True, check_same_thread=False)
+    return module.connect(path, check_same_thread=False)
+
+
+def apply_connection_profile(
+    conn: Any, profile: Dict[str, Any], encrypted: bool
+) -> None:
+    """在设置密钥之后调用"""
+    if encrypted and profile.get("cipher_memory_security") is not None:
+        conn.execute(
+            f"PRAGMA cipher_memory_security = {profile['cipher_memory_security']};"
+        )
+    if profile.get("cache_size") is not None:
+        conn.execute(f"PRAGMA cache_size = {int(profile['cache_size'])};")
+    if not encrypted and profile.get("mmap_size") is not None:
+        conn.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])};")
+    if profile.get("temp_store") is not None:
+        conn.execute(f"PRAGMA temp_store = {profile['temp_store']};")
+    if profile.get("readonly"):
+        conn.execute("PRAGMA query_only = ON;")
+
+
+def decode_extra_buf(extra_buf_content: bytes):
+    data = {
+        "country": "",
+        "province": "",
+        "city": "",
+        "signature": "",
+        "phone": "",
+        "sex": "",
+    }
+    if not extra_buf_content:
+        return data
+    trunk_name = {
+        b"\x46\xcf\x10\xc4": "个性签名",
+        b"\xa4\xd9\x02\x4a": "国家",
+        b"\xe2\xea\xa8\xd1": "省份",
+        b"\x1d\x02\x5b\xbf": "市区",
+        # b"\x81\xAE\x19\xB4": "朋友圈背景url",
+        # b"\xF9\x17\xBC\xC0": "公司名称",
+        # b"\x4E\xB9\x6D\x85": "企业微信属性",
+        # b"\x0E\x71\x9F\x13": "备注图片",
+        b"\x75\x93\x78\xad": "手机号",
+        b"\x74\x75\x2c\x06": "性别",
+    }
+    res = {"手机号": ""}
+    off = 0
+    try:
+        for key in trunk_name:
+            trunk_head = trunk_name[key]
+            try:
+                off = extra_buf_content.index(key) + 4
+            except:
+                pass
+            char = extra_buf_content[off : off + 1]
+            off += 1
+            if char == b"\x04":  # 四个字节的int，小端序
+                int_content = extra_buf_content[off : off + 4]
+                off += 4
+                int_content = int.from_bytes(int_content, "little")
+                res[trunk_head] = int_content
+            elif char == b"\x18":  # utf-16字符串
+                length_content = extra_buf_content[off : off + 4]
+                off += 4
+                length_content = int.from_bytes(length_content, "little")
+                strContent = extra_buf_content[off : off + length_content]
+                off += length_content
+                res[trunk_head] = strContent.decode("utf-16").rstrip("\x00")
+        return {
+            "country": res["国家"],
+            "province": res["省份"],
+            "city": res["市区"],
+            "signature": res["个性签名"],
+            "phone": res["手机号"],
+            "sex": res["性别"],
+        }
+    except Exception:
+        return data
+
+
+def fts_phrase(keyword: str) -> str:
+    """MATCH 短语查询，关键词由索引表自身的分词器切分"""
+    return '"{}"'.format(keyword.replace('"', '""'))
+
+
+def parse_fts_table(sql: str) -> Tuple[str, List[str]]:
+    """从 CREATE VIRTUAL TABLE 语句中取出模块名（fts4/fts5）与列名"""
+    match = re.search(r"USING\s+(\w+)\s*\((.*)\)", sql, re.S | re.I)
+    if not match:
+        raise Exception(f"Not a fts table: {sql}")
+    columns = []
+    for part in re.split(r",(?=(?:[^']*'[^']*')*[^']*$)", match.group(2)):
+        part = part.strip()
+        if not part or "=" in part or part.lower().startswith("tokenize"):
+            continue
+        columns.append(part.split()[0].strip('"`[]'))
+    return match.group(1).lower(), columns
+
+
+def fts_content_columns(module: str, columns: List[str]) -> Tuple[str, List[str]]:
+    """FTS 影子表 <table>_content 的 rowid 列名与各列列名"""
+    if module == "fts5":
+        return "id", [f"c{i}" for i in range(len(columns))]
+    return "docid", [f"c{i}{column}" for i, column in enumerate(columns)]
+
+
+def split_message_type(type: int, sub_type: int = 0) -> Tuple[int, int]:
+    """4.x 的 local_type 高 32 位为子类型，低 32 位为类型"""
+    if type > 0xFFFFFFFF:
+        return type & 0xFFFFFFFF, type >> 32
+    return type, sub_type
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Any, value: Any) -> None:
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+
+
+def to_json(value: Any) -> Any:
+    """json.dumps 的 default：MemberList 等序列转为列表，bytes 转为十六进制"""
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if isinstance(value, Iterable):
+        return list(value)
+    return str(value)
+
+
+class RevokeIndex:
+    """撤回索引：被撤回消息的 msg_id -> 撤回前的原消息。
+    传入 path 时同时写入本地 SQLite 文件，重启后仍可查询"""
+
+    def __init__(self, path: Optional[str] = None, maxsize: int = 10000) -> None:
+        self.cache = LRUCache(maxsize)
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            with self.conn:
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS revoke_index("
+                    "msg_id INTEGER PRIMARY KEY, revoke_time INTEGER, message TEXT);"
+                )
+
+    def add(self, msg_id: int, message: Dict[str, Any]) -> None:
+        self.cache.set(msg_id, message)
+        if self.conn is not None:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO revoke_index VALUES (?, ?, ?);",
+                    (
+                        msg_id,
+                        int(time.time()),
+                        json.dumps(message, ensure_ascii=False, default=to_json),
+                    ),
+                )
+
+    def get(self, msg_id: int) -> Optional[Dict[str, Any]]:
+        message = self.cache.get(msg_id)
+        if message is None and self.conn is not None:
+            row = self.conn.execute(
+                "SELECT message FROM revoke_index WHERE msg_id = ?;", (msg_id,)
+            ).fetchone()
+            if row:
+                message = json.loads(row[0])
+                self.cache.set(msg_id, message)
+        return message
+
+    def __contains__(self, msg_id: int) -> bool:
+        return self.get(msg_id) is not None
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class HandlerExecutor(ThreadPoolExecutor):
+    """限制排队中的处理任务数，处理函数跟不上时让 poll 等待而不是把事件全部堆在内存里，
+    max_pending 为 None 时不限制；开启统计时记录事件处理函数的耗时"""
+
+    def __init__(
+        self, max_pending: Optional[int] = 10000, *args: Any, **kwargs: Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.pending = threading.BoundedSemaphore(max_pending) if max_pending else None
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        if metrics.enabled:
+            fn = metrics.timed("handler")(fn)
+        if self.pending is None:
+            return super().submit(fn, *args, **kwargs)
+        self.pending.acquire()
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except BaseException:
+            self.pending.release()
+            raise
+        future.add_done_callback(lambda _: self.pending.release())
+        return future
+
+
+class AccountExecutor(Executor):
+    """共用线程池上的单账号视图，记录该账号排队中的任务数"""
+
+    def __init__(self, executor: Executor, max_pending: int) -> None:
+        self.executor = executor
+        self.max_pending = max_pending
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self.pending >= self.max_pending
+
+    def release(self, future: Future) -> None:
+        with self.lock:
+            self.pending -= 1
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        if metrics.enabled:
+            fn = metrics.timed("handler")(fn)
+        with self.lock:
+            self.pending += 1
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self.release(None)
+            raise
+        future.add_done_callback(self.release)
+        return future
+
+    def shutdown(self, wait: bool = True, **kwargs: Any) -> None:
+        # 线程池由创建者（如 Supervisor）统一关闭
+        pass
+
+
+def is_biz_payload(args: Tuple[Any, ...]) -> bool:
+    """处理函数的参数为 (store, 事件)，标准化消息的原始事件在 raw 中"""
+    payload = args[1] if len(args) > 1 else None
+    if not isinstance(payload, dict):
+        return False
+    raw = payload.get("raw")
+    return bool(payload.get("biz") or (isinstance(raw, dict) and raw.get("biz")))
+
+
+class EventRouter(Executor):
+    """事件处理函数的执行器：公众号消息提交到 biz，其余提交到 default。
+    所有事件都经由同一个 ExecutorEventEmitter 分发，once 与错误处理一致"""
+
+    def __init__(self, default: Executor, biz: Optional[Executor] = None) -> None:
+        self.default = default
+        self.biz = biz
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        if self.biz is not None and is_biz_payload(args):
+            return self.biz.submit(fn, *args, **kwargs)
+        return self.default.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, **kwargs: Any) -> None:
+        self.default.shutdown(wait=wait)
+
+
+class AdaptiveInterval:
+    """自适应轮询间隔：有新消息后回到 floor，空闲时按 factor 逐步放慢，最长为 ceiling"""
+
+    def __init__(
+        self, floor: float = 0.05, ceiling: float = 1.0, factor: float = 1.5
+    ) -> None:
+        self.floor = floor
+        self.ceiling = max(ceiling, floor)
+        self.factor = factor
+        self.current = floor
+
+    def next(self, count: int) -> float:
+        if count:
+            self.current = self.floor
+        else:
+            self.current = min(self.current * self.factor, self.ceiling)
+        return self.current
+
+
+class PollStats:
+    """轮询统计：每秒唤醒次数与检测延迟（消息库修改时间到事件分发完成）"""
+
+    def __init__(self, window: int = 1000) -> None:
+        self.started = time.monotonic()
+        self.wakeups = 0
+        self.events = 0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, count: int, latency: Optional[float] = None) -> None:
+        self.wakeups += 1
+        self.events += count
+        if latency is not None:
+            self.latencies.append(latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        latencies = sorted(self.latencies)
+        return {
+            "elapsed": elapsed,
+            "wakeups": self.wakeups,
+            "wakeups_per_second": self.wakeups / elapsed,
+            "events": self.events,
+            "latency_median": latencies[len(latencies) // 2] if latencies else None,
+            "latency_p95": (
+                latencies[int(len(latencies) * 0.95)] if latencies else None
+            ),
+            "latency_max": latencies[-1] if latencies else None,
+        }
+
+
+class MessageStore:
+    """db_v3 与 db_v4 共用的存储层：连接池、缓存、事件分发与标准化事件"""
+
+    version = None
+    all_message = None
+    cache_size = 4096
+    # 每次 fetchmany 读取的行数
+    batch_size = 1000
+    # 已分发但尚未处理完的事件处理任务上限。达到上限时 emit 会阻塞 poll，直到处理函数跟上，
+    # 因此处理函数慢时检测新消息也会变慢；None 为不限制（积压的事件全部留在内存中）
+    max_pending = 10000
+    # 单次 poll 最多分发的消息数，None 为不限制；多账号共用调度时用于保证公平
+    poll_limit = None
+    connection_profile = DEFAULT_CONNECTION_PROFILE
+    db_profiles = {}
+    # 撤回索引的本地文件，None 时只保存在内存中
+    revoke_index_path = None
+    revoke_index_size = 10000
+    # 分块读取 BLOB（语音等）时每次读取的字节数
+    blob_chunk_size = 64 * 1024
+    # get_event 是否为图片、视频、文件消息附加 media_path。每条附件消息要多解析一次 XML
+    # 并检查 hardlink 索引，默认关闭；需要时用 get_media_path / get_media 按需查找
+    resolve_media = False
+    # 头像缓存的字节数上限
+    avatar_cache_bytes = 32 * 1024 * 1024
+    # 图片 .dat 的密钥文件（store_media_keys 写入），None 时使用数据目录下的 config.json
+    media_key_path = None
+
+    def init_store(self) -> None:
+        self.router = EventRouter(HandlerExecutor(self.max_pending))
+        self.event_emitter = ExecutorEventEmitter(self.router)
+        self.cache = LRUCache(self.cache_size)
+        self.connections = {}
+        self.connections_lock = threading.Lock()
+        self.last_mtime = None
+        self.poll_mtime = None
+        self.poll_stats = PollStats()
+        self.revoke_index = RevokeIndex(self.revoke_index_path, self.revoke_index_size)
+        # 分词器未注册、只能读取 _content 影子表的全文索引
+        self.fts_content_only = set()
+        self.hardlink_index = HardlinkIndex(
+            self.data_dir, self.get_hardlink_sources(), self.get_connection
+        )
+        self.avatar_cache = AvatarCache(
+            self.data_dir,
+            self.get_avatar_source(),
+            self.get_connection,
+            self.avatar_cache_bytes,
+        )
+        self.session_cache = SessionCache(
+            self.data_dir, self.get_session_source(), self.get_connection
+        )
+
+    def get_db_path(self, db_name: str) -> str:
+        return os.path.join(self.data_dir, db_name)
+
+    def get_connection_profile(self, db_name: str) -> Dict[str, Any]:
+        """默认参数叠加 db_profiles 中按文件名（如 "MicroMsg.db"）配置的覆盖项"""
+        return {
+            **self.connection_profile,
+            **self.db_profiles.get(os.path.basename(db_name), {}),
+        }
+
+    def create_connection(self, db_name: str) -> Any:
+        raise NotImplementedError
+
+    def get_connection(self, db_name: str) -> Any:
+        """返回按数据库复用的连接，避免每次查询都重新派生密钥"""
+        conn = self.connections.get(db_name)
+        if conn is None:
+            with self.connections_lock:
+                conn = self.connections.get(db_name)
+                if conn is None:
+                    conn = self.create_connection(db_name)
+                    self.connections[db_name] = conn
+        return conn
+
+    def close(self) -> None:
+        with self.connections_lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.connections.clear()
+        self.revoke_index.close()
+
+    def iter_messages(
+        self,
+        talker: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        types: Optional[List[Any]] = None,
+        page_size: int = 500,
+    ) -> Iterator[Dict]:
+        raise NotImplementedError
+
+    def iter_fts_hits(
+        self, keyword: str, talker: Optional[str], page_size: int
+    ) -> Iterator[List[Any]]:
+        raise NotImplementedError
+
+    def load_fts_hits(self, hits: List[Any], talker: Optional[str]) -> List[Dict]:
+        raise NotImplementedError
+
+    def query_fts(
+        self,
+        conn: Any,
+        table: str,
+        match: Tuple[str, Tuple],
+        content: Tuple[str, Tuple],
+    ) -> List[Tuple]:
+        """优先用 MATCH 查询；索引的分词器（微信的 MMFtsTokenizer）未注册时无法 MATCH，
+        改为在 _content 影子表中查找"""
+        if table not in self.fts_content_only:
+            try:
+                with conn, metrics.timer("sql"):
+                    return conn.execute(*match).fetchall()
+            except Exception as e:
+                if "tokenizer" not in str(e).lower():
+                    raise
+                self.fts_content_only.add(table)
+        with conn, metrics.timer("sql"):
+            return conn.execute(*content).fetchall()
+
+    def search_messages(
+        self,
+        keyword: str,
+        talker: Optional[str] = None,
+        limit: int = 100,
+        page_size: int = 200,
+    ) -> List[Dict]:
+        """在微信自带的全文索引中搜索包含 keyword 的文本消息，按索引从新到旧返回事件"""
+        events = []
+        for hits in self.iter_fts_hits(keyword, talker, page_size):
+            events.extend(self.load_fts_hits(hits, talker))
+            if len(events) >= limit:
+                break
+        return events[:limit]
+
+    def get_room_member_list(self, room_wxid: str) -> Any:
+        raise NotImplementedError
+
+    def open_voice(self, event: Dict) -> Any:
+        """语音消息 BLOB 的只读流（增量 BLOB I/O，支持 read(n)），找不到时返回 None"""
+        raise NotImplementedError
+
+    def get_voice(self, event: Dict) -> Optional[bytes]:
+        """语音消息的 silk 数据"""
+        blob = self.open_voice(event)
+        if blob is None:
+            return None
+        try:
+            return blob.read()
+        finally:
+            blob.close()
+
+    def save_voice(self, event: Dict, path: str) -> int:
+        """把语音 BLOB 分块写入文件，不在内存中保存完整数据，返回写入的字节数"""
+        blob = self.open_voice(event)
+        if blob is None:
+            return 0
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                while True:
+                    chunk = blob.read(self.blob_chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+        finally:
+            blob.close()
+        return size
+
+    def export_voices(
+        self,
+        talker: str,
+        dst: str,
+        format: str = "wav",
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        workers: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """导出会话中的语音消息到 dst，文件名为 <create_time>_<msg_id>.<format>。
+        format 为 "silk" 时只导出原始数据；为 "wav" 时在进程池（或传入的 executor）中转码，
+        读取下一条语音与转码同时进行。返回数量、字节数与吞吐量"""
+        if format not in ("silk", "wav"):
+            raise ValueError(f"Not support format: {format}")
+        if format == "wav" and importlib.util.find_spec("pilk") is None:
+            raise Exception(
+                "pilk is required to transcode silk: pip install wxutil[silk]"
+            )
+        os.makedirs(dst, exist_ok=True)
+        own_executor = executor is None and format == "wav"
+        if own_executor:
+            executor = ProcessPoolExecutor(workers)
+
+        stats = {"voices": 0, "bytes": 0, "missing": 0, "failed": 0}
+        started = time.perf_counter()
+        read_seconds = 0.0
+        futures = []
+        try:
+            # 3.x 与 4.x 语音消息的类型都是 34
+            for event in self.iter_messages(talker, start, end, types=[34]):
+                name = f"{event['create_time']}_{event['msg_id']}"
+                silk_path = os.path.join(dst, f"{name}.silk")
+                read_started = time.perf_counter()
+                size = self.save_voice(event, silk_path)
+                read_seconds += time.perf_counter() - read_started
+                if not size:
+                    stats["missing"] += 1
+                    continue
+                stats["voices"] += 1
+                stats["bytes"] += size
+                if format == "wav":
+                    wav_path = os.path.join(dst, f"{name}.wav")
+                    future = executor.submit(silk_to_wav, silk_path, wav_path)
+                    futures.append((silk_path, future))
+
+            for silk_path, future in futures:
+                try:
+                    future.result()
+                    os.remove(silk_path)
+                except Exception:
+                    stats["failed"] += 1
+                    logger.exception(f"Transcode failed: {silk_path}")
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        stats.update(
+            {
+                "seconds": elapsed,
+                "read_seconds": read_seconds,
+                "voices_per_second": stats["voices"] / elapsed,
+                "bytes_per_second": stats["bytes"] / elapsed,
+            }
+        )
+        logger.info(
+            f"Exported {stats['voices']} voices ({stats['bytes']} bytes) in {elapsed:.2f}s, "
+            f"{stats['voices_per_second']:.1f} voices/s, missing {stats['missing']}, failed {stats['failed']}"
+        )
+        return stats
+
+    def get_hardlink_sources(self) -> List[Any]:
+        return []
+
+    def get_media_md5(self, event: Dict) -> Tuple[Optional[str], Optional[str]]:
+        """附件类型（image/video/file）与消息 XML 中的 md5，不是附件消息时返回 (None, None)"""
+        return None, None
+
+    def get_media_path(self, event: Dict) -> Optional[str]:
+        """按 md5 在 hardlink 索引中查找附件路径，不遍历附件目录"""
+        kind, md5 = self.get_media_md5(event)
+        if kind is None or not md5:
+            return None
+        return self.hardlink_index.get(md5, kind)
+
+    def get_media(
+        self,
+        event: Dict,
+        xor_key: Optional[int] = None,
+        aes_key: Optional[bytes] = None,
+    ) -> Optional[bytes]:
+        """读取附件内容，.dat 文件用 decrypt_file 解密；未传入密钥时读取配置文件中的密钥"""
+        path = event.get("media_path") or self.get_media_path(event)
+        return self.read_media(path, xor_key, aes_key)
+
+    def read_media(
+        self,
+        path: Optional[str],
+        xor_key: Optional[int] = None,
+        aes_key: Optional[bytes] = None,
+    ) -> Optional[bytes]:
+        if not path or not os.path.exists(path):
+            return None
+        if not path.endswith(".dat"):
+            with open(path, "rb") as f:
+                return f.read()
+        xor_key, aes_key = self.get_media_keys(xor_key, aes_key)
+        return decrypt_file(path, xor_key, aes_key)
+
+    def get_media_key_path(self) -> str:
+        return self.media_key_path or os.path.join(self.data_dir, CONFIG_FILE)
+
+    def store_media_keys(self, xor_key: int, aes_key: bytes) -> None:
+        """把图片密钥写入 get_media_keys 读取的位置"""
+        store_key(xor_key, aes_key, self.get_media_key_path())
+
+    def get_media_keys(
+        self, xor_key: Optional[int] = None, aes_key: Optional[bytes] = None
+    ) -> Tuple[int, bytes]:
+        """未传入的密钥从 get_media_key_path 读取，不依赖当前工作目录；
+        没有密钥文件时抛出 FileNotFoundError，不会用空密钥解密"""
+        if xor_key is None or aes_key is None:
+            config_xor_key, config_aes_key = read_key_from_config(
+                self.get_media_key_path()
+            )
+            xor_key = config_xor_key if xor_key is None else xor_key
+            aes_key = config_aes_key if aes_key is None else aes_key
+        return xor_key, aes_key
+
+    def get_avatar_source(self) -> Any:
+        raise NotImplementedError
+
+    def get_avatar(self, wxid: str) -> Optional[bytes]:
+        """联系人或群聊的头像图片，从本地头像数据库读取"""
+        return self.avatar_cache.get(wxid)
+
+    def export_avatars(self, dst: str) -> Dict[str, Any]:
+        """导出全部头像到内容寻址目录，见 AvatarCache.export"""
+        return self.avatar_cache.export(dst)
+
+    def get_session_source(self) -> Any:
+        raise NotImplementedError
+
+    def get_sessions(self, since: Optional[int] = None) -> Dict[str, Any]:
+        """会话列表的未读数与摘要；传入上次返回的 version 时只返回之后有变化的会话，
+        见 SessionCache.get_sessions"""
+        return self.session_cache.get_sessions(since)
+
+    def get_revoked_message(self, msg_id: int) -> Optional[Dict]:
+        """被撤回消息撤回前的内容，只包含监听期间见到过的消息"""
+        return self.revoke_index.get(msg_id)
+
+    def is_room_member(self, room_wxid: str, wxid: str) -> bool:
+        return wxid in self.get_room_member_list(room_wxid)
+
+    def get_event_name(self, type: Any) -> str:
+        raise NotImplementedError
+
+    def get_event_type(self, event: Dict) -> Any:
+        raise NotImplementedError
+
+    def get_event(self, *args: Any) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def get_events(self, rows: Iterable[Tuple], *args: Any) -> List[Optional[Dict]]:
+        return [self.get_event(*args, row) for row in rows]
+
+    def iter_batches(
+        self, cursor: Any, batch_size: Optional[int] = None
+    ) -> Iterator[List[Tuple]]:
+        """用 fetchmany 分批读取结果集，不一次性载入全部行"""
+        batch_size = batch_size or self.batch_size
+        while True:
+            with metrics.timer("sql"):
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            metrics.incr("rows_fetched", len(rows))
+            yield rows
+
+    def iter_events(self, cursor: Any, *args: Any) -> Iterator[Dict]:
+        for rows in self.iter_batches(cursor):
+            for event in self.get_events(rows, *args):
+                if event:
+                    yield event
+
+    def normalize_event(self, event: Dict) -> Dict:
+        raise NotImplementedError
+
+    def handle(
+        self, events: Any = None, once: bool = False
+    ) -> Callable[[Callable[..., Any]], None]:
+        if events is None:
+            events = self.all_message
+
+        def wrapper(func: Callable[..., Any]) -> None:
+            listen = self.event_emitter.on if not once else self.event_emitter.once
+            if isinstance(events, list):
+                for event in events:
+                    listen(self.get_event_name(event), func)
+            else:
+                listen(self.get_event_name(events), func)
+
+        return wrapper
+
+    def on_message(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        """注册标准化消息处理函数，回调参数为 (store, message)"""
+        self.event_emitter.on(MESSAGE_EVENT, func)
+        return func
+
+    def on_revoke(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        """注册撤回处理函数，回调参数为 (store, revoke)，见 get_revoke"""
+        self.event_emitter.on(REVOKE_EVENT, func)
+        return func
+
+    def get_revoke(
+        self,
+        msg_id: int,
+        talker: Optional[str],
+        revoke_time: Optional[int],
+        is_sender: int,
+        revoked_message: Optional[Dict],
+        event: Optional[Dict] = None,
+        content: Optional[str] = None,
+    ) -> Dict:
+        """撤回事件的参数：msg_id 为被撤回消息的 server id，event 为撤回提示消息，
+        content 为撤回记录中保存的原文"""
+        return {
+            "version": self.version,
+            "msg_id": msg_id,
+            "talker": talker,
+            "revoke_time": revoke_time,
+            "is_sender": is_sender,
+            "revoked_message": revoked_message,
+            "content": content,
+            "event": event,
+        }
+
+    def emit_revoke(self, revoke: Dict) -> None:
+        if revoke["revoked_message"]:
+            self.revoke_index.add(revoke["msg_id"], revoke["revoked_message"])
+        metrics.incr("revokes_emitted")
+        self.event_emitter.emit(REVOKE_EVENT, self, revoke)
+
+    def emit(self, event: Dict) -> None:
+        if metrics.enabled:
+            metrics.incr("events_emitted")
+            metrics.observe_lag(event.get("create_time"))
+        self.event_emitter.emit(self.get_event_name(self.all_message), self, event)
+        self.event_emitter.emit(
+            self.get_event_name(self.get_event_type(event)), self, event
+        )
+        if self.event_emitter.listeners(MESSAGE_EVENT):
+            self.event_emitter.emit(MESSAGE_EVENT, self, self.normalize_event(event))
+
+    def get_handlers_per_event(self) -> int:
+        """emit 一条消息最多提交的处理函数数（全部消息、单个类型与标准化消息的处理函数之和）"""
+        emitter = self.event_emitter
+        all_name = self.get_event_name(self.all_message)
+        typed = [
+            len(emitter.listeners(name))
+            for name in emitter.event_names()
+            if name not in (all_name, MESSAGE_EVENT)
+        ]
+        count = len(emitter.listeners(all_name)) + len(emitter.listeners(MESSAGE_EVENT))
+        return max(1, count + max(typed, default=0))
+
+    def get_msg_db_mtime(self) -> float:
+        """消息库与 WAL 文件中较新的修改时间；已解密的副本没有 WAL 文件"""
+        mtime = os.path.getmtime(self.msg_db_path)
+        if os.path.exists(self.msg_db_wal):
+            mtime = max(mtime, os.path.getmtime(self.msg_db_wal))
+        return mtime
+
+    def check_changed(self) -> bool:
+        """消息库自上次完整读取后没有变化时跳过本次查询"""
+        self.poll_mtime = self.get_msg_db_mtime()
+        return self.poll_mtime != self.last_mtime
+
+    def mark_polled(self, count: int) -> None:
+        # 达到单次上限时保留 last_mtime，下次继续读取剩余消息
+        if self.get_poll_limit(count) != 0:
+            self.last_mtime = self.poll_mtime
+
+    def get_poll_limit(self, count: int) -> int:
+        """本次 poll 还可以读取的行数，-1 表示不限制（SQLite LIMIT -1）"""
+        if self.poll_limit is None:
+            return -1
+        return max(self.poll_limit - count, 0)
+
+    def start(self) -> None:
+        raise NotImplementedError
+
+    def poll(self) -> int:
+        raise NotImplementedError
+
+    def record_poll(self, count: int) -> None:
+        latency = None
+        if count and self.poll_mtime:
+            latency = max(time.time() - self.poll_mtime, 0.0)
+            metrics.observe("detection", latency)
+        metrics.incr("wakeups")
+        self.poll_stats.record(count, latency)
+
+    def get_poll_stats(self) -> Dict[str, Any]:
+        return self.poll_stats.snapshot()
+
+    def run(
+        self,
+        period: Optional[float] = None,
+        floor: float = 0.05,
+        ceiling: float = 1.0,
+        factor: float = 1.5,
+    ) -> NoReturn:
+        """传入 period 时按固定间隔轮询，否则使用 AdaptiveInterval(floor, ceiling, factor)"""
+        if period is not None:
+            floor = ceiling = period
+        interval = AdaptiveInterval(floor, ceiling, factor)
+        self.poll_stats = PollStats()
+        self.start()
+        while True:
+            with metrics.timer("poll"):
+                count = self.poll()
+            self.record_poll(count)
+            metrics.maybe_export()
+            time.sleep(interval.next(count))
+
+    def __str__(self) -> str:
+        return f"<WeChatDB pid={repr(self.pid)} wxid={repr(self.wxid)} msg_db={repr(self.msg_db)}>"
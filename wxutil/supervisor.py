@@ -0,0 +1,231 @@
+"""
+Description: 多账号监听。在一个进程内监听多个微信数据目录，共用一个调度线程、
+一个事件处理线程池和一份缓存预算。
+
+   supervisor = Supervisor()
+   for info in infos:
+       wechat_db = supervisor.add_dir("v4", info["data_dir"], info["key"])
+
+       @wechat_db.handle()
+       def on_message(wechat_db, event):
+           ...
+
+   supervisor.run()
+
+公平与隔离：
+  - 每次 poll 最多分发 poll_limit 条消息，积压较多的账号分多轮读取，不会独占调度线程；
+  - 每个账号排队中的处理任务不超过 max_pending，超过时暂停该账号的 poll，
+    处理函数慢的账号不会占满共用线程池的队列；
+  - 某个账号 poll 出错时只对该账号退避重试。
+
+空闲账号的轮询间隔最长为 ceiling（默认 0.2 秒），空闲时的检测延迟约为 ceiling 的一半；
+调大 ceiling 可以减少唤醒次数，代价是空闲账号收到第一条消息的延迟变长。
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from wxutil.logger import logger
+from wxutil.metrics import metrics
+from wxutil.store import AccountExecutor, AdaptiveInterval, MessageStore
+
+
+class Account:
+    def __init__(
+        self,
+        store: MessageStore,
+        executor: AccountExecutor,
+        interval: AdaptiveInterval,
+    ) -> None:
+        self.store = store
+        self.executor = executor
+        self.interval = interval
+        self.started = False
+        self.next_poll = 0.0
+        self.errors = 0
+        self.polls = 0
+        self.events = 0
+        self.skipped = 0
+
+
+class Supervisor:
+    def __init__(
+        self,
+        period: float = 0.05,
+        ceiling: float = 0.2,
+        max_workers: Optional[int] = None,
+        cache_budget: int = 65536,
+        poll_limit: int = 500,
+        max_pending: int = 2000,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self.period = period
+        self.ceiling = ceiling
+        self.cache_budget = cache_budget
+        self.poll_limit = poll_limit
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.accounts = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def add(self, store: MessageStore) -> MessageStore:
+        """接管一个已创建的 WeChatDB，之前注册的处理函数仍然有效"""
+        executor = AccountExecutor(self.executor, self.max_pending)
+        # 只替换分发使用的执行器，event_emitter 与已注册的处理函数保持不变
+        store.router.default.shutdown(wait=False)
+        store.router.default = executor
+        # 公众号消息使用单独计数的视图，积压时不会让该账号的普通消息停止 poll
+        store.router.biz = AccountExecutor(self.executor, self.max_pending)
+        store.poll_limit = self.poll_limit
+        with self.lock:
+            self.accounts.append(
+                Account(store, executor, AdaptiveInterval(self.period, self.ceiling))
+            )
+            self.rebalance_cache()
+        return store
+
+    def add_dir(
+        self,
+        version: str,
+        data_dir: str,
+        key: Optional[str] = None,
+        wxid: Optional[str] = None,
+        **kwargs: Any,
+    ) -> MessageStore:
+        if version == "v3":
+            from wxutil.db_v3 import WeChatDB
+        elif version == "v4":
+            from wxutil.db_v4 import WeChatDB
+        else:
+            raise ValueError(f"Not support version: {version}")
+        return self.add(WeChatDB.from_dir(data_dir, key, wxid, **kwargs))
+
+    @classmethod
+    def from_processes(cls, version: str = "v3", **kwargs: Any) -> "Supervisor":
+        """为每个正在运行的微信进程创建一个账号"""
+        supervisor = cls(**kwargs)
+        if version == "v3":
+            from wxutil.db_v3 import WeChatDB
+            from wxutil.process import read_info
+
+            infos = read_info() or []
+        elif version == "v4":
+            import psutil
+
+            from wxutil.db_v4 import WeChatDB
+            from wxutil.process import get_wx_info
+
+            infos = []
+            for p in psutil.process_iter(["name", "pid"]):
+                if p.info["name"] != "Weixin.exe":
+                    continue
+                try:
+                    # 只取主进程，父进程同为 Weixin.exe 的是辅助、渲染进程
+                    parent = p.parent()
+                    if parent is not None and parent.name() == "Weixin.exe":
+                        continue
+                    infos.append(get_wx_info("v4", p.pid))
+                except Exception as e:
+                    logger.warning(f"Skip Weixin.exe process {p.pid}: {e}")
+        else:
+            raise ValueError(f"Not support version: {version}")
+
+        data_dirs = set()
+        for info in infos:
+            # 同一账号只接管一次（3.x 的 read_info 返回 file_path，4.x 为 data_dir）
+            data_dir = info.get("data_dir") or info.get("file_path")
+            if data_dir in data_dirs:
+                continue
+            data_dirs.add(data_dir)
+            wechat_db = WeChatDB.__new__(WeChatDB)
+            wechat_db.setup(info)
+            supervisor.add(wechat_db)
+        return supervisor
+
+    def rebalance_cache(self) -> None:
+        """缓存预算在账号之间平分"""
+        size = max(self.cache_budget // max(len(self.accounts), 1), 1)
+        for account in self.accounts:
+            account.store.cache.maxsize = size
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "wxid": account.store.wxid,
+                "version": account.store.version,
+                "polls": account.polls,
+                "events": account.events,
+                "skipped": account.skipped,
+                "errors": account.errors,
+                "pending": account.executor.pending,
+                **account.store.get_poll_stats(),
+            }
+            for account in self.accounts
+        ]
+
+    def poll_account(self, account: Account, now: float) -> None:
+        if account.executor.busy:
+            account.skipped += 1
+            account.next_poll = now + self.period
+            return
+        try:
+            if not account.started:
+                account.store.start()
+                account.started = True
+            count = account.store.poll()
+        except Exception:
+            account.errors += 1
+            delay = min(self.period * 2**account.errors, self.max_backoff)
+            account.next_poll = now + delay
+            logger.exception(f"Poll failed: {account.store}, retry in {delay:.1f}s")
+            return
+        account.store.record_poll(count)
+        account.errors = 0
+        account.polls += 1
+        account.events += count
+        # 达到单次上限说明还有积压，下一轮立即继续；否则按该账号的自适应间隔
+        limit = account.store.poll_limit
+        if limit and count >= limit:
+            account.next_poll = now
+        else:
+            account.next_poll = now + account.interval.next(count)
+
+    def tick(self) -> float:
+        """轮询一轮到期的账号，返回距离下一个账号到期的秒数"""
+        with self.lock:
+            accounts = list(self.accounts)
+        now = time.monotonic()
+        for account in accounts:
+            if account.next_poll <= now:
+                self.poll_account(account, now)
+        if not accounts:
+            return self.period
+        # 轮转起点，避免排在前面的账号总是先被处理
+        with self.lock:
+            if self.accounts:
+                self.accounts.append(self.accounts.pop(0))
+        return max(min(a.next_poll for a in accounts) - time.monotonic(), 0.0)
+
+    def run(self) -> None:
+        try:
+            while not self.stop_event.is_set():
+                delay = self.tick()
+                metrics.maybe_export()
+                if delay:
+                    self.stop_event.wait(min(delay, self.ceiling))
+        finally:
+            self.close()
+
+    def stop(self) -> None:
+        """通知 run 在当前一轮结束后退出"""
+        self.stop_event.set()
+
+    def close(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
+        with self.lock:
+            for account in self.accounts:
+                account.store.close()
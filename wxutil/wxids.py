@@ -0,0 +1,126 @@
+"""
+Description: wxid 驻留表。每个 wxid 字符串只保存一份并映射为小整数 id，
+群成员列表以 array('I') 按原顺序保存，需要时再还原为字符串。
+驻留表登记满 MAX_WXIDS 个后换用新表，旧 MemberList 仍引用各自的表。
+MemberList 不是 list，json.dumps 时需传 default=to_json 或使用 .wxids。
+"""
+
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Union
+
+MAX_WXIDS = 200000
+# 不超过该长度的列表直接线性查找，不建排序索引
+LINEAR_SEARCH_SIZE = 32
+
+
+class WxidTable:
+    def __init__(self) -> None:
+        self.ids = {}
+        self.wxids = []
+        self.lock = threading.Lock()
+
+    def intern(self, wxid: str) -> int:
+        id = self.ids.get(wxid)
+        if id is None:
+            with self.lock:
+                id = self.ids.get(wxid)
+                if id is None:
+                    id = len(self.wxids)
+                    self.wxids.append(wxid)
+                    self.ids[wxid] = id
+        return id
+
+    def get_id(self, wxid: str) -> Optional[int]:
+        """只查询不登记，未出现过的 wxid 返回 None"""
+        return self.ids.get(wxid)
+
+    def get_wxid(self, id: int) -> str:
+        return self.wxids[id]
+
+    def __len__(self) -> int:
+        return len(self.wxids)
+
+
+wxid_table = WxidTable()
+wxid_table_lock = threading.Lock()
+
+
+def get_wxid_table() -> WxidTable:
+    """当前的全局驻留表，登记满 MAX_WXIDS 个后换用新表"""
+    global wxid_table
+    if len(wxid_table) >= MAX_WXIDS:
+        with wxid_table_lock:
+            if len(wxid_table) >= MAX_WXIDS:
+                wxid_table = WxidTable()
+    return wxid_table
+
+
+class MemberList(Sequence):
+    """按原顺序保存的 wxid 列表，支持 in、len、迭代与下标，元素为 wxid 字符串"""
+
+    __slots__ = ("ids", "table", "index")
+
+    def __init__(self, ids: array, table: Optional[WxidTable] = None) -> None:
+        self.ids = ids
+        self.table = table or get_wxid_table()
+        # 排序去重后的 id，供 in 二分查找，首次用到时生成
+        self.index = None
+
+    @classmethod
+    def from_wxids(
+        cls, wxids: Iterable[str], table: Optional[WxidTable] = None
+    ) -> "MemberList":
+        table = table or get_wxid_table()
+        return cls(array("I", [table.intern(wxid) for wxid in wxids]), table)
+
+    @classmethod
+    def from_string(
+        cls, value: Optional[str], sep: str, table: Optional[WxidTable] = None
+    ) -> "MemberList":
+        return cls.from_wxids((x for x in (value or "").split(sep) if x), table)
+
+    def contains_id(self, id: int) -> bool:
+        if len(self.ids) <= LINEAR_SEARCH_SIZE:
+            return id in self.ids
+        if self.index is None:
+            self.index = array("I", sorted(set(self.ids)))
+        i = bisect_left(self.index, id)
+        return i < len(self.index) and self.index[i] == id
+
+    def __contains__(self, wxid: Any) -> bool:
+        if isinstance(wxid, int):
+            return self.contains_id(wxid)
+        id = self.table.get_id(wxid)
+        return id is not None and self.contains_id(id)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return [self.table.wxids[id] for id in self.ids[index]]
+        return self.table.wxids[self.ids[index]]
+
+    def __iter__(self) -> Iterator[str]:
+        wxids = self.table.wxids
+        return (wxids[id] for id in self.ids)
+
+    @property
+    def wxids(self) -> List[str]:
+        return list(self)
+
+    def __eq__(self, other: Any) -> bool:
+        """与 list 一样按顺序逐个比较"""
+        if isinstance(other, MemberList) and other.table is self.table:
+            return self.ids == other.ids
+        if isinstance(other, (list, tuple, MemberList)):
+            return self.wxids == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"MemberList({self.wxids!r})"
+
+
+EMPTY_MEMBER_LIST = MemberList(array("I"))